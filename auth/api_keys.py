@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import time
+from cache import TTLCache
+from config import (
+    API_KEY_REFRESH_INTERVAL, API_KEY_FULL_REFRESH_INTERVAL, API_KEY_MISS_REFRESH_INTERVAL,
+    API_KEY_NEGATIVE_CACHE_SIZE, API_KEY_NEGATIVE_CACHE_TTL,
+)
+import repository
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX_LENGTH = 8
+
+
+def hash_api_key(key: str) -> str:
+    # Les clés sont aléatoires (256 bits) : un SHA-256 suffit, pas besoin d'un hash lent
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def api_key_prefix(key: str) -> str:
+    return key[:KEY_PREFIX_LENGTH]
+
+
+class ApiKeyIndex:
+    # Index mémoire préfixe -> clés (hash, id, user_id), chargé au démarrage et rafraîchi en arrière-plan.
+    # Une clé inconnue est rejetée sans requête en base : au pire un rafraîchissement incrémental
+    # par API_KEY_MISS_REFRESH_INTERVAL, quel que soit le volume de clés invalides.
+    # Une clé supprimée par un autre worker reste acceptée ici jusqu'au rechargement complet suivant
+    # (API_KEY_FULL_REFRESH_INTERVAL), puis jusqu'à l'expiration du principal en cache (PRINCIPAL_CACHE_TTL).
+    def __init__(self):
+        self._by_prefix = {}
+        # id supprimé -> instant de la suppression : une lecture en base commencée avant ne le réintroduit pas
+        self._tombstones = {}
+        self._max_id = 0
+        self._warm = False
+        self._refresh_lock = asyncio.Lock()
+        self._last_refresh = 0.0
+        self._task = None
+        self.negative_cache = TTLCache(API_KEY_NEGATIVE_CACHE_SIZE, API_KEY_NEGATIVE_CACHE_TTL)
+
+    def add(self, row: dict):
+        if not row.get("key_prefix") or not row.get("key_hash") or row["id"] in self._tombstones:
+            return
+        entries = self._by_prefix.setdefault(row["key_prefix"], {})
+        entries[row["id"]] = (row["key_hash"], row["user_id"])
+
+    def remove(self, key_id: int):
+        self._tombstones[key_id] = time.monotonic()
+        for prefix, entries in list(self._by_prefix.items()):
+            if entries.pop(key_id, None) is not None and not entries:
+                del self._by_prefix[prefix]
+
+    def _find(self, prefix: str, key_hash: str):
+        for key_id, (stored_hash, user_id) in self._by_prefix.get(prefix, {}).items():
+            if hmac.compare_digest(stored_hash, key_hash):
+                return {"id": key_id, "user_id": user_id}
+        return None
+
+    @property
+    def warmed(self) -> bool:
+        return self._warm
+
+    async def warm(self):
+        started = time.monotonic()
+        rows = await repository.list_api_key_hashes()
+        by_prefix = {}
+        max_id = 0
+        for row in rows:
+            max_id = max(max_id, row["id"])
+            if row.get("key_prefix") and row.get("key_hash") and row["id"] not in self._tombstones:
+                by_prefix.setdefault(row["key_prefix"], {})[row["id"]] = (row["key_hash"], row["user_id"])
+        # Rechargement complet : les clés supprimées par les autres workers disparaissent.
+        # Une pierre tombale n'est plus utile quand une lecture commencée après la suppression ne renvoie plus la clé.
+        returned = {row["id"] for row in rows}
+        self._tombstones = {
+            key_id: removed_at for key_id, removed_at in self._tombstones.items()
+            if key_id in returned or removed_at >= started
+        }
+        self._by_prefix = by_prefix
+        # Une clé refusée avant d'être visible ici (créée via un autre worker) ne doit pas le rester
+        self.negative_cache.clear()
+        # Clés créées pendant la lecture : absentes de l'instantané, reprises par le rafraîchissement incrémental
+        self._max_id = max_id
+        self._warm = True
+        self._last_refresh = time.monotonic()
+
+    async def refresh(self):
+        # Rafraîchissement incrémental : seulement les clés créées depuis le dernier passage.
+        # _max_id n'avance qu'ici et dans warm() : une clé créée localement (add) ne doit pas faire
+        # sauter les id inférieurs encore invisibles, créés via un autre worker.
+        for row in await repository.list_api_key_hashes(after_id=self._max_id):
+            self.add(row)
+            self._max_id = max(self._max_id, row["id"])
+            if row.get("key_hash"):
+                self.negative_cache.invalidate(row["key_hash"])
+        self._last_refresh = time.monotonic()
+
+    async def _refresh_on_miss(self) -> bool:
+        async with self._refresh_lock:
+            if time.monotonic() - self._last_refresh < API_KEY_MISS_REFRESH_INTERVAL:
+                return False
+            if self._warm:
+                await self.refresh()
+            else:
+                await self.warm()
+            return True
+
+    async def lookup(self, key: str):
+        key_hash = hash_api_key(key)
+        if self.negative_cache.get(key_hash):
+            return None
+        prefix = api_key_prefix(key)
+        found = self._find(prefix, key_hash)
+        generation = self.negative_cache.generation
+        if found is None and await self._refresh_on_miss():
+            found = self._find(prefix, key_hash)
+            if found is None:
+                # Absente de la base au moment du rafraîchissement : inutile de la rechercher à nouveau
+                # (sauf si un rechargement a eu lieu entre-temps)
+                self.negative_cache.set(key_hash, True, generation=generation)
+        return found
+
+    async def _run(self):
+        last_full = time.monotonic()
+        while True:
+            await asyncio.sleep(API_KEY_REFRESH_INTERVAL)
+            try:
+                if time.monotonic() - last_full >= API_KEY_FULL_REFRESH_INTERVAL:
+                    await self.warm()
+                    last_full = time.monotonic()
+                else:
+                    await self.refresh()
+            except Exception as e:
+                logger.warning("Rafraîchissement de l'index des clés API impossible : %s", e)
+
+    async def start(self):
+        await self.warm()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self):
+        return {
+            "keys": sum(len(entries) for entries in self._by_prefix.values()),
+            "warm": self._warm,
+            "negative_cache": self.negative_cache.stats(),
+        }
+
+
+api_key_index = ApiKeyIndex()
@@ -0,0 +1,73 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import bcrypt
+from fastapi import HTTPException
+from config import BCRYPT_ROUNDS, BCRYPT_EXECUTOR, BCRYPT_WORKERS, BCRYPT_MAX_QUEUE
+from metrics import span
+
+# Pool dédié : une rafale de logins ne bloque plus le threadpool partagé des autres routes
+_executor = None
+_pending = 0
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        if BCRYPT_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=BCRYPT_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+
+def shutdown_hashing():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+async def _run(operation: str, func, *args):
+    # Contrôle d'admission : au-delà des workers + file d'attente, on refuse (503) au lieu d'empiler
+    global _pending
+    if _pending >= BCRYPT_WORKERS + BCRYPT_MAX_QUEUE:
+        raise HTTPException(
+            status_code=503,
+            detail="Serveur surchargé, réessayez plus tard",
+            headers={"Retry-After": "1"}
+        )
+    _pending += 1
+    try:
+        with span("bcrypt", operation):
+            return await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    hashed = await _run("hash", _hash, password.encode('utf-8'), BCRYPT_ROUNDS)
+    return hashed.decode('utf-8')
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _run("verify", _check, password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def needs_rehash(hashed: str) -> bool:
+    # Format bcrypt : $2b$<coût>$<sel+hash>
+    try:
+        return int(hashed.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+
+def pending_operations() -> int:
+    return _pending
@@ -51,12 +51,22 @@
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
 from auth.security import decode_token
-from database import supabase
-import jwt
+import repository
+from cache import principal_cache
+from auth.api_keys import api_key_index
+from auth.principal import Principal
+from auth import roles
+
+
+async def load_principal(row):
+    # Rôle lu dans l'instantané mémoire, permissions compilées en masque de bits
+    role = await roles.get_role(row["role_id"]) if row.get("role_id") else None
+    return Principal.from_row(row, role)
+
 
 async def auth_middleware(request: Request, call_next):
     # Routes publiques qui n'ont pas besoin d'auth
-    public_routes = ["/login", "/register", "/health", "/get_products", "/all-products", "/docs", "/openapi.json"]
+    public_routes = ["/login", "/register", "/health", "/get_products", "/all-products", "/bestsellers", "/webhooks/shopify-sales", "/metrics", "/ready", "/docs", "/openapi.json"]
     if any(request.url.path.startswith(route) for route in public_routes):
         return await call_next(request)
 
@@ -68,13 +78,18 @@ async def auth_middleware(request: Request, call_next):
 
         if api_key_header:
             # Authentification via clé API
-            key_resp = supabase.table("api_keys").select("*").eq("key", api_key_header).execute()
-            if not key_resp.data:
+            api_key = await api_key_index.lookup(api_key_header)
+            if not api_key:
                 return JSONResponse({"detail": "Clé API invalide"}, status_code=401)
-            user_resp = supabase.table("users").select("*").eq("id", key_resp.data[0]["user_id"]).execute()
-            if not user_resp.data:
-                return JSONResponse({"detail": "Utilisateur introuvable"}, status_code=401)
-            user = user_resp.data[0]
+            cache_key = ("api_key", api_key["id"])
+            user = principal_cache.get(cache_key)
+            if user is None:
+                generation = principal_cache.generation
+                user = await repository.get_user_by_id(api_key["user_id"])
+                if not user:
+                    return JSONResponse({"detail": "Utilisateur introuvable"}, status_code=401)
+                user = await load_principal(user)
+                principal_cache.set(cache_key, user, generation=generation)
 
         elif auth_header and auth_header.startswith("Bearer "):
             # Authentification via JWT
@@ -84,31 +99,31 @@ async def auth_middleware(request: Request, call_next):
             if not email:
                 raise HTTPException(status_code=401, detail="Token invalide")
 
-            user_resp = supabase.table("users").select("*").eq("email", email).execute()
-            if not user_resp.data:
-                raise HTTPException(status_code=401, detail="Utilisateur introuvable")
-            user = user_resp.data[0]
+            cache_key = ("email", email)
+            user = principal_cache.get(cache_key)
+            if user is None:
+                # Génération lue avant la lecture : si change_password invalide pendant celle-ci,
+                # l'ancien password_changed_at n'est pas remis en cache
+                generation = principal_cache.generation
+                user = await repository.get_user_by_email(email)
+                if not user:
+                    raise HTTPException(status_code=401, detail="Utilisateur introuvable")
+                user = await load_principal(user)
+                principal_cache.set(cache_key, user, generation=generation)
 
             # Vérification si mot de passe modifié après le token
-            if "password_changed_at" in user and user["password_changed_at"]:
-                if payload["iat"] < user["password_changed_at"]:
+            if user.password_changed_at:
+                if payload["iat"] < user.password_changed_at:
                     raise HTTPException(status_code=401, detail="Token expiré, mot de passe modifié")
         else:
             return JSONResponse({"detail": "Non authentifié"}, status_code=401)
 
-        # Récupération du rôle si nécessaire
-        if "role_id" in user and user["role_id"]:
-            role_resp = supabase.table("roles").select("*").eq("id", user["role_id"]).execute()
-            user["role"] = role_resp.data[0] if role_resp.data else {}
-        else:
-            user["role"] = {}
-
         # Stocker l'utilisateur dans l'état de la requête pour l'utiliser dans les routes
+        # (Principal immuable : pas besoin de copier l'entrée du cache)
         request.state.user = user
 
         return await call_next(request)
 
-    except jwt.ExpiredSignatureError:
-        return JSONResponse({"detail": "Token expiré"}, status_code=401)
+    # decode_token convertit déjà les erreurs PyJWT (dont l'expiration) en HTTPException 401
     except Exception as e:
         return JSONResponse({"detail": str(e)}, status_code=401)
@@ -0,0 +1,39 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Optional
+
+_NO_ROLE = MappingProxyType({})
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    # Utilisateur authentifié d'une requête : seulement ce dont les routes ont besoin (jamais le hash).
+    # Immuable, donc partagé tel quel entre le cache et les requêtes.
+    id: int
+    name: Optional[str]
+    email: str
+    role_id: Optional[int]
+    password_changed_at: Optional[int]
+    permissions: int
+    role: MappingProxyType
+
+    @classmethod
+    def from_row(cls, row: dict, role=None):
+        return cls(
+            id=row["id"],
+            name=row.get("name"),
+            email=row["email"],
+            role_id=row.get("role_id"),
+            password_changed_at=row.get("password_changed_at"),
+            permissions=role.mask if role else 0,
+            role=role.row if role else _NO_ROLE,
+        )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "email": self.email,
+            "role_id": self.role_id,
+            "role": dict(self.role),
+        }
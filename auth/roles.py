@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from config import ROLES_REFRESH_INTERVAL
+import repository
+
+logger = logging.getLogger(__name__)
+
+# Colonnes booléennes de la table roles, chacune compilée en un bit
+PERMISSIONS = ("can_post_login", "can_get_my_user", "can_get_users", "can_post_products", "can_publish_img")
+_PERMISSION_BITS = {name: 1 << index for index, name in enumerate(PERMISSIONS)}
+_PERMISSION_NAMES = {bit: name for name, bit in _PERMISSION_BITS.items()}
+
+# Délai minimal entre deux rechargements déclenchés par un role_id inconnu
+_MISS_REFRESH_INTERVAL = 1.0
+
+
+def permission(name: str) -> int:
+    # Appelé à l'import des modules de routes : une permission mal orthographiée empêche le démarrage
+    try:
+        return _PERMISSION_BITS[name]
+    except KeyError:
+        raise ValueError(f"Permission inconnue : {name}")
+
+
+def permission_name(bit: int) -> str:
+    return _PERMISSION_NAMES.get(bit, str(bit))
+
+
+@dataclass(frozen=True, slots=True)
+class Role:
+    id: int
+    name: str
+    mask: int
+    row: MappingProxyType
+
+
+def _compile(row: dict) -> Role:
+    mask = 0
+    for name, bit in _PERMISSION_BITS.items():
+        if row.get(name):
+            mask |= bit
+    return Role(id=row["id"], name=row.get("name"), mask=mask, row=MappingProxyType(dict(row)))
+
+
+@dataclass(frozen=True, slots=True)
+class RoleSnapshot:
+    by_id: MappingProxyType
+    id_by_name: MappingProxyType
+    loaded_at: float
+
+
+_snapshot = RoleSnapshot(MappingProxyType({}), MappingProxyType({}), 0.0)
+_refresh_lock = asyncio.Lock()
+_task = None
+
+
+async def refresh_roles():
+    # Le nouvel instantané remplace l'ancien d'un bloc : les lecteurs ne voient jamais d'état partiel
+    global _snapshot
+    roles = [_compile(row) for row in await repository.list_roles(",".join(("id", "name") + PERMISSIONS))]
+    _snapshot = RoleSnapshot(
+        by_id=MappingProxyType({role.id: role for role in roles}),
+        id_by_name=MappingProxyType({role.name: role.id for role in roles}),
+        loaded_at=time.monotonic(),
+    )
+    return _snapshot
+
+
+async def _refresh_on_miss():
+    async with _refresh_lock:
+        if time.monotonic() - _snapshot.loaded_at >= _MISS_REFRESH_INTERVAL:
+            await refresh_roles()
+
+
+async def get_role(role_id: int):
+    role = _snapshot.by_id.get(role_id)
+    if role is None:
+        await _refresh_on_miss()
+        role = _snapshot.by_id.get(role_id)
+    return role
+
+
+async def get_role_id_by_name(name: str):
+    role_id = _snapshot.id_by_name.get(name)
+    if role_id is None:
+        await _refresh_on_miss()
+        role_id = _snapshot.id_by_name.get(name)
+    return role_id
+
+
+async def _run():
+    while True:
+        await asyncio.sleep(ROLES_REFRESH_INTERVAL)
+        try:
+            await refresh_roles()
+        except Exception as e:
+            logger.warning("Rechargement des rôles impossible : %s", e)
+
+
+def roles_loaded() -> bool:
+    return _snapshot.loaded_at > 0
+
+
+async def start_roles():
+    global _task
+    await refresh_roles()
+    _task = asyncio.create_task(_run())
+
+
+async def stop_roles():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
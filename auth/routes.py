@@ -1,56 +1,59 @@
 from fastapi import APIRouter, HTTPException
 from models import UserRegister, UserLogin
-from database import supabase
 from auth.security import create_token
-import bcrypt
+from auth.hashing import hash_password, verify_password, needs_rehash
+from ratelimit import rate_limiter, LOGIN_EMAIL_POLICY
+from auth import roles
+import repository
 import time
 
 router = APIRouter()
 
-last_login_attempt = {}
-
-
+CAN_POST_LOGIN = roles.permission("can_post_login")
 
 @router.post("/register", tags=["Auth"])
-def register(user: UserRegister):
-    existing = supabase.table("users").select("*").eq("email", user.email).execute()
-    if existing.data:
+async def register(user: UserRegister):
+    if await repository.email_exists(user.email):
         raise HTTPException(status_code=400, detail="Email déjà utilisé")
 
-    hashed_pw = bcrypt.hashpw(user.password.encode('utf-8'), bcrypt.gensalt())
-    role_resp = supabase.table("roles").select("id").eq("name", "USER").execute()
-    role_id = role_resp.data[0]["id"] if role_resp.data else None
+    hashed_pw = await hash_password(user.password)
+    role_id = await roles.get_role_id_by_name("USER")
 
-    supabase.table("users").insert({
+    await repository.insert_user({
         "name": user.name,
         "email": user.email,
-        "password": hashed_pw.decode('utf-8'),
+        "password": hashed_pw,
         "password_changed_at": int(time.time()),
         "role_id": role_id
-    }).execute()
+    })
 
     return {"message": "Utilisateur créé"}
 
 @router.post("/login", tags=["Auth"])
-def login(user: UserLogin):
-    now = time.time()
-    if user.email in last_login_attempt and now - last_login_attempt[user.email] < 5:
-        raise HTTPException(status_code=429, detail="Attendez 5 secondes avant de réessayer")
-    last_login_attempt[user.email] = now
-
-    resp = supabase.table("users").select("*").eq("email", user.email).execute()
-    if not resp.data:
+async def login(user: UserLogin):
+    allowed, retry_after = await rate_limiter.hit(LOGIN_EMAIL_POLICY, user.email.lower())
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="Attendez 5 secondes avant de réessayer",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))}
+        )
+
+    db_user = await repository.get_login_row(user.email)
+    if not db_user:
         raise HTTPException(status_code=401, detail="Email ou mot de passe incorrect")
 
-    db_user = resp.data[0]
     if "role_id" in db_user and db_user["role_id"]:
-        role_resp = supabase.table("roles").select("*").eq("id", db_user["role_id"]).execute()
-        role = role_resp.data[0] if role_resp.data else None
-        if not role or not role.get("can_post_login"):
+        role = await roles.get_role(db_user["role_id"])
+        if not role or not role.mask & CAN_POST_LOGIN:
             raise HTTPException(status_code=403, detail="Permission de connexion refusée")
 
-    if not bcrypt.checkpw(user.password.encode('utf-8'), db_user["password"].encode('utf-8')):
+    if not await verify_password(user.password, db_user["password"]):
         raise HTTPException(status_code=401, detail="Email ou mot de passe incorrect")
 
+    # Hash créé avec un ancien coût bcrypt : on le remplace de façon transparente
+    if needs_rehash(db_user["password"]):
+        await repository.set_user_password_hash(db_user["email"], await hash_password(user.password))
+
     token = create_token(db_user["email"])
     return {"token": token}
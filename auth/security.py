@@ -1,26 +1,56 @@
-import jwt
 import time
+import hashlib
 from datetime import datetime, timedelta
 from fastapi import HTTPException
-from config import JWT_SECRET
-from database import supabase
+from cache import TTLCache
+from config import JWT_SECRET, JWT_CACHE_SIZE
+from auth.roles import permission_name
+from metrics import span
+
+# Clé préparée une seule fois au démarrage
+_SIGNING_KEY = JWT_SECRET.encode("utf-8") if JWT_SECRET else None
+_ALGORITHMS = ["HS256"]
+
+# Claims des tokens déjà vérifiés, indexés par le SHA-256 du token, valables jusqu'à leur `exp`
+verified_tokens = TTLCache(JWT_CACHE_SIZE, 3600)
 
 def create_token(email: str):
+    import jwt
+
     payload = {
         "email": email,
         "iat": int(time.time()),
         "exp": datetime.utcnow() + timedelta(hours=1)
     }
-    return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
+    return jwt.encode(payload, _SIGNING_KEY, algorithm="HS256")
 
 def decode_token(token: str):
+    digest = hashlib.sha256(token.encode("utf-8")).digest()
+    claims = verified_tokens.get(digest)
+    if claims is not None:
+        return dict(claims)
+
+    # PyJWT (et cryptography) chargés au premier token, pas à l'import
+    import jwt
+
     try:
-        return jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        with span("jwt", "decode"):
+            claims = jwt.decode(token, _SIGNING_KEY, algorithms=_ALGORITHMS)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expiré")
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Token invalide")
 
-def check_permission(user, permission: str):
-    if not user.get("role") or not user["role"].get(permission):
-        raise HTTPException(status_code=403, detail=f"Permission '{permission}' refusée")
+    # Un token sans `exp` n'est pas mis en cache ; password_changed_at reste vérifié par le middleware
+    exp = claims.get("exp")
+    if isinstance(exp, (int, float)) and exp > time.time():
+        verified_tokens.set(digest, claims, ttl=exp - time.time())
+    return dict(claims)
+
+def has_permission(user, permission: int) -> bool:
+    # `permission` est un bit obtenu via auth.roles.permission(...) à l'import du module
+    return bool(user.permissions & permission)
+
+def check_permission(user, permission: int):
+    if not user.permissions & permission:
+        raise HTTPException(status_code=403, detail=f"Permission '{permission_name(permission)}' refusée")
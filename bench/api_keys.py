@@ -0,0 +1,124 @@
+"""
+Banc de l'authentification par clé API : débit et latence de GET /my-user avec des clés valides,
+puis avec des clés invalides toutes différentes (bourrage), et requêtes reçues par la base pendant
+chaque phase. Une clé invalide ne doit coûter qu'un rafraîchissement incrémental de l'index par
+API_KEY_MISS_REFRESH_INTERVAL, quel que soit le débit.
+
+    python -m bench.api_keys --keys 1000 --duration 10 --concurrency 50 --output api_keys.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import secrets
+import sys
+import tempfile
+import time
+from pathlib import Path
+import httpx
+from auth.api_keys import api_key_prefix, hash_api_key
+from bench.run import Recorder, free_port, start_server, wait_ready
+
+
+async def seed(db_url: str, users: int, keys: int):
+    role = {"id": 1, "name": "USER", "can_post_login": True, "can_get_my_user": True, "can_get_users": True,
+            "can_post_products": True, "can_publish_img": True}
+    rows = [{"id": i + 1, "name": f"bench{i}", "email": f"bench{i}@example.com", "password": "x",
+             "password_changed_at": 0, "role_id": 1} for i in range(users)]
+    plain = [secrets.token_urlsafe(32) for _ in range(keys)]
+    api_keys = [{"id": i + 1, "user_id": (i % users) + 1, "name": f"bench{i}", "key_prefix": api_key_prefix(key),
+                 "key_hash": hash_api_key(key)} for i, key in enumerate(plain)]
+    async with httpx.AsyncClient(timeout=60) as client:
+        response = await client.post(f"{db_url}/seed", json={"roles": [role], "users": rows, "api_keys": api_keys})
+        response.raise_for_status()
+    return plain
+
+
+async def phase(app_url: str, db_url: str, name: str, next_key, args):
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=app_url, timeout=60, limits=limits) as client, httpx.AsyncClient() as db:
+        deadline = time.monotonic() + args.warmup + args.duration
+        measure_from = time.monotonic() + args.warmup
+        db_requests = None
+
+        async def worker():
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.get("/my-user", headers={"x-api-key": next_key()})
+                    ok = response.status_code == (200 if name == "valid" else 401)
+                except httpx.HTTPError:
+                    ok = False
+                if time.monotonic() >= measure_from:
+                    recorder.record(name, time.perf_counter() - started, ok)
+
+        async def sample_db():
+            # Compteur de la base relevé à la fin du warmup, puis à la fin de la phase
+            nonlocal db_requests
+            await asyncio.sleep(args.warmup)
+            db_requests = (await db.get(f"{db_url}/health")).json()["requests"]
+
+        await asyncio.gather(sample_db(), *(worker() for _ in range(args.concurrency)))
+        db_requests = (await db.get(f"{db_url}/health")).json()["requests"] - db_requests
+
+    stats = recorder.report(args.duration)["endpoints"].get(name, {"count": 0, "errors": 0, "rps": 0.0})
+    return {"keys": name, **stats, "db_requests": db_requests,
+            "db_requests_per_request": round(db_requests / stats["count"], 4) if stats["count"] else None}
+
+
+async def main(args):
+    random.seed(args.seed)
+    tmp = tempfile.mkdtemp(prefix="bench-api-keys-")
+    db_port, app_port = free_port(), free_port()
+    db_url, app_url = f"http://127.0.0.1:{db_port}", f"http://127.0.0.1:{app_port}"
+    processes = [start_server("bench.fake_postgrest:app", db_port, {"BENCH_DB_LATENCY_MS": str(args.db_latency_ms)})]
+    try:
+        await wait_ready(f"{db_url}/health")
+        keys = await seed(db_url, args.users, args.keys)
+        processes.append(start_server("main:app", app_port, {
+            "SUPABASE_URL": db_url,
+            "SUPABASE_KEY": "bench",
+            "JWT_SECRET": "bench-jwt-secret-with-enough-entropy!!",
+            "RATE_LIMIT_ENABLED": "false",
+            "WEBHOOK_QUEUE_PATH": str(Path(tmp) / "webhook_queue.sqlite3"),
+            "RATE_LIMIT_PATH": str(Path(tmp) / "ratelimit.sqlite3"),
+        }, workers=args.workers))
+        await wait_ready(f"{app_url}/ready")
+        report = {
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "phases": [
+                await phase(app_url, db_url, "valid", lambda: random.choice(keys), args),
+                # Une clé différente à chaque requête : le cache négatif ne sert pas, seul l'index protège la base
+                await phase(app_url, db_url, "invalid", lambda: secrets.token_urlsafe(32), args),
+            ],
+        }
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de l'authentification par clé API (clés valides et invalides)")
+    parser.add_argument("--keys", type=int, default=1000, help="clés valides en base")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10, help="durée mesurée par phase, en secondes")
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--db-latency-ms", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,162 @@
+"""
+Banc du catalogue GET /all-products à 10k et 100k produits : parcours complet par curseur puis
+lectures aléatoires simultanées (une partie revalidée avec If-None-Match → 304), p50/p99 par type
+de réponse et mémoire résidente du processus de l'application (RSS au démarrage, après, pic).
+
+    python -m bench.catalog --products 10000,100000 --duration 10 --concurrency 50 --output catalog.json
+
+Un seul worker uvicorn : le processus lancé est celui qui sert les requêtes (RSS lu dans /proc, Linux).
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+import httpx
+from bench.run import Recorder, free_port, start_server, wait_ready
+
+
+def memory(pid: int) -> dict:
+    # VmRSS : mémoire résidente actuelle, VmHWM : pic depuis le démarrage (en Mo)
+    values = {}
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as status:
+            for line in status:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    values[key] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return {"rss_mb": values.get("VmRSS"), "peak_rss_mb": values.get("VmHWM")}
+
+
+async def seed_products(db_url: str, count: int):
+    products = [{"id": i + 1, "name": f"Produit {i}", "price": round(random.uniform(1, 100), 2), "image_url": None,
+                 "sales_count": random.randint(0, 1000), "shopify_id": str(8000000000 + i), "created_by": 1}
+                for i in range(count)]
+    role = {"id": 1, "name": "USER", "can_post_login": True, "can_get_my_user": True, "can_get_users": True,
+            "can_post_products": True, "can_publish_img": True}
+    async with httpx.AsyncClient(timeout=120) as client:
+        response = await client.post(f"{db_url}/seed", json={"roles": [role], "products": products})
+        response.raise_for_status()
+
+
+async def walk(client: httpx.AsyncClient, limit: int):
+    # Parcours complet du catalogue, page après page (cache froid)
+    latencies, after, pages = [], None, 0
+    while True:
+        params = {"limit": limit} if after is None else {"limit": limit, "after": after}
+        started = time.perf_counter()
+        response = await client.get("/all-products", params=params)
+        latencies.append(time.perf_counter() - started)
+        response.raise_for_status()
+        pages += 1
+        after = response.json()["next_cursor"]
+        if after is None:
+            return pages, latencies
+
+
+async def random_reads(client: httpx.AsyncClient, products: int, args):
+    recorder = Recorder()
+    etags = {}
+    deadline = time.monotonic() + args.warmup + args.duration
+    measure_from = time.monotonic() + args.warmup
+
+    async def worker():
+        while time.monotonic() < deadline:
+            after = random.randrange(0, products, args.limit) or None
+            params = {"limit": args.limit} if after is None else {"limit": args.limit, "after": after}
+            headers = {}
+            if after in etags and random.random() < args.revalidate:
+                headers["If-None-Match"] = etags[after]
+            started = time.perf_counter()
+            try:
+                response = await client.get("/all-products", params=params, headers=headers)
+                ok = response.status_code in (200, 304)
+                etags[after] = response.headers.get("etag", etags.get(after))
+                endpoint = f"GET /all-products {response.status_code}"
+            except httpx.HTTPError:
+                ok, endpoint = False, "GET /all-products error"
+            if time.monotonic() >= measure_from:
+                recorder.record(endpoint, time.perf_counter() - started, ok)
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return recorder.report(args.duration)
+
+
+async def measure(products: int, args):
+    tmp = tempfile.mkdtemp(prefix="bench-catalog-")
+    db_port, app_port = free_port(), free_port()
+    db_url, app_url = f"http://127.0.0.1:{db_port}", f"http://127.0.0.1:{app_port}"
+    processes = [start_server("bench.fake_postgrest:app", db_port, {"BENCH_DB_LATENCY_MS": str(args.db_latency_ms)})]
+    try:
+        await wait_ready(f"{db_url}/health")
+        await seed_products(db_url, products)
+        app = start_server("main:app", app_port, {
+            "SUPABASE_URL": db_url,
+            "SUPABASE_KEY": "bench",
+            "JWT_SECRET": "bench-jwt-secret-with-enough-entropy!!",
+            "RATE_LIMIT_ENABLED": "false",
+            "WEBHOOK_QUEUE_PATH": str(Path(tmp) / "webhook_queue.sqlite3"),
+            "RATE_LIMIT_PATH": str(Path(tmp) / "ratelimit.sqlite3"),
+        })
+        processes.append(app)
+        # /ready : classement et index chargés, la mémoire mesurée au repos les inclut
+        await wait_ready(f"{app_url}/ready", timeout=300)
+        idle = memory(app.pid)
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=app_url, timeout=60, limits=limits) as client:
+            pages, latencies = await walk(client, args.limit)
+            latencies.sort()
+            report = await random_reads(client, products, args)
+        return {
+            "products": products,
+            "walk": {
+                "pages": pages,
+                "seconds": round(sum(latencies), 3),
+                "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+                "p99_ms": round(latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] * 1000, 3),
+            },
+            "random": report,
+            "memory": {"idle": idle, "after": memory(app.pid)},
+        }
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+async def main(args):
+    random.seed(args.seed)
+    report = {"config": {key: value for key, value in vars(args).items() if key != "output"}, "sizes": []}
+    for products in args.products:
+        report["sizes"].append(await measure(products, args))
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc du catalogue paginé (latence et mémoire)")
+    parser.add_argument("--products", type=lambda v: [int(x) for x in v.split(",")], default=[10000, 100000])
+    parser.add_argument("--limit", type=int, default=100, help="taille de page")
+    parser.add_argument("--duration", type=float, default=10, help="durée mesurée des lectures aléatoires, en secondes")
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--revalidate", type=float, default=0.5, help="part des lectures envoyées avec If-None-Match")
+    parser.add_argument("--db-latency-ms", type=float, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,199 @@
+import asyncio
+import bisect
+import json
+import os
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+# Stand-in PostgREST en mémoire : juste ce que l'application utilise
+# (select/eq/gt/in/order/limit, insert, update, delete et les RPC de sql/increment_sales.sql et sql/sync_products.sql)
+
+LATENCY = float(os.getenv("BENCH_DB_LATENCY_MS", "0")) / 1000
+
+tables = {"users": [], "roles": [], "api_keys": [], "products": []}
+next_ids = {name: 1 for name in tables}
+stats = {"requests": 0}
+_lock = asyncio.Lock()
+
+
+def _value(raw: str):
+    try:
+        return int(raw)
+    except ValueError:
+        try:
+            return float(raw)
+        except ValueError:
+            return raw
+
+
+def _matches(row: dict, column: str, expression: str) -> bool:
+    operator, _, raw = expression.partition(".")
+    value = row.get(column)
+    if operator == "eq":
+        return value is not None and str(value) == raw
+    if operator == "gt":
+        return value is not None and value > _value(raw)
+    if operator == "in":
+        wanted = {item.strip().strip('"') for item in raw.strip("()").split(",")}
+        return value is not None and str(value) in wanted
+    raise ValueError(f"Opérateur non supporté : {operator}")
+
+
+def _filter(rows, params):
+    reserved = {"select", "order", "limit", "offset", "columns", "on_conflict"}
+    filters = [(k, v) for k, v in params.multi_items() if k not in reserved]
+    return [row for row in rows if all(_matches(row, k, v) for k, v in filters)]
+
+
+_id_sorted = {}
+
+
+def _keyset_page(name: str, rows, params):
+    # Pagination par curseur (id=gt.X&order=id&limit=N) servie par dichotomie, comme l'index de la clé
+    # primaire côté Postgres : sans elle, le stand-in parcourt toute la table et fausse les bancs à 100k lignes
+    filters = [(k, v) for k, v in params.multi_items() if k not in ("select", "order", "limit")]
+    if params.get("order") not in ("id", "id.asc") or "limit" not in params:
+        return None
+    if filters and (len(filters) > 1 or filters[0][0] != "id" or not filters[0][1].startswith("gt.")):
+        return None
+    signature = (len(rows), rows[-1]["id"] if rows else None)
+    if _id_sorted.get(name) != signature:
+        if any(a["id"] >= b["id"] for a, b in zip(rows, rows[1:])):
+            return None
+        _id_sorted[name] = signature
+    start = bisect.bisect_right(rows, _value(filters[0][1][3:]), key=lambda row: row["id"]) if filters else 0
+    return rows[start:start + int(params["limit"])]
+
+
+def _project(rows, select: str):
+    if not select or select == "*":
+        return [dict(row) for row in rows]
+    columns = select.split(",")
+    return [{column: row.get(column) for column in columns} for row in rows]
+
+
+async def table_endpoint(request: Request):
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+    stats["requests"] += 1
+    name = request.path_params["table"]
+    rows = tables[name]
+    params = request.query_params
+
+    if request.method == "GET":
+        page = _keyset_page(name, rows, params)
+        if page is not None:
+            return JSONResponse(_project(page, params.get("select", "*")))
+        result = _filter(rows, params)
+        if "order" in params:
+            for clause in reversed(params["order"].split(",")):
+                column, _, direction = clause.partition(".")
+                result.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=direction.startswith("desc"))
+        if "limit" in params:
+            result = result[:int(params["limit"])]
+        return JSONResponse(_project(result, params.get("select", "*")))
+
+    async with _lock:
+        if request.method == "POST":
+            body = await request.json()
+            created = []
+            for item in body if isinstance(body, list) else [body]:
+                row = {"id": next_ids[name], **item}
+                next_ids[name] = max(next_ids[name], row["id"]) + 1
+                rows.append(row)
+                created.append(dict(row))
+            return JSONResponse(created, status_code=201)
+
+        matched = _filter(rows, params)
+        if request.method == "PATCH":
+            body = await request.json()
+            for row in matched:
+                row.update(body)
+            return JSONResponse([dict(row) for row in matched])
+        if request.method == "DELETE":
+            for row in matched:
+                rows.remove(row)
+            return JSONResponse([dict(row) for row in matched])
+    return JSONResponse({"message": "Méthode non supportée"}, status_code=405)
+
+
+async def _increment(column: str, key: str, items):
+    totals = {}
+    for item in items:
+        totals[str(item[key])] = totals.get(str(item[key]), 0) + int(item["quantity"])
+    updated = []
+    async with _lock:
+        for row in tables["products"]:
+            if str(row.get(column)) in totals:
+                row["sales_count"] = (row.get("sales_count") or 0) + totals[str(row[column])]
+                updated.append(dict(row))
+    return updated
+
+
+def _by_shopify_id():
+    # Index reconstruit quand la table products change de taille
+    products = tables["products"]
+    if _shopify_index.get("size") != len(products):
+        _shopify_index["rows"] = {str(row.get("shopify_id")): row for row in products}
+        _shopify_index["size"] = len(products)
+    return _shopify_index["rows"]
+
+
+_shopify_index = {}
+
+
+async def _sync(items):
+    updated = []
+    async with _lock:
+        by_shopify_id = _by_shopify_id()
+        for item in items:
+            row = by_shopify_id.get(str(item["shopify_id"]))
+            if row is None:
+                continue
+            for column in ("name", "price", "image_url"):
+                if column in item:
+                    row[column] = item[column]
+            row["sales_count"] = max(row.get("sales_count") or 0, item.get("sales_count") or 0)
+            updated.append(dict(row))
+    return updated
+
+
+async def rpc_endpoint(request: Request):
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+    stats["requests"] += 1
+    body = await request.json()
+    function = request.path_params["function"]
+    if function == "increment_sales_by_shopify_id":
+        return JSONResponse(await _increment("shopify_id", "shopify_id", body["items"]))
+    if function == "increment_sales_by_product_id":
+        return JSONResponse(await _increment("id", "product_id", body["items"]))
+    if function == "sync_products":
+        return JSONResponse(await _sync(body["rows"]))
+    return JSONResponse({"message": f"Fonction inconnue : {function}"}, status_code=404)
+
+
+async def health(request: Request):
+    return JSONResponse({"requests": stats["requests"], "rows": {name: len(rows) for name, rows in tables.items()}})
+
+
+async def seed(request: Request):
+    # Chargement direct des données de départ (sans passer par l'API de l'application)
+    body = await request.json()
+    async with _lock:
+        for name, rows in body.items():
+            for item in rows:
+                row = {"id": next_ids[name], **item}
+                next_ids[name] = max(next_ids[name], row["id"]) + 1
+                tables[name].append(row)
+    return JSONResponse({name: len(rows) for name, rows in tables.items()})
+
+
+app = Starlette(routes=[
+    Route("/health", health),
+    Route("/seed", seed, methods=["POST"]),
+    Route("/rest/v1/rpc/{function}", rpc_endpoint, methods=["POST"]),
+    Route("/rest/v1/{table}", table_endpoint, methods=["GET", "POST", "PATCH", "DELETE"]),
+])
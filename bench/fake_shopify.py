@@ -0,0 +1,142 @@
+import asyncio
+import itertools
+import os
+import time
+from datetime import datetime, timezone
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+# Stand-in de l'API Admin Shopify : produits et commandes, avec le seau de débit (40 appels, 2/s)
+
+LATENCY = float(os.getenv("BENCH_SHOPIFY_LATENCY_MS", "0")) / 1000
+BUCKET_SIZE = int(os.getenv("BENCH_SHOPIFY_BUCKET_SIZE", "40"))
+LEAK_RATE = float(os.getenv("BENCH_SHOPIFY_LEAK_RATE", "2"))
+RETRY_AFTER = os.getenv("BENCH_SHOPIFY_RETRY_AFTER", "1.0")
+
+_ids = itertools.count(9000000000)
+_bucket = {"level": 0.0, "updated_at": time.monotonic()}
+stats = {"requests": 0, "throttled": 0}
+# Triés par id, comme la pagination since_id de Shopify
+products = []
+orders = []
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _take():
+    now = time.monotonic()
+    _bucket["level"] = max(0.0, _bucket["level"] - (now - _bucket["updated_at"]) * LEAK_RATE)
+    _bucket["updated_at"] = now
+    if _bucket["level"] + 1 > BUCKET_SIZE:
+        return False
+    _bucket["level"] += 1
+    return True
+
+
+def _throttled():
+    stats["requests"] += 1
+    if _take():
+        return None
+    stats["throttled"] += 1
+    return JSONResponse({"errors": "Exceeded 2 calls per second for api client."}, status_code=429,
+                        headers={"Retry-After": RETRY_AFTER})
+
+
+def _call_limit():
+    return {"X-Shopify-Shop-Api-Call-Limit": f"{int(_bucket['level'])}/{BUCKET_SIZE}"}
+
+
+async def create_product(request: Request):
+    throttled = _throttled()
+    if throttled:
+        return throttled
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+    body = await request.json()
+    product = body["product"]
+    created = {
+        "id": next(_ids),
+        "title": product["title"],
+        "variants": product.get("variants", []),
+        "images": product.get("images", []),
+        "updated_at": _now(),
+    }
+    products.append(created)
+    return JSONResponse({"product": created}, status_code=201, headers=_call_limit())
+
+
+def _page(items, request: Request, key: str):
+    # since_id + limit (+ updated_at_min), champs filtrés par `fields`
+    params = request.query_params
+    limit = min(int(params.get("limit", "50")), 250)
+    since_id = int(params.get("since_id", "0"))
+    updated_at_min = params.get("updated_at_min")
+    updated_at_min = datetime.fromisoformat(updated_at_min) if updated_at_min else None
+    fields = params["fields"].split(",") if "fields" in params else None
+
+    page = []
+    for item in items[_start(items, since_id):]:
+        if updated_at_min and datetime.fromisoformat(item["updated_at"]) < updated_at_min:
+            continue
+        page.append({f: item.get(f) for f in fields} if fields else item)
+        if len(page) >= limit:
+            break
+    return JSONResponse({key: page}, headers=_call_limit())
+
+
+def _start(items, since_id: int) -> int:
+    # Premier élément d'id > since_id (recherche dichotomique)
+    low, high = 0, len(items)
+    while low < high:
+        middle = (low + high) // 2
+        if items[middle]["id"] <= since_id:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+async def list_products(request: Request):
+    throttled = _throttled()
+    if throttled:
+        return throttled
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+    return _page(products, request, "products")
+
+
+async def list_orders(request: Request):
+    throttled = _throttled()
+    if throttled:
+        return throttled
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+    return _page(orders, request, "orders")
+
+
+async def seed(request: Request):
+    # Ajout ou remplacement (même id) de produits et de commandes
+    body = await request.json()
+    for items, new_items in ((products, body.get("products", [])), (orders, body.get("orders", []))):
+        by_id = {item["id"]: item for item in items}
+        for item in new_items:
+            by_id[item["id"]] = {"updated_at": _now(), **item}
+        items[:] = sorted(by_id.values(), key=lambda item: item["id"])
+    return JSONResponse({"products": len(products), "orders": len(orders)})
+
+
+async def health(request: Request):
+    return JSONResponse(stats)
+
+
+app = Starlette(routes=[
+    Route("/health", health),
+    Route("/seed", seed, methods=["POST"]),
+    Route("/admin/api/{version}/products.json", create_product, methods=["POST"]),
+    Route("/admin/api/{version}/products.json", list_products, methods=["GET"]),
+    Route("/admin/api/{version}/orders.json", list_orders, methods=["GET"]),
+])
@@ -0,0 +1,109 @@
+"""
+Banc du démarrage à froid : temps d'import mesuré par `python -X importtime` dans un interpréteur neuf,
+pour `import main` puis `main.create_app()`. Échoue (code 1) au-delà du budget ou en cas de régression.
+
+    python -m bench.importtime --repeat 5 --budget-ms 900 --output importtime.json
+    python -m bench.importtime --compare importtime.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from bench.run import ROOT
+
+TARGETS = {
+    "import_main": "import main",
+    "create_app": "import main; main.create_app()",
+}
+# Modules lourds qui ne doivent être chargés qu'au premier usage (pool, client Shopify, JWT)
+DEFERRED = ("httpx", "postgrest", "jwt")
+
+
+def measure(code: str) -> dict:
+    # Interpréteur neuf, sans identifiants : la création de l'application ne doit pas en dépendre
+    env = {key: value for key, value in os.environ.items() if not key.startswith(("SUPABASE_", "SHOPIFY_"))}
+    check = f"{code}; import sys; print(','.join(m for m in {DEFERRED!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+
+    # Format : "import time: self [us] | cumulative | imported package"
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return {
+        "total_ms": sum(self_us for _, self_us, _ in modules) / 1000,
+        "modules": modules,
+        "deferred_loaded": [m for m in result.stdout.strip().split(",") if m],
+    }
+
+
+def run_target(code: str, repeat: int, top: int) -> dict:
+    runs = [measure(code) for _ in range(repeat)]
+    best = min(runs, key=lambda run: run["total_ms"])
+    # Coût cumulé des paquets de premier niveau (indentation minimale dans la sortie d'importtime)
+    roots = [(name.strip(), cumulative) for name, _, cumulative in best["modules"]
+             if len(name) - len(name.lstrip()) == 1]
+    return {
+        "median_ms": round(statistics.median(run["total_ms"] for run in runs), 1),
+        "min_ms": round(best["total_ms"], 1),
+        "modules": len(best["modules"]),
+        "deferred_loaded": best["deferred_loaded"],
+        "top_level": [{"module": name, "cumulative_ms": round(us / 1000, 1)}
+                      for name, us in sorted(roots, key=lambda item: -item[1])[:top]],
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, current in report["targets"].items():
+        previous = baseline.get("targets", {}).get(name)
+        if previous and current["median_ms"] > previous["median_ms"] * (1 + threshold):
+            regressions.append(f"{name}: {previous['median_ms']} ms -> {current['median_ms']} ms")
+    return regressions
+
+
+def main(args):
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "targets": {name: run_target(code, args.repeat, args.top) for name, code in TARGETS.items()},
+    }
+    failures = []
+    for name, target in report["targets"].items():
+        if target["deferred_loaded"]:
+            failures.append(f"{name}: modules chargés au démarrage {target['deferred_loaded']}")
+    if args.budget_ms and report["targets"]["create_app"]["median_ms"] > args.budget_ms:
+        failures.append(f"create_app: {report['targets']['create_app']['median_ms']} ms > budget {args.budget_ms} ms")
+    if args.compare:
+        failures += compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")), args.threshold)
+    report["failures"] = failures
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+    return 1 if failures else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc du temps d'import au démarrage")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="paquets de premier niveau affichés")
+    parser.add_argument("--budget-ms", type=float, help="temps médian maximal de create_app")
+    parser.add_argument("--compare", help="rapport JSON de référence")
+    parser.add_argument("--threshold", type=float, default=0.2, help="régression tolérée (0.2 = +20 %%)")
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
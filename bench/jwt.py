@@ -0,0 +1,140 @@
+"""
+Banc du cache des JWT vérifiés (auth/security.py, decode_token) : coût d'un décodage à froid
+(vérification PyJWT) et à chaud (entrée du cache), profil cProfile du chemin froid, puis débit et
+latence de GET /my-user en concurrence avec le cache actif et désactivé (JWT_CACHE_SIZE=0),
+cache des principaux actif dans les deux cas pour que la base ne masque pas le coût du décodage.
+
+    python -m bench.jwt --decodes 20000 --concurrency 1,10,50,100 --output jwt.json
+    python -m bench.jwt --decodes 20000 --profile --concurrency ""
+"""
+import argparse
+import asyncio
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import tempfile
+import time
+from argparse import Namespace
+from pathlib import Path
+
+os.environ.setdefault("SUPABASE_URL", "http://bench.invalid")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+os.environ.setdefault("JWT_SECRET", "bench-jwt-secret-with-enough-entropy!!")
+
+from auth.security import create_token, decode_token, verified_tokens
+from bench.run import free_port, seed_database, start_server, wait_ready
+from bench.scaling import login, sweep
+
+
+def percentiles(values):
+    values = sorted(values)
+    pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))] * 1e6, 2)
+    return {"p50_us": pick(0.50), "p99_us": pick(0.99)}
+
+
+def decodes(tokens, count: int, warm: bool):
+    samples = []
+    for i in range(count):
+        token = tokens[i % len(tokens)]
+        if not warm:
+            verified_tokens.clear()
+        started = time.perf_counter()
+        decode_token(token)
+        samples.append(time.perf_counter() - started)
+    return {"decodes": count, **percentiles(samples)}
+
+
+def profile_cold(tokens, count: int, top: int):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    for i in range(count):
+        verified_tokens.clear()
+        decode_token(tokens[i % len(tokens)])
+    profiler.disable()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+    return out.getvalue()
+
+
+def in_process(args):
+    tokens = [create_token(f"bench{i}@example.com") for i in range(args.users)]
+    verified_tokens.clear()
+    cold = decodes(tokens, args.decodes, warm=False)
+    for token in tokens:
+        decode_token(token)
+    warm = decodes(tokens, args.decodes, warm=True)
+    report = {"cold": cold, "warm": warm, "speedup_p50": round(cold["p50_us"] / warm["p50_us"], 1)}
+    if args.profile:
+        print(profile_cold(tokens, args.decodes, args.profile_top), file=sys.stderr)
+    return report
+
+
+async def end_to_end(jwt_cache_size: int, args):
+    tmp = tempfile.mkdtemp(prefix="bench-jwt-")
+    db_port, app_port = free_port(), free_port()
+    db_url, app_url = f"http://127.0.0.1:{db_port}", f"http://127.0.0.1:{app_port}"
+    processes = [start_server("bench.fake_postgrest:app", db_port, {"BENCH_DB_LATENCY_MS": str(args.db_latency_ms)})]
+    try:
+        await wait_ready(f"{db_url}/health")
+        users, _ = await seed_database(db_url, Namespace(bcrypt_rounds=4, users=args.users, products=10, corpus=None))
+        processes.append(start_server("main:app", app_port, {
+            "SUPABASE_URL": db_url,
+            "SUPABASE_KEY": "bench",
+            "JWT_SECRET": "bench-jwt-secret-with-enough-entropy!!",
+            "JWT_CACHE_SIZE": str(jwt_cache_size),
+            "RATE_LIMIT_ENABLED": "false",
+            "WEBHOOK_QUEUE_PATH": str(Path(tmp) / "webhook_queue.sqlite3"),
+            "RATE_LIMIT_PATH": str(Path(tmp) / "ratelimit.sqlite3"),
+        }, workers=args.workers))
+        await wait_ready(f"{app_url}/health")
+        return await sweep(app_url, await login(app_url, users), args)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+async def run(args):
+    report = {"decode": in_process(args)}
+    if args.concurrency:
+        report["my_user"] = {
+            "cache_off": await end_to_end(0, args),
+            "cache_on": await end_to_end(50000, args),
+        }
+    return report
+
+
+def main(args):
+    random.seed(args.seed)
+    report = {"config": {key: value for key, value in vars(args).items() if key != "output"}, **asyncio.run(run(args))}
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc du cache des JWT vérifiés")
+    parser.add_argument("--decodes", type=int, default=20000, help="décodages mesurés à froid et à chaud")
+    parser.add_argument("--users", type=int, default=200, help="jetons (utilisateurs) différents")
+    parser.add_argument("--profile", action="store_true", help="profil cProfile du décodage à froid (sur stderr)")
+    parser.add_argument("--profile-top", type=int, default=15)
+    parser.add_argument("--concurrency", type=lambda v: [int(x) for x in v.split(",") if x], default=[1, 10, 50, 100],
+                        help="paliers de GET /my-user (vide : décodage seul)")
+    parser.add_argument("--duration", type=float, default=5, help="durée mesurée par palier, en secondes")
+    parser.add_argument("--warmup", type=float, default=1)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--db-latency-ms", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,121 @@
+"""
+Banc du classement des meilleures ventes (leaderboard.py) : latence de Leaderboard.update (une commande
+de N lignes), de top() global et par créateur, et durée d'un rechargement complet, comparées au tri
+complet des produits à chaque lecture (ce que faisait /bestsellers avant le classement en mémoire).
+
+    python -m bench.leaderboard --products 10000,100000 --iterations 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("SUPABASE_URL", "http://bench.invalid")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+
+import leaderboard as leaderboard_module
+import repository
+from leaderboard import Leaderboard, LEADERBOARD_COLUMNS
+
+
+def percentiles(values):
+    values = sorted(values)
+    pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))] * 1e6, 2)
+    return {"p50_us": pick(0.50), "p99_us": pick(0.99)}
+
+
+def timed(func, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+def measure(products: int, args):
+    rng = random.Random(args.seed)
+    rows = [{"id": i + 1, "name": f"Produit {i}", "price": 10.0, "image_url": None,
+             "sales_count": rng.randint(0, 10000), "shopify_id": str(8000000000 + i),
+             "created_by": (i % args.creators) + 1} for i in range(products)]
+
+    async def page(after, limit, columns):
+        # Pages servies depuis la mémoire : on mesure le classement, pas la base
+        start = 0 if after is None else after
+        return rows[start:start + limit]
+
+    board = Leaderboard(args.k)
+    original = repository.list_products_page
+    repository.list_products_page = page
+    try:
+        started = time.perf_counter()
+        asyncio.run(board.load())
+        load_seconds = time.perf_counter() - started
+    finally:
+        repository.list_products_page = original
+
+    def order():
+        # Commande de N lignes : les ventes des produits touchés augmentent
+        updated = []
+        for row in rng.sample(rows, args.lines):
+            row["sales_count"] += rng.randint(1, 3)
+            updated.append(dict(row))
+        board.update(updated)
+
+    def top(creator_id=None):
+        with board._lock:
+            scope = board._global if creator_id is None else board._by_creator[creator_id]
+            return scope.top(args.limit)
+
+    def full_sort(creator_id=None):
+        scope = rows if creator_id is None else [row for row in rows if row["created_by"] == creator_id]
+        ordered = sorted(scope, key=lambda row: (-row["sales_count"], row["id"]))[:args.limit]
+        return [{column: row[column] for column in LEADERBOARD_COLUMNS} for row in ordered]
+
+    sort_iterations = max(1, args.iterations // 100)
+    result = {
+        "products": products,
+        "load_ms": round(load_seconds * 1000, 2),
+        "update": timed(order, args.iterations),
+        "top_global": timed(top, args.iterations),
+        "top_creator": timed(lambda: top(rng.randint(1, args.creators)), args.iterations),
+        "full_sort_global": timed(full_sort, sort_iterations),
+        "full_sort_creator": timed(lambda: full_sort(rng.randint(1, args.creators)), sort_iterations),
+    }
+    # Contrôle : le classement tenu à jour donne le même résultat que le tri complet
+    result["matches_full_sort"] = top() == full_sort() and top(1) == full_sort(1)
+    return result
+
+
+def main(args):
+    report = {"config": {key: value for key, value in vars(args).items() if key != "output"},
+              "page_size": leaderboard_module._LOAD_PAGE_SIZE, "sizes": []}
+    for products in args.products:
+        report["sizes"].append(measure(products, args))
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+    return 0 if all(size["matches_full_sort"] for size in report["sizes"]) else 1
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc du classement des meilleures ventes")
+    parser.add_argument("--products", type=lambda v: [int(x) for x in v.split(",")], default=[10000, 100000])
+    parser.add_argument("--creators", type=int, default=50)
+    parser.add_argument("--k", type=int, default=100, help="taille du classement (LEADERBOARD_SIZE)")
+    parser.add_argument("--limit", type=int, default=10, help="produits demandés par lecture")
+    parser.add_argument("--lines", type=int, default=5, help="lignes par commande")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,115 @@
+"""
+Banc de l'instrumentation (metrics.py) : coût d'un span() et d'une observation d'histogramme, surcoût
+par requête de metrics_middleware (avec et sans en-tête Server-Timing) sur une application minimale
+comparé à un middleware vide, et durée de rendu de /metrics pour `--series` séries d'histogrammes.
+
+    python -m bench.metrics --spans 100000 --requests 5000 --series 500 --output metrics.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("SUPABASE_URL", "http://bench.invalid")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+os.environ["SERVER_TIMING"] = "false"
+
+import httpx
+import metrics
+from metrics import histogram, metrics_middleware, render_prometheus, span
+
+
+def percentiles(values):
+    values = sorted(values)
+    pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))] * 1e6, 2)
+    return {"p50_us": pick(0.50), "p99_us": pick(0.99)}
+
+
+def spans(args):
+    samples = []
+    for _ in range(args.spans):
+        started = time.perf_counter()
+        with span("bench", "noop"):
+            pass
+        samples.append(time.perf_counter() - started)
+    return {"spans": args.spans, **percentiles(samples)}
+
+
+async def passthrough(request, call_next):
+    return await call_next(request)
+
+
+def app(middleware):
+    from fastapi import FastAPI
+    application = FastAPI()
+    application.middleware("http")(middleware)
+
+    @application.get("/items/{item_id}")
+    async def item(item_id: int):
+        with span("bench", "lookup"):
+            return {"id": item_id}
+    return application
+
+
+async def requests(application, args, headers=None):
+    transport = httpx.ASGITransport(app=application)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        samples = []
+        for i in range(args.requests):
+            started = time.perf_counter()
+            response = await client.get(f"/items/{i}", headers=headers)
+            samples.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.status_code
+    return percentiles(samples)
+
+
+def scrape(args):
+    for i in range(args.series):
+        histogram("bench_request_seconds", route=f"/route/{i}", status="200").observe(0.01 * (i % 100))
+    samples = []
+    for _ in range(args.scrapes):
+        started = time.perf_counter()
+        body = render_prometheus()
+        samples.append(time.perf_counter() - started)
+    return {"series": args.series, "bytes": len(body), **{key.replace("_us", "_ms"): round(value / 1000, 3)
+                                                         for key, value in percentiles(samples).items()}}
+
+
+async def run(args):
+    report = {"span": spans(args), "middleware": {
+        "passthrough": await requests(app(passthrough), args),
+        "metrics": await requests(app(metrics_middleware), args),
+        "metrics_server_timing": await requests(app(metrics_middleware), args, {"x-server-timing": "1"}),
+    }}
+    baseline = report["middleware"]["passthrough"]["p50_us"]
+    for name in ("metrics", "metrics_server_timing"):
+        report["middleware"][name]["overhead_p50_us"] = round(report["middleware"][name]["p50_us"] - baseline, 2)
+    report["scrape"] = scrape(args)
+    report["histograms"] = len(metrics.all_histograms())
+    return report
+
+
+def main(args):
+    report = {"config": {key: value for key, value in vars(args).items() if key != "output"}, **asyncio.run(run(args))}
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de l'instrumentation")
+    parser.add_argument("--spans", type=int, default=100000, help="spans mesurés")
+    parser.add_argument("--requests", type=int, default=5000, help="requêtes mesurées par variante")
+    parser.add_argument("--series", type=int, default=500, help="séries d'histogrammes rendues par /metrics")
+    parser.add_argument("--scrapes", type=int, default=50)
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
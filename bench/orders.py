@@ -0,0 +1,137 @@
+"""
+Micro-banc du chemin /create-order contre le stand-in PostgREST : commandes de 1, 10, 100 et 1000 lignes,
+RPC atomique groupée (repository.increment_sales_by_product_id) contre l'ancienne boucle
+select + update par ligne. Compte les requêtes reçues par la base et vérifie les ventes finales
+(incréments perdus quand des commandes simultanées touchent les mêmes produits).
+
+    python -m bench.orders --lines 1,10,100,1000 --orders 20 --parallel 4 --db-latency-ms 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+import httpx
+from bench.run import free_port, start_server, wait_ready
+
+
+async def per_line(increments: Counter):
+    # Ancien chemin (avant la RPC) : une lecture puis une écriture par ligne de commande
+    from database import get_db
+    updated = []
+    for product_id, quantity in increments.items():
+        resp = await get_db().table("products").select("*").eq("id", product_id).execute()
+        if not resp.data:
+            continue
+        sales_count = (resp.data[0]["sales_count"] or 0) + quantity
+        resp = await get_db().table("products").update({"sales_count": sales_count}).eq("id", product_id).execute()
+        updated.extend(resp.data)
+    return updated
+
+
+async def backend_state(client: httpx.AsyncClient, db_url: str):
+    requests = (await client.get(f"{db_url}/health")).json()["requests"]
+    rows = (await client.get(f"{db_url}/rest/v1/products", params={"select": "id,sales_count"})).json()
+    return requests, {row["id"]: row["sales_count"] for row in rows}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 3)
+
+
+async def run(args, db_url: str):
+    import repository
+    from database import init_db, close_db
+
+    await init_db()
+    results = []
+    async with httpx.AsyncClient() as client:
+        for lines in args.lines:
+            for mode, func in (("rpc", repository.increment_sales_by_product_id), ("per_line", per_line)):
+                if mode == "per_line" and lines > args.per_line_max:
+                    continue
+                orders = [Counter({product_id: random.randint(1, 3)
+                                   for product_id in random.sample(range(1, args.products + 1), lines)})
+                          for _ in range(args.orders)]
+                before_requests, before_counts = await backend_state(client, db_url)
+                latencies = []
+
+                async def timed(increments):
+                    started = time.perf_counter()
+                    await func(increments)
+                    latencies.append(time.perf_counter() - started)
+
+                # Commandes envoyées par groupes simultanés : l'ancien chemin perd des ventes sur les produits communs
+                for start in range(0, len(orders), args.parallel):
+                    await asyncio.gather(*(timed(increments) for increments in orders[start:start + args.parallel]))
+                after_requests, after_counts = await backend_state(client, db_url)
+
+                expected = Counter()
+                for increments in orders:
+                    expected.update(increments)
+                lost = sum(expected[i] - (after_counts[i] - before_counts[i]) for i in expected)
+                results.append({
+                    "lines": lines,
+                    "mode": mode,
+                    "orders": len(orders),
+                    # La lecture de l'état (GET products) compte pour une requête
+                    "db_requests_per_order": (after_requests - before_requests - 1) / len(orders),
+                    "p50_ms": percentile(latencies, 0.50),
+                    "p99_ms": percentile(latencies, 0.99),
+                    "lost_increments": lost,
+                })
+    await close_db()
+    return results
+
+
+async def main(args):
+    random.seed(args.seed)
+    db_port = free_port()
+    db_url = f"http://127.0.0.1:{db_port}"
+    os.environ.update({"SUPABASE_URL": db_url, "SUPABASE_KEY": "bench"})
+    process = start_server("bench.fake_postgrest:app", db_port, {"BENCH_DB_LATENCY_MS": str(args.db_latency_ms)})
+    try:
+        await wait_ready(f"{db_url}/health")
+        async with httpx.AsyncClient(timeout=60) as client:
+            await client.post(f"{db_url}/seed", json={
+                "products": [{"id": i + 1, "name": f"Produit {i}", "price": 10.0, "sales_count": 0,
+                              "shopify_id": str(i), "created_by": 1} for i in range(args.products)],
+            })
+        report = {
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "results": await run(args, db_url),
+        }
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-banc des commandes multi-lignes")
+    parser.add_argument("--lines", type=lambda v: [int(x) for x in v.split(",")], default=[1, 10, 100, 1000])
+    parser.add_argument("--orders", type=int, default=20, help="commandes par taille")
+    parser.add_argument("--parallel", type=int, default=4, help="commandes envoyées simultanément")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--db-latency-ms", type=float, default=2)
+    parser.add_argument("--per-line-max", type=int, default=1000, help="taille maximale mesurée avec l'ancien chemin")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    args = parser.parse_args(argv)
+    if max(args.lines) > args.products:
+        parser.error("--products doit être au moins égal à la plus grande commande (--lines)")
+    return args
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,120 @@
+"""
+Banc du limiteur de débit (ratelimit.py) : coût d'un contrôle RateLimiter.hit par backend (mémoire,
+SQLite partagé exécuté hors de la boucle), puis surcoût par requête du middleware sur une application
+minimale (une route, mêmes politiques par défaut) comparé à un middleware vide, en séquentiel et en concurrence.
+
+    python -m bench.ratelimit --checks 20000 --requests 5000 --output ratelimit.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("SUPABASE_URL", "http://bench.invalid")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+os.environ["RATE_LIMIT_ENABLED"] = "true"
+
+import httpx
+import ratelimit
+from ratelimit import DEFAULT_POLICIES, MemoryBackend, RateLimiter, SQLiteBackend, rate_limit_middleware
+
+
+def percentiles(values):
+    values = sorted(values)
+    pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))] * 1e6, 2)
+    return {"p50_us": pick(0.50), "p99_us": pick(0.99)}
+
+
+def backends(tmp: str, max_keys: int):
+    return {
+        "memory": lambda: MemoryBackend(max_keys),
+        "sqlite": lambda: SQLiteBackend(str(Path(tmp) / "ratelimit.sqlite3"), max_keys),
+    }
+
+
+async def checks(limiter: RateLimiter, args):
+    # Politique par IP par défaut, `--keys` clients différents (capacité jamais atteinte)
+    policy = DEFAULT_POLICIES[0]
+    samples = []
+    for i in range(args.checks):
+        started = time.perf_counter()
+        await limiter.hit(policy, f"10.0.{i % args.keys // 256}.{i % 256}")
+        samples.append(time.perf_counter() - started)
+    return {"checks": args.checks, **percentiles(samples), "per_second": round(args.checks / sum(samples))}
+
+
+async def passthrough(request, call_next):
+    return await call_next(request)
+
+
+def app(middleware):
+    # Référence : un middleware "http" qui ne fait rien (le coût propre de BaseHTTPMiddleware n'est pas celui du limiteur)
+    from fastapi import FastAPI
+    application = FastAPI()
+    application.middleware("http")(middleware)
+
+    @application.get("/ping")
+    async def ping():
+        return {"ok": True}
+    return application
+
+
+async def requests(application, args):
+    transport = httpx.ASGITransport(app=application, client=("127.0.0.1", 1234))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        sequential = []
+        for i in range(args.requests):
+            started = time.perf_counter()
+            response = await client.get("/ping", headers={"x-api-key": f"cle-{i % args.keys}"})
+            sequential.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.status_code
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client.get("/ping") for _ in range(args.requests)))
+        concurrent_seconds = time.perf_counter() - started
+    return {"sequential": percentiles(sequential),
+            "concurrent_rps": round(args.requests / concurrent_seconds)}
+
+
+async def run(args):
+    tmp = tempfile.mkdtemp(prefix="bench-ratelimit-")
+    # Capacités relevées : on mesure le coût du contrôle, pas des refus
+    ratelimit.DEFAULT_POLICIES[:] = [
+        ratelimit.Policy(p.name, p.key, capacity=10 ** 9, period=60) for p in DEFAULT_POLICIES
+    ]
+    report = {"checks": {}, "middleware": {"passthrough": await requests(app(passthrough), args)}}
+    for name, factory in backends(tmp, args.keys * 2).items():
+        limiter = RateLimiter(factory())
+        report["checks"][name] = await checks(limiter, args)
+        ratelimit.rate_limiter = limiter
+        report["middleware"][name] = await requests(app(rate_limit_middleware), args)
+    baseline = report["middleware"]["passthrough"]["sequential"]["p50_us"]
+    for name in backends(tmp, 0):
+        report["middleware"][name]["overhead_p50_us"] = round(report["middleware"][name]["sequential"]["p50_us"] - baseline, 2)
+    return report
+
+
+def main(args):
+    report = {"config": {key: value for key, value in vars(args).items() if key != "output"}, **asyncio.run(run(args))}
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc du limiteur de débit")
+    parser.add_argument("--checks", type=int, default=20000, help="contrôles mesurés par backend")
+    parser.add_argument("--requests", type=int, default=5000, help="requêtes mesurées par variante")
+    parser.add_argument("--keys", type=int, default=1000, help="clients (IP / clés API) différents")
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
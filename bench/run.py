@@ -0,0 +1,324 @@
+"""
+Banc de charge hors ligne : lance l'application contre les stand-ins PostgREST et Shopify,
+rejoue un mélange de requêtes et produit un rapport JSON (débit, p50/p95/p99 par endpoint).
+
+    python -m bench.run --duration 30 --concurrency 50 --db-latency-ms 5 --output bench.json
+    python -m bench.run --output new.json --compare bench.json
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+import bcrypt
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+WEBHOOK_SECRET = "bench-webhook-secret"
+DEFAULT_MIX = "catalog=50,api_key=15,bestsellers=10,order=10,webhook=10,login=4,product=1"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(target: str, port: int, env: dict, workers: int = 1, cwd: Path = ROOT):
+    # `cwd` : arbre de l'application à lancer (un autre commit extrait par bench.scaling, par exemple)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", target, "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=cwd, env={**os.environ, **env},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} ne répond pas")
+
+
+def load_corpus(path: str, count: int):
+    # Noms de produits tirés d'un fichier au format requests.jsonl (title / name par ligne)
+    names = []
+    if path and Path(path).exists():
+        with open(path, encoding="utf-8") as corpus:
+            for line in corpus:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    names.append(str(entry.get("title") or entry.get("name") or entry.get("request_id"))[:120])
+    if not names:
+        names = [f"Produit {i}" for i in range(100)]
+    return [f"{names[i % len(names)]} #{i}" for i in range(count)]
+
+
+def parse_mix(mix: str):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        self.samples.setdefault(endpoint, []).append(seconds)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, duration: float):
+        def percentile(values, q):
+            return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+        endpoints = {}
+        for endpoint, values in sorted(self.samples.items()):
+            values = sorted(values)
+            endpoints[endpoint] = {
+                "count": len(values),
+                "errors": self.errors.get(endpoint, 0),
+                "rps": round(len(values) / duration, 2),
+                "p50_ms": round(percentile(values, 0.50), 3),
+                "p95_ms": round(percentile(values, 0.95), 3),
+                "p99_ms": round(percentile(values, 0.99), 3),
+            }
+        total = sum(e["count"] for e in endpoints.values())
+        return {
+            "endpoints": endpoints,
+            "total": {
+                "count": total,
+                "errors": sum(self.errors.values()),
+                "rps": round(total / duration, 2),
+            },
+        }
+
+
+class Workload:
+    def __init__(self, client: httpx.AsyncClient, users, products, recorder: Recorder):
+        self.client = client
+        self.users = users
+        self.products = products
+        self.recorder = recorder
+        self.cursors = [None] + [p["id"] for p in products[::max(1, len(products) // 20)]]
+
+    async def _call(self, endpoint: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        self.recorder.record(endpoint, time.perf_counter() - started, ok)
+
+    async def catalog(self):
+        after = random.choice(self.cursors)
+        params = {"limit": 100} if after is None else {"limit": 100, "after": after}
+        await self._call("GET /all-products", "GET", "/all-products", params=params)
+
+    async def api_key(self):
+        user = random.choice(self.users)
+        await self._call("GET /my-products (api key)", "GET", "/my-products", headers={"x-api-key": user["api_key"]})
+
+    async def bestsellers(self):
+        user = random.choice(self.users)
+        await self._call("GET /my-bestsellers", "GET", "/my-bestsellers", params={"limit": 10},
+                         headers={"Authorization": f"Bearer {user['token']}"})
+
+    async def order(self):
+        user = random.choice(self.users)
+        items = [{"product_id": random.choice(self.products)["id"], "quantity": random.randint(1, 3)}
+                 for _ in range(random.randint(1, 5))]
+        await self._call("POST /create-order", "POST", "/create-order", json={"line_items": items},
+                         headers={"Authorization": f"Bearer {user['token']}"})
+
+    async def webhook(self):
+        items = [{"product_id": int(random.choice(self.products)["shopify_id"]), "quantity": random.randint(1, 3)}
+                 for _ in range(random.randint(1, 5))]
+        body = json.dumps({"id": random.randint(1, 10**9), "line_items": items}).encode()
+        signature = base64.b64encode(hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).digest()).decode()
+        await self._call("POST /webhooks/shopify-sales", "POST", "/webhooks/shopify-sales", content=body, headers={
+            "Content-Type": "application/json",
+            "X-Shopify-Hmac-Sha256": signature,
+            "X-Shopify-Webhook-Id": str(uuid.uuid4()),
+        })
+
+    async def login(self):
+        user = random.choice(self.users)
+        await self._call("POST /login", "POST", "/login", json={"email": user["email"], "password": user["password"]})
+
+    async def product(self):
+        user = random.choice(self.users)
+        await self._call("POST /products", "POST", "/products",
+                         json={"name": f"Bench {uuid.uuid4().hex[:8]}", "price": 9.99},
+                         headers={"Authorization": f"Bearer {user['token']}"})
+
+
+BENCH_PASSWORD = "bench-password"
+
+
+async def seed_database(db_url: str, args):
+    # Données chargées avant le démarrage de l'application pour que rôles et classement soient chauds
+    password = BENCH_PASSWORD
+    hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt(args.bcrypt_rounds)).decode()
+    users = [{"id": i + 1, "name": f"bench{i}", "email": f"bench{i}@example.com", "password": hashed,
+              "password_changed_at": 0, "role_id": 1} for i in range(args.users)]
+    products = [{"id": i + 1, "name": name, "price": round(random.uniform(1, 100), 2), "image_url": None,
+                 "sales_count": random.randint(0, 1000), "shopify_id": str(8000000000 + i),
+                 "created_by": (i % args.users) + 1} for i, name in enumerate(load_corpus(args.corpus, args.products))]
+    role = {"id": 1, "name": "USER", "can_post_login": True, "can_get_my_user": True, "can_get_users": True,
+            "can_post_products": True, "can_publish_img": True}
+
+    async with httpx.AsyncClient() as client:
+        response = await client.post(f"{db_url}/seed", json={"roles": [role], "users": users, "products": products})
+        response.raise_for_status()
+    return users, products
+
+
+async def provision_users(app_url: str, users):
+    # Tokens et clés API obtenus par l'application elle-même
+    async with httpx.AsyncClient(base_url=app_url, timeout=60) as client:
+        for user in users:
+            user["password"] = BENCH_PASSWORD
+            response = await client.post("/login", json={"email": user["email"], "password": BENCH_PASSWORD})
+            response.raise_for_status()
+            user["token"] = response.json()["token"]
+            response = await client.post("/api-keys", json={"name": "bench"}, headers={"Authorization": f"Bearer {user['token']}"})
+            response.raise_for_status()
+            user["api_key"] = response.json()["key"]
+
+
+async def run_workload(app_url: str, users, products, args):
+    recorder = Recorder()
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=app_url, timeout=60, limits=limits) as client:
+        workload = Workload(client, users, products, recorder)
+        deadline = time.monotonic() + args.warmup + args.duration
+        measure_from = time.monotonic() + args.warmup
+
+        async def worker():
+            while time.monotonic() < deadline:
+                scenario = random.choices(names, weights)[0]
+                await getattr(workload, scenario)()
+                # Pendant le warmup on jette les mesures
+                if time.monotonic() < measure_from:
+                    recorder.samples.clear()
+                    recorder.errors.clear()
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return recorder.report(args.duration)
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> bool:
+    # Affiche les écarts et renvoie True si au moins un endpoint régresse au-delà du seuil
+    regressed = False
+    print(f"{'endpoint':40} {'rps':>18} {'p99 ms':>22}")
+    for endpoint, now in current["endpoints"].items():
+        before = baseline["endpoints"].get(endpoint)
+        if before is None:
+            print(f"{endpoint:40} {'(nouveau)':>18}")
+            continue
+        rps_delta = (now["rps"] - before["rps"]) / before["rps"] if before["rps"] else 0.0
+        p99_delta = (now["p99_ms"] - before["p99_ms"]) / before["p99_ms"] if before["p99_ms"] else 0.0
+        flag = ""
+        if rps_delta < -threshold or p99_delta > threshold:
+            regressed = True
+            flag = "  RÉGRESSION"
+        print(f"{endpoint:40} {before['rps']:>8} -> {now['rps']:<8} {before['p99_ms']:>10} -> {now['p99_ms']:<10}{flag}")
+    return regressed
+
+
+async def main(args):
+    random.seed(args.seed)
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    db_port, shop_port, app_port = free_port(), free_port(), free_port()
+    db_url, shop_url, app_url = (f"http://127.0.0.1:{p}" for p in (db_port, shop_port, app_port))
+    processes = [
+        start_server("bench.fake_postgrest:app", db_port, {"BENCH_DB_LATENCY_MS": str(args.db_latency_ms)}),
+        start_server("bench.fake_shopify:app", shop_port, {"BENCH_SHOPIFY_LATENCY_MS": str(args.shopify_latency_ms)}),
+    ]
+    try:
+        await wait_ready(f"{db_url}/health")
+        await wait_ready(f"{shop_url}/health")
+        users, products = await seed_database(db_url, args)
+        processes.append(start_server("main:app", app_port, {
+            "SUPABASE_URL": db_url,
+            "SUPABASE_KEY": "bench",
+            "JWT_SECRET": "bench-jwt-secret-with-enough-entropy!!",
+            "SHOPIFY_STORE_URL": shop_url,
+            "SHOPIFY_ACCESS_TOKEN": "bench",
+            "SHOPIFY_SECRET_KEY": WEBHOOK_SECRET,
+            "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+            "RATE_LIMIT_ENABLED": "false",
+            "WEBHOOK_QUEUE_PATH": os.path.join(tmp, "webhook_queue.sqlite3"),
+            "RATE_LIMIT_PATH": os.path.join(tmp, "ratelimit.sqlite3"),
+        }, workers=args.workers))
+        await wait_ready(f"{app_url}/health")
+
+        await provision_users(app_url, users)
+        report = await run_workload(app_url, users, products, args)
+        report["config"] = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de charge de l'API contre des stand-ins locaux")
+    parser.add_argument("--duration", type=float, default=30, help="durée mesurée, en secondes")
+    parser.add_argument("--warmup", type=float, default=5, help="durée de chauffe non mesurée, en secondes")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=1, help="workers uvicorn de l'application")
+    parser.add_argument("--db-latency-ms", type=float, default=5)
+    parser.add_argument("--shopify-latency-ms", type=float, default=50)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--corpus", default=str(ROOT / "requests.jsonl"), help="fichier au format requests.jsonl")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="poids des scénarios, ex. catalog=50,login=5")
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    parser.add_argument("--compare", help="rapport JSON de référence")
+    parser.add_argument("--threshold", type=float, default=0.10, help="écart toléré avant régression (0.10 = 10 %%)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,161 @@
+"""
+Banc de montée en charge de l'accès aux données : débit et latence de GET /my-user (auth JWT, donc
+lecture users + roles à chaque requête sur un cache froid) pour des concurrences croissantes,
+sur l'arbre courant et/ou sur un autre commit extrait avec `git archive` (même stand-in PostgREST).
+
+Avant / après le passage au client async (un seul processus uvicorn, base à 20 ms) :
+
+    python -m bench.scaling --baseline-ref 2f9f2c6 --output scaling.json
+
+ou en deux temps, pour comparer deux rapports déjà produits :
+
+    python -m bench.scaling --ref 2f9f2c6 --output before.json
+    python -m bench.scaling --output after.json --compare before.json
+
+Les commits antérieurs au client async importent le paquet `supabase` : il doit être installé
+(avec une version de supabase_auth compatible) pour mesurer ces arbres.
+"""
+import argparse
+import asyncio
+import io
+import json
+import random
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from argparse import Namespace
+from pathlib import Path
+import httpx
+from bench.run import ROOT, BENCH_PASSWORD, Recorder, free_port, start_server, wait_ready, seed_database
+
+ENDPOINT = "GET /my-user"
+
+
+def extract(ref: str) -> Path:
+    # Copie de l'arbre du commit dans un répertoire temporaire
+    archive = subprocess.run(["git", "archive", ref], cwd=ROOT, capture_output=True, check=True).stdout
+    target = Path(tempfile.mkdtemp(prefix=f"bench-scaling-{ref[:12]}-"))
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(target)
+    return target
+
+
+async def login(app_url: str, users):
+    tokens = []
+    async with httpx.AsyncClient(base_url=app_url, timeout=60) as client:
+        for user in users:
+            response = await client.post("/login", json={"email": user["email"], "password": BENCH_PASSWORD})
+            response.raise_for_status()
+            tokens.append(response.json()["token"])
+    return tokens
+
+
+async def sweep(app_url: str, tokens, args):
+    levels = []
+    for concurrency in args.concurrency:
+        recorder = Recorder()
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=app_url, timeout=60, limits=limits) as client:
+            deadline = time.monotonic() + args.warmup + args.duration
+            measure_from = time.monotonic() + args.warmup
+
+            async def worker():
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        response = await client.get("/my-user", headers={"Authorization": f"Bearer {random.choice(tokens)}"})
+                        ok = response.status_code == 200
+                    except httpx.HTTPError:
+                        ok = False
+                    if time.monotonic() >= measure_from:
+                        recorder.record(ENDPOINT, time.perf_counter() - started, ok)
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        stats = recorder.report(args.duration)["endpoints"].get(ENDPOINT, {"count": 0, "errors": 0, "rps": 0.0})
+        levels.append({"concurrency": concurrency, **stats})
+    return levels
+
+
+async def measure(ref, args):
+    tree = extract(ref) if ref else ROOT
+    tmp = tempfile.mkdtemp(prefix="bench-scaling-")
+    db_port, app_port = free_port(), free_port()
+    db_url, app_url = f"http://127.0.0.1:{db_port}", f"http://127.0.0.1:{app_port}"
+    processes = [start_server("bench.fake_postgrest:app", db_port, {"BENCH_DB_LATENCY_MS": str(args.db_latency_ms)})]
+    try:
+        await wait_ready(f"{db_url}/health")
+        seed_args = Namespace(bcrypt_rounds=args.bcrypt_rounds, users=args.users, products=10, corpus=None)
+        users, _ = await seed_database(db_url, seed_args)
+        processes.append(start_server("main:app", app_port, {
+            "SUPABASE_URL": db_url,
+            "SUPABASE_KEY": "bench",
+            "JWT_SECRET": "bench-jwt-secret-with-enough-entropy!!",
+            "RATE_LIMIT_ENABLED": "false",
+            # Cache des principaux désactivé : chaque requête mesure bien l'accès à la base
+            "PRINCIPAL_CACHE_SIZE": "0",
+            "WEBHOOK_QUEUE_PATH": str(Path(tmp) / "webhook_queue.sqlite3"),
+            "RATE_LIMIT_PATH": str(Path(tmp) / "ratelimit.sqlite3"),
+        }, workers=args.workers, cwd=tree))
+        await wait_ready(f"{app_url}/health")
+        tokens = await login(app_url, users)
+        return {"ref": ref or "working tree", "levels": await sweep(app_url, tokens, args)}
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+def compare(before: dict, after: dict):
+    print(f"{'concurrence':>12} {'rps avant':>12} {'rps après':>12} {'x':>6} {'p99 avant':>12} {'p99 après':>12}")
+    by_level = {level["concurrency"]: level for level in before["levels"]}
+    for level in after["levels"]:
+        old = by_level.get(level["concurrency"])
+        if old is None:
+            continue
+        ratio = level["rps"] / old["rps"] if old["rps"] else float("inf")
+        print(f"{level['concurrency']:>12} {old['rps']:>12} {level['rps']:>12} {ratio:>6.1f} "
+              f"{old.get('p99_ms', '-'):>12} {level.get('p99_ms', '-'):>12}")
+
+
+async def main(args):
+    random.seed(args.seed)
+    report = {"config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")}, "trees": {}}
+    if args.baseline_ref:
+        report["trees"]["baseline"] = await measure(args.baseline_ref, args)
+    report["trees"]["current"] = await measure(args.ref, args)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+
+    if args.baseline_ref:
+        compare(report["trees"]["baseline"], report["trees"]["current"])
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text(encoding="utf-8"))["trees"]
+        compare(previous.get("current") or next(iter(previous.values())), report["trees"]["current"])
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de montée en charge de l'accès aux données")
+    parser.add_argument("--ref", help="commit à mesurer (par défaut l'arbre de travail)")
+    parser.add_argument("--baseline-ref", help="commit de référence mesuré avant l'arbre courant")
+    parser.add_argument("--concurrency", type=lambda v: [int(x) for x in v.split(",")], default=[1, 10, 50, 100])
+    parser.add_argument("--duration", type=float, default=10, help="durée mesurée par palier, en secondes")
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--db-latency-ms", type=float, default=20)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    parser.add_argument("--compare", help="rapport JSON produit avant (bench.scaling)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,112 @@
+"""
+Banc des chemins de lecture : octets envoyés, temps de sérialisation et allocations,
+`select *` + encodeur FastAPI par défaut contre projection + FastJSONResponse (orjson).
+
+    python -m bench.serialization --rows 10000 --repeat 20
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+os.environ.setdefault("SUPABASE_URL", "http://bench.invalid")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from responses import FastJSONResponse, orjson
+from auth.principal import Principal
+from auth.roles import _compile
+from repository import PRODUCT_COLUMNS
+
+
+def full_product(i: int) -> dict:
+    # Ligne telle que renvoyée par select("*") (colonnes non utilisées par les listes comprises)
+    return {
+        "id": i, "name": f"Produit {i}", "price": 10.0 + i % 90, "image_url": f"https://cdn.example.com/{i}.png",
+        "sales_count": i * 7 % 1000, "shopify_id": str(9000000000 + i), "created_by": i % 50,
+        "description": "Lorem ipsum dolor sit amet, " * 8, "created_at": "2026-01-01T00:00:00+00:00",
+        "updated_at": "2026-06-01T12:00:00+00:00", "vendor": "Boutique", "tags": ["a", "b", "c"],
+    }
+
+
+def user_row(i: int) -> dict:
+    return {
+        "id": i, "name": f"user{i}", "email": f"user{i}@example.com", "role_id": 1,
+        "password": "$2b$12$" + "x" * 53, "password_changed_at": 1700000000, "created_at": "2026-01-01T00:00:00+00:00",
+    }
+
+
+def measure(func, repeat: int):
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return result, {"ms": round((time.perf_counter() - started) / repeat * 1000, 3), "peak_alloc_bytes": peak}
+
+
+def retained(factory):
+    # Mémoire retenue par les objets construits
+    gc.collect()
+    tracemalloc.start()
+    objects = factory()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size
+
+
+def main(args):
+    full = [full_product(i) for i in range(args.rows)]
+    projected = [{column: row[column] for column in PRODUCT_COLUMNS} for row in full]
+
+    report = {"config": vars(args), "orjson": orjson is not None, "products": {}}
+    variants = {
+        "select_star+default_encoder": lambda: JSONResponse(jsonable_encoder({"My Products": full})).body,
+        "select_star+fast_json": lambda: FastJSONResponse({"My Products": full}).body,
+        "projection+default_encoder": lambda: JSONResponse(jsonable_encoder({"My Products": projected})).body,
+        "projection+fast_json": lambda: FastJSONResponse({"My Products": projected}).body,
+    }
+    for name, func in variants.items():
+        body, stats = measure(func, args.repeat)
+        report["products"][name] = {"bytes": len(body), **stats}
+    # Coût de jsonable_encoder seul, payé par toute route qui renvoie un dict
+    _, stats = measure(lambda: jsonable_encoder({"My Products": projected}), args.repeat)
+    report["products"]["jsonable_encoder_only"] = stats
+
+    role = _compile({"id": 1, "name": "USER", "can_post_login": True, "can_get_my_user": True})
+    report["principal_memory_bytes"] = {
+        "dict_full_row": retained(lambda: [{**user_row(i), "role": dict(role.row), "permissions": role.mask}
+                                           for i in range(args.rows)]),
+        "principal_slots": retained(lambda: [Principal.from_row(user_row(i), role) for i in range(args.rows)]),
+    }
+    report["leaderboard_row_memory_bytes"] = {
+        "dict": retained(lambda: [dict(row) for row in projected]),
+        "tuple": retained(lambda: [tuple(row[c] for c in PRODUCT_COLUMNS) for row in projected]),
+    }
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc des projections et de la sérialisation JSON")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
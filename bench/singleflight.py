@@ -0,0 +1,128 @@
+"""
+Banc du regroupement des lectures (singleflight.py) : rafales de N appels identiques simultanés,
+avec et sans regroupement, contre le stand-in PostgREST. Compte les requêtes reçues par la base.
+
+    python -m bench.singleflight --bursts 10,100,1000 --db-latency-ms 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import httpx
+from bench.run import free_port, start_server, wait_ready
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 3)
+
+
+async def backend_requests(client: httpx.AsyncClient, db_url: str) -> int:
+    return (await client.get(f"{db_url}/health")).json()["requests"]
+
+
+async def burst(func, args, size: int):
+    latencies = []
+
+    async def call():
+        started = time.perf_counter()
+        await func(*args)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call() for _ in range(size)))
+    return time.perf_counter() - started, latencies
+
+
+def thread_burst(size: int, delay: float):
+    # Variante synchrone : N threads appellent la même fonction lente
+    from singleflight import ThreadSingleFlight
+    flight = ThreadSingleFlight("bench")
+    executions = []
+
+    def slow():
+        executions.append(1)
+        time.sleep(delay)
+        return "ok"
+
+    with ThreadPoolExecutor(max_workers=min(size, 64)) as pool:
+        started = time.perf_counter()
+        list(pool.map(lambda _: flight.do("key", slow), range(size)))
+        elapsed = time.perf_counter() - started
+    return {"callers": size, "executions": len(executions), "seconds": round(elapsed, 3)}
+
+
+async def run(args, db_url: str):
+    import repository
+    from database import init_db, close_db
+
+    await init_db()
+    results = []
+    operations = {
+        "get_user_by_email": (repository.get_user_by_email, ("bench@example.com",)),
+        "list_products_page": (repository.list_products_page, (None, 100, "*")),
+    }
+    async with httpx.AsyncClient() as client:
+        for name, (wrapped, call_args) in operations.items():
+            for size in args.bursts:
+                for mode, func in (("direct", wrapped.__wrapped__), ("singleflight", wrapped)):
+                    before = await backend_requests(client, db_url)
+                    elapsed, latencies = await burst(func, call_args, size)
+                    results.append({
+                        "operation": name,
+                        "mode": mode,
+                        "callers": size,
+                        "backend_requests": await backend_requests(client, db_url) - before,
+                        "seconds": round(elapsed, 3),
+                        "p50_ms": percentile(latencies, 0.50),
+                        "p99_ms": percentile(latencies, 0.99),
+                    })
+    await close_db()
+    return results
+
+
+async def main(args):
+    db_port = free_port()
+    db_url = f"http://127.0.0.1:{db_port}"
+    os.environ.update({"SUPABASE_URL": db_url, "SUPABASE_KEY": "bench", "DB_POOL_MAX_CONNECTIONS": str(args.pool)})
+    process = start_server("bench.fake_postgrest:app", db_port, {"BENCH_DB_LATENCY_MS": str(args.db_latency_ms)})
+    try:
+        await wait_ready(f"{db_url}/health")
+        async with httpx.AsyncClient() as client:
+            await client.post(f"{db_url}/seed", json={
+                "users": [{"id": 1, "name": "bench", "email": "bench@example.com", "password": "x", "role_id": 1}],
+                "products": [{"id": i + 1, "name": f"Produit {i}", "price": 10.0, "sales_count": 0,
+                              "shopify_id": str(i), "created_by": 1} for i in range(args.products)],
+            })
+        report = {
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "async": await run(args, db_url),
+            "threads": [thread_burst(size, args.db_latency_ms / 1000) for size in args.bursts],
+        }
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc du regroupement des lectures identiques")
+    parser.add_argument("--bursts", type=lambda v: [int(x) for x in v.split(",")], default=[10, 100, 1000])
+    parser.add_argument("--db-latency-ms", type=float, default=20)
+    parser.add_argument("--pool", type=int, default=50, help="connexions max du pool PostgREST")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,180 @@
+"""
+Banc de la réconciliation Shopify → Supabase sur une boutique simulée (100 000 produits par défaut) :
+passe complète, passe incrémentale après modifications, puis passe à vide.
+
+    python -m bench.sync --products 100000 --orders 50000 --output sync.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+import httpx
+from bench.run import ROOT, free_port, start_server, wait_ready
+
+SHOPIFY_ID_BASE = 9000000000
+
+
+def generate(args):
+    products = [{
+        "id": SHOPIFY_ID_BASE + i,
+        "title": f"Produit {i}",
+        "variants": [{"price": f"{random.uniform(1, 100):.2f}"}],
+        "images": [],
+        "updated_at": "2025-01-01T00:00:00+00:00",
+    } for i in range(args.products)]
+    orders = [{
+        "id": i + 1,
+        "line_items": [{"product_id": SHOPIFY_ID_BASE + random.randrange(args.products), "quantity": random.randint(1, 3)}
+                       for _ in range(random.randint(1, 4))],
+    } for i in range(args.orders)]
+    return products, orders
+
+
+def database_rows(products, orders, args):
+    # Base en dérive : noms non modifiés côté Supabase et webhooks perdus sur une partie des produits
+    totals = Counter()
+    for order in orders:
+        for item in order["line_items"]:
+            totals[item["product_id"]] += item["quantity"]
+    rows = []
+    for i, product in enumerate(products):
+        drifted = random.random() < args.drift
+        rows.append({
+            "id": i + 1,
+            "name": product["title"] + (" (ancien nom)" if drifted else ""),
+            "price": float(product["variants"][0]["price"]),
+            "image_url": None,
+            "sales_count": max(0, totals[product["id"]] - (random.randint(1, 3) if drifted else 0)),
+            "shopify_id": str(product["id"]),
+            "created_by": 1,
+        })
+    return rows
+
+
+def run_sync(env: dict, *flags):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-m", "catalog_sync", *flags],
+        cwd=ROOT, env={**os.environ, **env}, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    report = json.loads(result.stdout)
+    report["wall_seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+async def check(db_url: str, shop_url: str):
+    # Écarts restants entre la base et la boutique simulée
+    async with httpx.AsyncClient(timeout=120) as client:
+        rows = (await client.get(f"{db_url}/rest/v1/products", params={"select": "shopify_id,name,sales_count"})).json()
+        products, orders, since_id = {}, Counter(), 0
+        while True:
+            page = (await client.get(f"{shop_url}/admin/api/bench/products.json",
+                                     params={"limit": 250, "since_id": since_id})).json()["products"]
+            if not page:
+                break
+            products.update({str(p["id"]): p["title"] for p in page})
+            since_id = page[-1]["id"]
+        since_id = 0
+        while True:
+            page = (await client.get(f"{shop_url}/admin/api/bench/orders.json",
+                                     params={"limit": 250, "since_id": since_id})).json()["orders"]
+            if not page:
+                break
+            for order in page:
+                for item in order["line_items"]:
+                    orders[str(item["product_id"])] += item["quantity"]
+            since_id = page[-1]["id"]
+    return {
+        "name_mismatches": sum(1 for row in rows if products.get(row["shopify_id"]) != row["name"]),
+        "sales_below_shopify": sum(1 for row in rows if (row["sales_count"] or 0) < orders[row["shopify_id"]]),
+    }
+
+
+async def main(args):
+    random.seed(args.seed)
+    tmp = tempfile.mkdtemp(prefix="bench-sync-")
+    db_port, shop_port = free_port(), free_port()
+    db_url, shop_url = f"http://127.0.0.1:{db_port}", f"http://127.0.0.1:{shop_port}"
+    shopify_env = {"BENCH_SHOPIFY_BUCKET_SIZE": str(args.shopify_bucket), "BENCH_SHOPIFY_LEAK_RATE": str(args.shopify_rate),
+                   "BENCH_SHOPIFY_LATENCY_MS": str(args.shopify_latency_ms)}
+    processes = [
+        start_server("bench.fake_postgrest:app", db_port, {"BENCH_DB_LATENCY_MS": str(args.db_latency_ms)}),
+        start_server("bench.fake_shopify:app", shop_port, shopify_env),
+    ]
+    sync_env = {
+        "SUPABASE_URL": db_url,
+        "SUPABASE_KEY": "bench",
+        "SHOPIFY_STORE_URL": shop_url,
+        "SHOPIFY_ACCESS_TOKEN": "bench",
+        "SHOPIFY_BUCKET_LEAK_RATE": str(args.shopify_rate),
+        "SYNC_STATE_PATH": os.path.join(tmp, "catalog_sync.sqlite3"),
+        "SYNC_PAGE_SIZE": "250",
+    }
+    report = {"config": {key: value for key, value in vars(args).items() if key != "output"}}
+    try:
+        await wait_ready(f"{db_url}/health")
+        await wait_ready(f"{shop_url}/health")
+
+        products, orders = generate(args)
+        async with httpx.AsyncClient(timeout=300) as client:
+            await client.post(f"{shop_url}/seed", json={"products": products, "orders": orders})
+            await client.post(f"{db_url}/seed", json={"products": database_rows(products, orders, args)})
+        report["before"] = await check(db_url, shop_url)
+
+        report["full"] = run_sync(sync_env, "--full")
+        report["after_full"] = await check(db_url, shop_url)
+
+        # Modifications côté Shopify (titres édités, nouvelles commandes) puis passe incrémentale
+        edited = [dict(product, title=product["title"] + " v2", updated_at=datetime.now(timezone.utc).isoformat())
+                  for product in random.sample(products, min(args.edits, len(products)))]
+        new_orders = [{
+            "id": args.orders + i + 1,
+            "line_items": [{"product_id": SHOPIFY_ID_BASE + random.randrange(args.products), "quantity": 1}],
+        } for i in range(args.new_orders)]
+        async with httpx.AsyncClient(timeout=300) as client:
+            await client.post(f"{shop_url}/seed", json={"products": edited, "orders": new_orders})
+        report["incremental"] = run_sync(sync_env)
+        report["after_incremental"] = await check(db_url, shop_url)
+
+        report["idle"] = run_sync(sync_env)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de la réconciliation Shopify → Supabase")
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--drift", type=float, default=0.02, help="part des produits en dérive au départ")
+    parser.add_argument("--edits", type=int, default=500, help="produits modifiés avant la passe incrémentale")
+    parser.add_argument("--new-orders", type=int, default=1000)
+    parser.add_argument("--db-latency-ms", type=float, default=2)
+    parser.add_argument("--shopify-latency-ms", type=float, default=20)
+    parser.add_argument("--shopify-rate", type=float, default=1000, help="appels/s autorisés (2 sur une boutique standard)")
+    parser.add_argument("--shopify-bucket", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
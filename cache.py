@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+from config import PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL, CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL
+
+
+class TTLCache:
+    # Cache mémoire borné : expiration par TTL + éviction LRU quand il est plein
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Incrémentée à chaque invalidation : une lecture commencée avant ne doit pas remplir le cache
+        self.generation = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None, generation: int = None):
+        # `ttl` permet une durée de vie propre à l'entrée (ex. jusqu'à l'expiration d'un JWT).
+        # `generation` : valeur de self.generation lue avant la lecture en base ; si une invalidation
+        # a eu lieu entre-temps, la valeur est peut-être périmée et n'est pas mise en cache.
+        if self.maxsize <= 0:
+            return False
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def invalidate(self, key):
+        with self._lock:
+            self.generation += 1
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        # Supprime toutes les entrées dont la valeur vérifie le prédicat
+        with self._lock:
+            self.generation += 1
+            for key in [k for k, (_, v) in self._data.items() if predicate(v)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Utilisateurs authentifiés (avec leur rôle), indexés par email JWT ou par clé API
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+# Pages de /all-products déjà sérialisées (corps JSON + ETag), vidé à chaque modification de produit
+catalog_cache = TTLCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL)
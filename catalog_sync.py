@@ -0,0 +1,411 @@
+"""
+Réconciliation incrémentale Shopify → Supabase : corrige nom, prix, image et sales_count
+des produits quand un webhook a été perdu ou qu'un produit a été modifié dans Shopify.
+
+    python -m catalog_sync            # passe incrémentale (reprend au dernier point de reprise)
+    python -m catalog_sync --full     # relit tout le catalogue Shopify et reconstruit l'index
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from cache import catalog_cache
+from leaderboard import leaderboard
+from shopify_api import shopify_client
+from database import init_db, close_db
+from config import SYNC_STATE_PATH, SYNC_PAGE_SIZE, SYNC_INTERVAL, SYNC_LEASE_TTL
+import repository
+
+logger = logging.getLogger(__name__)
+
+INDEX_COLUMNS = "id,shopify_id,name,price,image_url,sales_count"
+_INDEX_PAGE_SIZE = 1000
+# Recouvrement entre deux passes pour ne pas perdre une modification faite pendant la précédente
+_UPDATED_AT_OVERLAP = timedelta(minutes=5)
+
+
+def _fields(name, price, image_url) -> dict:
+    return {"name": name, "price": round(float(price or 0), 2), "image_url": image_url}
+
+
+def shopify_fields(product: dict) -> dict:
+    variants = product.get("variants") or [{}]
+    images = product.get("images") or []
+    return _fields(product.get("title"), variants[0].get("price"), images[0].get("src") if images else None)
+
+
+def fields_hash(fields: dict) -> str:
+    encoded = json.dumps([fields["name"], fields["price"], fields["image_url"]], ensure_ascii=False)
+    return hashlib.blake2b(encoded.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class SyncState:
+    # Points de reprise, index shopify_id → hash et totaux de ventes Shopify (SQLite, WAL)
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS checkpoints (name TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS product_index (
+                    shopify_id TEXT PRIMARY KEY,
+                    product_id INTEGER NOT NULL,
+                    hash TEXT NOT NULL,
+                    sales_count INTEGER NOT NULL,
+                    seen_run INTEGER
+                );
+                CREATE TABLE IF NOT EXISTS shopify_sales (shopify_id TEXT PRIMARY KEY, quantity INTEGER NOT NULL);
+                CREATE TABLE IF NOT EXISTS lease (id INTEGER PRIMARY KEY CHECK (id = 1), owner TEXT, expires_at REAL);
+            """)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def get(self, name: str, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM checkpoints WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, conn, **values):
+        conn.executemany(
+            "INSERT OR REPLACE INTO checkpoints (name, value) VALUES (?, ?)",
+            [(name, json.dumps(value)) for name, value in values.items()]
+        )
+
+    def update_checkpoints(self, **values):
+        with self._transaction() as conn:
+            self.set(conn, **values)
+
+    def acquire_lease(self, owner: str, ttl: float) -> bool:
+        # Un seul processus réconcilie à la fois (workers uvicorn, cron, CLI manuelle)
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT owner, expires_at FROM lease WHERE id = 1").fetchone()
+            if row and row[0] != owner and row[1] > now:
+                return False
+            conn.execute("INSERT OR REPLACE INTO lease (id, owner, expires_at) VALUES (1, ?, ?)", (owner, now + ttl))
+            return True
+
+    def release_lease(self, owner: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM lease WHERE id = 1 AND owner = ?", (owner,))
+
+    def index_size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM product_index").fetchone()[0]
+
+    def clear_index(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM product_index")
+
+    def reset(self):
+        with self._transaction() as conn:
+            for table in ("checkpoints", "product_index", "shopify_sales"):
+                conn.execute(f"DELETE FROM {table}")
+
+    def index_rows(self, rows):
+        # rows : [(shopify_id, product_id, hash, sales_count)]
+        with self._transaction() as conn:
+            conn.executemany("""
+                INSERT INTO product_index (shopify_id, product_id, hash, sales_count) VALUES (?, ?, ?, ?)
+                ON CONFLICT (shopify_id) DO UPDATE SET
+                    product_id = excluded.product_id, hash = excluded.hash, sales_count = excluded.sales_count
+            """, rows)
+
+    def lookup(self, shopify_ids) -> dict:
+        with self._lock:
+            placeholders = ",".join("?" * len(shopify_ids))
+            return {
+                row[0]: {"hash": row[1], "sales_count": row[2]}
+                for row in self._conn.execute(
+                    f"SELECT shopify_id, hash, sales_count FROM product_index WHERE shopify_id IN ({placeholders})",
+                    list(shopify_ids)
+                )
+            }
+
+    def sales_totals(self, shopify_ids) -> dict:
+        with self._lock:
+            placeholders = ",".join("?" * len(shopify_ids))
+            return dict(self._conn.execute(
+                f"SELECT shopify_id, quantity FROM shopify_sales WHERE shopify_id IN ({placeholders})",
+                list(shopify_ids)
+            ))
+
+    def commit_products_page(self, run_id: int, seen, hashes: dict, updated, since_id: int):
+        # Index et point de reprise écrits ensemble : une page rejouée après un crash est idempotente
+        with self._transaction() as conn:
+            conn.executemany("UPDATE product_index SET seen_run = ? WHERE shopify_id = ?", [(run_id, s) for s in seen])
+            conn.executemany("UPDATE product_index SET hash = ? WHERE shopify_id = ?", [(h, s) for s, h in hashes.items()])
+            self._update_sales(conn, updated)
+            self.set(conn, products_since_id=since_id)
+
+    def commit_orders_page(self, quantities: Counter, updated, since_id: int):
+        with self._transaction() as conn:
+            conn.executemany("""
+                INSERT INTO shopify_sales (shopify_id, quantity) VALUES (?, ?)
+                ON CONFLICT (shopify_id) DO UPDATE SET quantity = quantity + excluded.quantity
+            """, list(quantities.items()))
+            self._update_sales(conn, updated)
+            self.set(conn, orders_since_id=since_id)
+
+    def _update_sales(self, conn, updated):
+        conn.executemany(
+            "UPDATE product_index SET sales_count = ? WHERE shopify_id = ?",
+            [(row.get("sales_count") or 0, str(row["shopify_id"])) for row in updated]
+        )
+
+    def missing(self, run_id: int, limit: int = 20):
+        # Produits en base dont le shopify_id n'a pas été vu pendant une passe complète
+        with self._lock:
+            count = self._conn.execute(
+                "SELECT COUNT(*) FROM product_index WHERE seen_run IS NOT ?", (run_id,)
+            ).fetchone()[0]
+            sample = [row[0] for row in self._conn.execute(
+                "SELECT shopify_id FROM product_index WHERE seen_run IS NOT ? LIMIT ?", (run_id, limit)
+            )]
+        return count, sample
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CatalogSync:
+    def __init__(self, path: str, page_size: int, client):
+        self.path = path
+        self.page_size = page_size
+        self.client = client
+        self.state = None
+        self.last_run = None
+        self._owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._task = None
+
+    def _open(self):
+        if self.state is None:
+            self.state = SyncState(self.path)
+        return self.state
+
+    async def run(self, full: bool = False, reset: bool = False):
+        state = self._open()
+        if not await asyncio.to_thread(state.acquire_lease, self._owner, SYNC_LEASE_TTL):
+            return {"status": "skipped", "reason": "Réconciliation déjà en cours dans un autre processus"}
+
+        started = time.perf_counter()
+        stats = Counter()
+        try:
+            if reset:
+                # Repart de zéro, y compris les totaux de ventes (relit tout l'historique des commandes)
+                await asyncio.to_thread(state.reset)
+            if full:
+                await asyncio.to_thread(
+                    state.update_checkpoints, products_updated_at_min=None, products_since_id=0, products_run=None
+                )
+            if full or reset or await asyncio.to_thread(state.index_size) == 0:
+                await self._build_index(stats)
+            await self._sync_products(stats)
+            await self._sync_orders(stats)
+        finally:
+            await asyncio.to_thread(state.release_lease, self._owner)
+
+        report = {"status": "completed", **stats, "seconds": round(time.perf_counter() - started, 3)}
+        self.last_run = report
+        logger.info("Réconciliation Shopify terminée : %s", report)
+        return report
+
+    async def _renew_lease(self):
+        if not await asyncio.to_thread(self.state.acquire_lease, self._owner, SYNC_LEASE_TTL):
+            raise RuntimeError("Bail de réconciliation perdu")
+
+    async def _build_index(self, stats: Counter):
+        # Index local construit depuis la table products : seules les lignes dont le hash diffère seront écrites
+        await asyncio.to_thread(self.state.clear_index)
+        after = None
+        while True:
+            page = await repository.list_products_page(after, _INDEX_PAGE_SIZE, INDEX_COLUMNS)
+            await asyncio.to_thread(self.state.index_rows, self._index_entries(page))
+            stats["indexed"] += len(page)
+            if len(page) < _INDEX_PAGE_SIZE:
+                break
+            after = page[-1]["id"]
+
+    @staticmethod
+    def _index_entries(rows):
+        return [
+            (str(row["shopify_id"]), row["id"],
+             fields_hash(_fields(row.get("name"), row.get("price"), row.get("image_url"))),
+             row.get("sales_count") or 0)
+            for row in rows if row.get("shopify_id") is not None
+        ]
+
+    async def _resolve(self, shopify_ids):
+        # Entrées de l'index ; les produits créés depuis sa construction sont cherchés en base
+        entries = await asyncio.to_thread(self.state.lookup, shopify_ids)
+        missing = [shopify_id for shopify_id in shopify_ids if shopify_id not in entries]
+        if missing:
+            rows = await repository.list_products_by_shopify_ids(missing, INDEX_COLUMNS)
+            if rows:
+                await asyncio.to_thread(self.state.index_rows, self._index_entries(rows))
+                entries.update(await asyncio.to_thread(self.state.lookup, missing))
+        return entries
+
+    def _apply(self, updated):
+        if updated:
+            catalog_cache.clear()
+            leaderboard.update(updated)
+
+    async def _sync_products(self, stats: Counter):
+        state = self.state
+        updated_at_min = await asyncio.to_thread(state.get, "products_updated_at_min")
+        since_id = await asyncio.to_thread(state.get, "products_since_id", 0)
+        run = await asyncio.to_thread(state.get, "products_run")
+        if run is None:
+            # Nouvelle passe ; une passe interrompue reprend avec le même identifiant et la même borne
+            run = {"id": int(time.time() * 1000), "started_at": datetime.now(timezone.utc).isoformat()}
+            await asyncio.to_thread(state.update_checkpoints, products_run=run)
+
+        while True:
+            await self._renew_lease()
+            params = {"limit": self.page_size, "since_id": since_id, "fields": "id,title,variants,images,updated_at"}
+            if updated_at_min:
+                params["updated_at_min"] = updated_at_min
+            products = (await self.client.request("GET", "/products.json", params=params)).json()["products"]
+            stats["pages"] += 1
+            if not products:
+                break
+
+            fields = {str(product["id"]): shopify_fields(product) for product in products}
+            entries = await self._resolve(list(fields))
+            changes, hashes = [], {}
+            for shopify_id, product_fields in fields.items():
+                entry = entries.get(shopify_id)
+                if entry is None:
+                    stats["products_unknown"] += 1
+                    continue
+                new_hash = fields_hash(product_fields)
+                if new_hash != entry["hash"]:
+                    changes.append({"shopify_id": shopify_id, **product_fields})
+                    hashes[shopify_id] = new_hash
+            updated = await repository.sync_products(changes) if changes else []
+            since_id = products[-1]["id"]
+            await asyncio.to_thread(state.commit_products_page, run["id"], list(entries), hashes, updated, since_id)
+            self._apply(updated)
+            stats["products_seen"] += len(products)
+            stats["products_changed"] += len(changes)
+            if len(products) < self.page_size:
+                break
+
+        if not updated_at_min:
+            count, sample = await asyncio.to_thread(state.missing, run["id"])
+            stats["missing_in_shopify"] = count
+            if count:
+                logger.warning("%d produits en base absents de Shopify, par ex. %s", count, sample)
+        next_min = datetime.fromisoformat(run["started_at"]) - _UPDATED_AT_OVERLAP
+        await asyncio.to_thread(
+            state.update_checkpoints,
+            products_updated_at_min=next_min.isoformat(timespec="seconds"), products_since_id=0, products_run=None
+        )
+
+    async def _sync_orders(self, stats: Counter):
+        # Les commandes n'arrivent qu'une fois (since_id croissant) : totaux Shopify tenus à jour localement
+        state = self.state
+        since_id = await asyncio.to_thread(state.get, "orders_since_id", 0)
+        while True:
+            await self._renew_lease()
+            params = {"limit": self.page_size, "since_id": since_id, "status": "any", "fields": "id,line_items"}
+            orders = (await self.client.request("GET", "/orders.json", params=params)).json()["orders"]
+            stats["pages"] += 1
+            if not orders:
+                break
+
+            quantities = Counter()
+            for order in orders:
+                for item in order.get("line_items", []):
+                    if item.get("product_id") is not None:
+                        quantities[str(item["product_id"])] += int(item.get("quantity", 1))
+            shopify_ids = list(quantities)
+            totals = await asyncio.to_thread(state.sales_totals, shopify_ids) if shopify_ids else {}
+            entries = await self._resolve(shopify_ids) if shopify_ids else {}
+            changes = []
+            for shopify_id, quantity in quantities.items():
+                total = totals.get(shopify_id, 0) + quantity
+                entry = entries.get(shopify_id)
+                if entry is None:
+                    stats["sales_unknown_products"] += 1
+                elif total > entry["sales_count"]:
+                    changes.append({"shopify_id": shopify_id, "sales_count": total})
+            updated = await repository.sync_products(changes) if changes else []
+            since_id = orders[-1]["id"]
+            await asyncio.to_thread(state.commit_orders_page, quantities, updated, since_id)
+            self._apply(updated)
+            stats["orders_seen"] += len(orders)
+            stats["sales_changed"] += len(changes)
+            if len(orders) < self.page_size:
+                break
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(SYNC_INTERVAL)
+            try:
+                await self.run()
+            except Exception as e:
+                logger.warning("Réconciliation Shopify impossible : %s", e)
+
+    async def start(self):
+        if SYNC_INTERVAL > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.close()
+
+    def close(self):
+        if self.state is not None:
+            self.state.close()
+            self.state = None
+
+
+catalog_sync = CatalogSync(SYNC_STATE_PATH, SYNC_PAGE_SIZE, shopify_client)
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Réconciliation du catalogue Shopify vers Supabase")
+    parser.add_argument("--full", action="store_true", help="relit tout le catalogue et reconstruit l'index")
+    parser.add_argument("--reset", action="store_true", help="oublie aussi les totaux de ventes et relit toutes les commandes")
+    args = parser.parse_args(argv)
+
+    await init_db()
+    try:
+        report = await catalog_sync.run(full=args.full or args.reset, reset=args.reset)
+    finally:
+        catalog_sync.close()
+        await shopify_client.aclose()
+        await close_db()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if report["status"] == "completed" else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(asyncio.run(main()))
@@ -8,4 +8,91 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 JWT_SECRET = os.getenv("JWT_SECRET")
 # Shopify
 SHOPIFY_STORE_URL = os.getenv("SHOPIFY_STORE_URL")
-SHOPIFY_ACCESS_TOKEN = os.getenv("SHOPIFY_ACCESS_TOKEN")
\ No newline at end of file
+SHOPIFY_ACCESS_TOKEN = os.getenv("SHOPIFY_ACCESS_TOKEN")
+# Cache des utilisateurs authentifiés (middleware d'auth)
+# Cache propre à chaque worker : change-password et la suppression d'une clé API l'invalident
+# dans le worker qui traite la requête ; les autres workers ne voient le changement
+# qu'à l'expiration de leur entrée (au plus PRINCIPAL_CACHE_TTL secondes).
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+
+# Pool de connexions vers PostgREST (client async)
+DB_POOL_MAX_CONNECTIONS = int(os.getenv("DB_POOL_MAX_CONNECTIONS", "50"))
+DB_POOL_MAX_KEEPALIVE = int(os.getenv("DB_POOL_MAX_KEEPALIVE", "20"))
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "10"))
+
+# Webhooks Shopify : acquittement immédiat + file durable traitée en arrière-plan
+WEBHOOK_ASYNC_MODE = os.getenv("WEBHOOK_ASYNC_MODE", "false").lower() in ("1", "true", "yes")
+WEBHOOK_QUEUE_PATH = os.getenv("WEBHOOK_QUEUE_PATH", "webhook_queue.sqlite3")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "200"))
+WEBHOOK_FLUSH_INTERVAL = float(os.getenv("WEBHOOK_FLUSH_INTERVAL", "0.5"))
+# Identifiants X-Shopify-Webhook-Id traités, gardés dans le journal (Shopify réessaie pendant 48 h)
+WEBHOOK_DEDUP_TTL = float(os.getenv("WEBHOOK_DEDUP_TTL", str(48 * 3600)))
+# Durée de réservation d'un lot par un processus ; au-delà, un autre worker peut le reprendre
+WEBHOOK_LEASE_TTL = float(os.getenv("WEBHOOK_LEASE_TTL", "60"))
+
+# Cache des pages du catalogue public (/all-products)
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "1000"))
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "30"))
+
+# Client Shopify (pool HTTP, limitation de débit, retries)
+SHOPIFY_API_VERSION = os.getenv("SHOPIFY_API_VERSION", "2025-10")
+SHOPIFY_MAX_CONCURRENCY = int(os.getenv("SHOPIFY_MAX_CONCURRENCY", "4"))
+SHOPIFY_MAX_RETRIES = int(os.getenv("SHOPIFY_MAX_RETRIES", "3"))
+SHOPIFY_TIMEOUT = float(os.getenv("SHOPIFY_TIMEOUT", "15"))
+SHOPIFY_BUCKET_LEAK_RATE = float(os.getenv("SHOPIFY_BUCKET_LEAK_RATE", "2"))
+
+# Hachage des mots de passe (bcrypt) dans un pool dédié
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_EXECUTOR = os.getenv("BCRYPT_EXECUTOR", "thread")
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(os.cpu_count() or 2)))
+BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", "64"))
+
+# Limitation de débit (token bucket) : "memory" par processus, "sqlite" partagé entre workers
+# (fail-open : une requête qui trouve le fichier verrouillé plus de 50 ms passe sans être comptée)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", "ratelimit.sqlite3")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() in ("1", "true", "yes")
+# Nombre de proxies de confiance devant l'application : l'IP cliente est la N-ième entrée de X-Forwarded-For
+# en partant de la droite (les entrées de gauche sont fournies par le client et ne comptent pas)
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "1"))
+
+# Index mémoire des clés API (hash) et cache négatif des clés inconnues.
+# Une clé supprimée via un autre worker y reste valable jusqu'à API_KEY_FULL_REFRESH_INTERVAL + PRINCIPAL_CACHE_TTL.
+API_KEY_REFRESH_INTERVAL = float(os.getenv("API_KEY_REFRESH_INTERVAL", "5"))
+API_KEY_FULL_REFRESH_INTERVAL = float(os.getenv("API_KEY_FULL_REFRESH_INTERVAL", "60"))
+API_KEY_MISS_REFRESH_INTERVAL = float(os.getenv("API_KEY_MISS_REFRESH_INTERVAL", "1"))
+API_KEY_NEGATIVE_CACHE_SIZE = int(os.getenv("API_KEY_NEGATIVE_CACHE_SIZE", "100000"))
+API_KEY_NEGATIVE_CACHE_TTL = float(os.getenv("API_KEY_NEGATIVE_CACHE_TTL", "300"))
+
+# Cache des JWT déjà vérifiés (une entrée par token, jusqu'à son expiration)
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "50000"))
+
+# Instantané en mémoire de la table roles
+ROLES_REFRESH_INTERVAL = float(os.getenv("ROLES_REFRESH_INTERVAL", "60"))
+
+# Classement des meilleures ventes (top-K en mémoire)
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", "100"))
+LEADERBOARD_RECONCILE_INTERVAL = float(os.getenv("LEADERBOARD_RECONCILE_INTERVAL", "300"))
+
+# En-tête Server-Timing sur toutes les réponses (sinon seulement si la requête envoie x-server-timing: 1)
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+
+# Import en masse de produits (NDJSON / CSV) traité en arrière-plan
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "100"))
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(200 * 1024 * 1024)))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+IMPORT_MAX_JOBS = int(os.getenv("IMPORT_MAX_JOBS", "1000"))
+IMPORT_JOB_TTL = float(os.getenv("IMPORT_JOB_TTL", str(24 * 3600)))
+
+# Réconciliation incrémentale Shopify → Supabase (catalog_sync.py)
+SYNC_STATE_PATH = os.getenv("SYNC_STATE_PATH", "catalog_sync.sqlite3")
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "250"))
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", "0"))  # 0 : pas de tâche planifiée dans l'application
+SYNC_LEASE_TTL = float(os.getenv("SYNC_LEASE_TTL", "600"))
+
+# Regroupement des lectures identiques simultanées (singleflight.py)
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
@@ -1,4 +1,57 @@
-from supabase import create_client, Client
-from config import SUPABASE_URL, SUPABASE_KEY
+from typing import TYPE_CHECKING
+from config import (
+    SUPABASE_URL, SUPABASE_KEY,
+    DB_POOL_MAX_CONNECTIONS, DB_POOL_MAX_KEEPALIVE, DB_TIMEOUT,
+)
+from metrics import TimedTransport
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+if TYPE_CHECKING:
+    from postgrest import AsyncPostgrestClient
+
+db: "AsyncPostgrestClient" = None
+
+
+async def init_db():
+    # Un seul client httpx (pool de connexions borné) partagé par toutes les requêtes
+    global db
+    if db is None:
+        # Imports différés : postgrest et httpx ne sont chargés qu'au démarrage, pas à l'import des routes
+        import httpx
+        from postgrest import AsyncPostgrestClient
+
+        rest_url = f"{SUPABASE_URL}/rest/v1"
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=DB_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=DB_POOL_MAX_KEEPALIVE,
+            ),
+        )
+        http_client = httpx.AsyncClient(
+            base_url=rest_url,
+            timeout=httpx.Timeout(DB_TIMEOUT),
+            transport=TimedTransport("supabase", "/rest/v1", transport),
+            follow_redirects=True,
+        )
+        db = AsyncPostgrestClient(
+            rest_url,
+            headers={"apikey": SUPABASE_KEY, "Authorization": f"Bearer {SUPABASE_KEY}"},
+            http_client=http_client,
+        )
+    return db
+
+
+async def close_db():
+    global db
+    if db is not None:
+        await db.aclose()
+        db = None
+
+
+def is_ready() -> bool:
+    return db is not None
+
+
+def get_db() -> "AsyncPostgrestClient":
+    if db is None:
+        raise RuntimeError("Client base de données non initialisé (startup non exécuté)")
+    return db
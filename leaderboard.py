@@ -0,0 +1,154 @@
+import asyncio
+import bisect
+import logging
+import threading
+from config import LEADERBOARD_SIZE, LEADERBOARD_RECONCILE_INTERVAL
+import repository
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_COLUMNS = repository.PRODUCT_COLUMNS
+_LOAD_PAGE_SIZE = 1000
+
+# Lignes conservées en tuples (colonnes dans l'ordre de LEADERBOARD_COLUMNS) : plus compact qu'un dict
+_ID = LEADERBOARD_COLUMNS.index("id")
+_SALES_COUNT = LEADERBOARD_COLUMNS.index("sales_count")
+_CREATED_BY = LEADERBOARD_COLUMNS.index("created_by")
+
+
+def _key(row: tuple):
+    # Tri décroissant sur sales_count, puis par id pour un ordre stable
+    return (-(row[_SALES_COUNT] or 0), row[_ID])
+
+
+class TopK:
+    # Les K produits les plus vendus d'un périmètre, dans une liste triée (insertion en O(K))
+    def __init__(self, k: int):
+        self.k = k
+        self._keys = []
+        self._rows = {}
+
+    def update(self, row: tuple):
+        product_id = row[_ID]
+        key = _key(row)
+        current = self._rows.get(product_id)
+        if current is not None:
+            old_key = _key(current)
+            self._keys.pop(bisect.bisect_left(self._keys, old_key))
+        elif len(self._keys) >= self.k and key >= self._keys[-1]:
+            return
+        bisect.insort(self._keys, key)
+        self._rows[product_id] = row
+        if len(self._keys) > self.k:
+            _, evicted_id = self._keys.pop()
+            del self._rows[evicted_id]
+
+    def sales_count(self, product_id):
+        row = self._rows.get(product_id)
+        return None if row is None else row[_SALES_COUNT] or 0
+
+    def top(self, limit: int):
+        return [dict(zip(LEADERBOARD_COLUMNS, self._rows[product_id])) for _, product_id in self._keys[:limit]]
+
+
+class Leaderboard:
+    # Classement global et par créateur, mis à jour par les chemins qui modifient sales_count
+    def __init__(self, k: int):
+        self.k = k
+        self._global = TopK(k)
+        self._by_creator = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._loading = None
+        self._pending = None
+        self._task = None
+
+    def _apply(self, global_top, by_creator, row):
+        row = tuple(row.get(column) for column in LEADERBOARD_COLUMNS)
+        product_id, creator_id = row[_ID], row[_CREATED_BY]
+        # Les ventes ne font qu'augmenter : on ignore une valeur plus ancienne que celle connue
+        known = global_top.sales_count(product_id)
+        if known is None and creator_id in by_creator:
+            known = by_creator[creator_id].sales_count(product_id)
+        if known is not None and (row[_SALES_COUNT] or 0) < known:
+            return
+        global_top.update(row)
+        if creator_id is not None:
+            if creator_id not in by_creator:
+                by_creator[creator_id] = TopK(self.k)
+            by_creator[creator_id].update(row)
+
+    def update(self, rows):
+        with self._lock:
+            for row in rows:
+                self._apply(self._global, self._by_creator, row)
+            if self._pending is not None:
+                # Rechargement en cours : ces mises à jour seront rejouées sur le nouvel état
+                self._pending.extend(rows)
+
+    async def load(self):
+        # Reconstruction complète depuis la base, puis échange atomique avec l'état courant
+        with self._lock:
+            self._pending = []
+        try:
+            global_top, by_creator = TopK(self.k), {}
+            after = None
+            while True:
+                page = await repository.list_products_page(after, _LOAD_PAGE_SIZE, repository.PRODUCT_SELECT)
+                for row in page:
+                    self._apply(global_top, by_creator, row)
+                if len(page) < _LOAD_PAGE_SIZE:
+                    break
+                after = page[-1]["id"]
+            with self._lock:
+                for row in self._pending:
+                    self._apply(global_top, by_creator, row)
+                self._global, self._by_creator = global_top, by_creator
+                self._loaded = True
+        finally:
+            with self._lock:
+                self._pending = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    async def ensure_loaded(self):
+        if self._loaded:
+            return
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(self.load())
+        try:
+            await asyncio.shield(self._loading)
+        finally:
+            if self._loading is not None and self._loading.done():
+                self._loading = None
+
+    async def top(self, limit: int, creator_id=None):
+        await self.ensure_loaded()
+        with self._lock:
+            if creator_id is None:
+                return self._global.top(limit)
+            scope = self._by_creator.get(creator_id)
+            return scope.top(limit) if scope else []
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(LEADERBOARD_RECONCILE_INTERVAL)
+            try:
+                await self.load()
+            except Exception as e:
+                logger.warning("Réconciliation du classement impossible : %s", e)
+
+    async def start(self):
+        await self.ensure_loaded()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+leaderboard = Leaderboard(LEADERBOARD_SIZE)
@@ -1,36 +1,158 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from auth.routes import router as auth_router
-from routes.users import router as users_router
-from routes.products import router as products_router
-from routes.api_key import router as api_key_router
-from routes.webhook import router as webhook_router
-from auth.middleware import auth_middleware
-
-app = FastAPI()
-
-# Middleware CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Middleware d'auth
-app.middleware("http")(auth_middleware)
-
-@app.get("/health", tags=["Health"])
-def health():
-    """
-    Simple health check endpoint.
-    """
-    return {"test": "hello world"}
-
-# Routes
-app.include_router(auth_router)
-app.include_router(users_router)
-app.include_router(products_router)
-app.include_router(api_key_router)
-app.include_router(webhook_router)
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from fastapi import FastAPI
+
+
+def create_app() -> "FastAPI":
+    # Imports différés : `import main` ne charge rien, tout est importé à la création de l'application
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse, PlainTextResponse
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.middleware.gzip import GZipMiddleware
+    from auth.routes import router as auth_router
+    from routes.users import router as users_router
+    from routes.products import router as products_router
+    from routes.api_key import router as api_key_router
+    from routes.webhook import router as webhook_router
+    from auth.middleware import auth_middleware
+    from ratelimit import rate_limit_middleware
+    from database import init_db, close_db, is_ready as database_ready
+    from config import WEBHOOK_ASYNC_MODE
+    from webhook_queue import webhook_queue
+    from shopify_api import shopify_client
+    from auth.hashing import shutdown_hashing, pending_operations
+    from auth.api_keys import api_key_index
+    from auth.roles import start_roles, stop_roles, roles_loaded
+    from leaderboard import leaderboard
+    from product_import import product_imports
+    from catalog_sync import catalog_sync
+    from metrics import metrics_middleware, render_prometheus, gauge
+    from cache import principal_cache, catalog_cache
+    from auth.security import verified_tokens
+    from singleflight import all_groups
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Ouverture du pool de connexions au démarrage, fermeture à l'arrêt
+        await init_db()
+        await start_roles()
+        await api_key_index.start()
+        await leaderboard.start()
+        # Journal ouvert dans les deux modes (dédoublonnage des retries), workers seulement en mode asynchrone
+        await webhook_queue.start(workers=WEBHOOK_ASYNC_MODE)
+        await catalog_sync.start()
+        app.state.started = True
+        yield
+        # /ready passe à 503 dès le début de l'arrêt
+        app.state.started = False
+        await catalog_sync.stop()
+        await product_imports.stop()
+        await webhook_queue.stop()
+        await leaderboard.stop()
+        await api_key_index.stop()
+        await stop_roles()
+        await shopify_client.aclose()
+        shutdown_hashing()
+        await close_db()
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.started = False
+
+    # Middleware CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Compression des réponses volumineuses (pages du catalogue)
+    app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+    # Middleware d'auth
+    app.middleware("http")(auth_middleware)
+
+    # Limitation de débit, avant l'auth pour rejeter le bourrage d'identifiants sans requête en base
+    app.middleware("http")(rate_limit_middleware)
+
+    # Mesure des latences par route (le plus externe, pour couvrir tous les autres middlewares)
+    app.middleware("http")(metrics_middleware)
+
+    caches = {
+        "principal": principal_cache,
+        "catalog": catalog_cache,
+        "jwt": verified_tokens,
+        "api_key_negative": api_key_index.negative_cache,
+    }
+
+    def _cache_stat(field):
+        return lambda: [({"cache": name}, cache.stats()[field]) for name, cache in caches.items()]
+
+    gauge("cache_entries", _cache_stat("size"))
+    gauge("cache_hits", _cache_stat("hits"))
+    gauge("cache_misses", _cache_stat("misses"))
+    gauge("cache_evictions", _cache_stat("evictions"))
+    gauge("bcrypt_pending_operations", pending_operations)
+    gauge("webhook_queue_depth", lambda: webhook_queue.journal.depth() if webhook_queue.journal else 0)
+    gauge("singleflight_calls", lambda: [({"name": g.name}, g.calls) for g in all_groups()])
+    gauge("singleflight_shared", lambda: [({"name": g.name}, g.shared) for g in all_groups()])
+    gauge("singleflight_in_flight", lambda: [({"name": g.name}, g.in_flight()) for g in all_groups()])
+    gauge("webhook_flush_seconds_max", lambda: webhook_queue.max_flush_seconds)
+    gauge("webhook_dead_letters", lambda: webhook_queue.journal.dead_letters() if webhook_queue.journal else 0)
+
+    @app.get("/health", tags=["Health"])
+    def health():
+        """
+        Simple health check endpoint.
+        """
+        return {"test": "hello world"}
+
+    @app.get("/ready", tags=["Health"])
+    def ready():
+        """
+        Readiness probe: connection pool opened, role snapshot, API key index and leaderboard warmed.
+        """
+        checks = {
+            "startup": app.state.started,
+            "database": database_ready(),
+            "roles": roles_loaded(),
+            "api_keys": api_key_index.warmed,
+            "leaderboard": leaderboard.loaded,
+            "webhook_queue": webhook_queue.journal is not None,
+        }
+        is_ready = all(checks.values())
+        return JSONResponse({
+            "ready": is_ready,
+            "checks": checks,
+            "caches": {name: cache.stats()["size"] for name, cache in caches.items()},
+            "bcrypt_pending_operations": pending_operations(),
+        }, status_code=200 if is_ready else 503)
+
+    @app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+    def metrics():
+        """
+        Prometheus metrics (latency histograms, caches, queues).
+        """
+        return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+    # Routes
+    app.include_router(auth_router)
+    app.include_router(users_router)
+    app.include_router(products_router)
+    app.include_router(api_key_router)
+    app.include_router(webhook_router)
+
+    return app
+
+
+def __getattr__(name):
+    # `uvicorn main:app` reste valable : l'application est créée au premier accès à main.app
+    # (ou `uvicorn --factory main:create_app`)
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,182 @@
+import bisect
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING
+from fastapi import Request
+from config import SERVER_TIMING
+from singleflight import coalesce
+
+if TYPE_CHECKING:
+    import httpx
+
+# Bornes (en secondes) des histogrammes de latence
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "buckets": dict(zip(self.buckets + (float("inf"),), self.counts)),
+                "sum": self.sum,
+                "count": self.count,
+            }
+
+
+_histograms = {}
+_gauges = {}
+_registry_lock = threading.Lock()
+
+
+def histogram(name: str, **labels) -> Histogram:
+    # Un histogramme par (nom, labels), créé à la première utilisation
+    key = (name, tuple(sorted(labels.items())))
+    hist = _histograms.get(key)
+    if hist is None:
+        with _registry_lock:
+            hist = _histograms.setdefault(key, Histogram())
+    return hist
+
+
+def all_histograms():
+    return dict(_histograms)
+
+
+def gauge(name: str, func):
+    # Valeur lue au moment du scrape : un nombre, ou une liste de paires (labels: dict, nombre)
+    _gauges[name] = func
+
+
+# Durées par dépendance de la requête en cours, pour l'en-tête Server-Timing
+_request_timings: ContextVar = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def span(dependency: str, operation: str):
+    # Chronomètre un appel à une dépendance (supabase, shopify, bcrypt, jwt...)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram("dependency_seconds", dependency=dependency, operation=operation).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[dependency] = timings.get(dependency, 0.0) + elapsed
+
+
+class TimedTransport:
+    # Transport httpx qui chronomètre chaque appel sortant (requête + lecture du corps).
+    # Même interface que httpx.AsyncBaseTransport, sans en hériter : httpx n'est importé qu'à la création des clients
+    def __init__(self, dependency: str, strip_prefix: str = "", transport: "httpx.AsyncBaseTransport" = None):
+        if transport is None:
+            import httpx
+            transport = httpx.AsyncHTTPTransport()
+        self.dependency = dependency
+        self.strip_prefix = strip_prefix
+        self.transport = transport
+
+    def _operation(self, request: "httpx.Request") -> str:
+        path = request.url.path
+        if path.startswith(self.strip_prefix):
+            path = path[len(self.strip_prefix):]
+        # /products/123.json -> products/:id : pas d'identifiants dans les labels
+        path = re.sub(r"/\d+", "/:id", path.strip("/")).removesuffix(".json")
+        return f"{request.method} {path}"
+
+    async def handle_async_request(self, request: "httpx.Request") -> "httpx.Response":
+        with span(self.dependency, self._operation(request)):
+            response = await self.transport.handle_async_request(request)
+            await response.aread()
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+    async def __aenter__(self):
+        await self.transport.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.transport.__aexit__(*exc_info)
+
+
+async def metrics_middleware(request: Request, call_next):
+    timings = {}
+    token = _request_timings.set(timings)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        _request_timings.reset(token)
+        # Le gabarit de route (/api-keys/{key_id}) et non le chemin brut, pour borner les séries
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        histogram("http_request_seconds", method=request.method, route=path, status=str(status)).observe(elapsed)
+
+    if SERVER_TIMING or request.headers.get("x-server-timing") == "1":
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()]
+        entries.append(f"total;dur={elapsed * 1000:.2f}")
+        response.headers["Server-Timing"] = ", ".join(entries)
+    return response
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+@coalesce
+def render_prometheus() -> str:
+    # Format texte d'exposition Prometheus
+    lines = []
+    by_name = {}
+    for (name, labels), hist in list(_histograms.items()):
+        by_name.setdefault(name, []).append((labels, hist.snapshot()))
+    for name, series in sorted(by_name.items()):
+        lines.append(f"# TYPE {name} histogram")
+        for labels, snap in series:
+            cumulative = 0
+            for bound, count in snap["buckets"].items():
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {snap['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {snap['count']}")
+    for name, func in sorted(_gauges.items()):
+        try:
+            value = func()
+        except Exception:
+            continue
+        lines.append(f"# TYPE {name} gauge")
+        if isinstance(value, list):
+            for labels, v in value:
+                lines.append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {v}")
+        else:
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,223 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import tempfile
+import time
+import uuid
+from pydantic import ValidationError
+from models import ProductCreate
+from cache import TTLCache, catalog_cache
+from leaderboard import leaderboard
+from shopify_api import shopify_client
+from config import IMPORT_CHUNK_SIZE, IMPORT_MAX_BYTES, IMPORT_MAX_ERRORS, IMPORT_MAX_JOBS, IMPORT_JOB_TTL
+import repository
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+}
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def detect_format(content_type: str, explicit: str = None):
+    if explicit:
+        return explicit if explicit in ("ndjson", "csv") else None
+    return CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+
+
+class ImportJob:
+    def __init__(self, user_id: int, import_format: str, can_publish_img: bool):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.format = import_format
+        self.can_publish_img = can_publish_img
+        self.status = "receiving"
+        self.error = None
+        self.bytes_received = 0
+        self.rows_read = 0
+        self.created = 0
+        self.failed = 0
+        # Rapport d'erreurs par ligne, borné pour que la mémoire ne dépende pas de la taille du fichier
+        self.errors = []
+        self.errors_truncated = 0
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def add_error(self, row: int, message: str):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"row": row, "error": message})
+        else:
+            self.errors_truncated += 1
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "format": self.format,
+            "error": self.error,
+            "bytes_received": self.bytes_received,
+            "rows_read": self.rows_read,
+            "created": self.created,
+            "failed": self.failed,
+            "pending": self.rows_read - self.created - self.failed,
+            "errors": list(self.errors),
+            "errors_truncated": self.errors_truncated,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def _read_rows(import_format: str, file):
+    # Lecture ligne à ligne du fichier reçu : (numéro de ligne, objet décodé ou exception)
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="" if import_format == "csv" else None)
+    if import_format == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            # Cellule vide = valeur par défaut du modèle
+            yield reader.line_num, {k: v for k, v in row.items() if k and v not in ("", None)}
+        return
+    for line_number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, e
+
+
+def _format_validation_error(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in error['loc'])} : {error['msg']}" for error in e.errors())
+
+
+class ImportManager:
+    def __init__(self):
+        # Imports terminés : expirés après IMPORT_JOB_TTL, ou évincés (LRU) au-delà de IMPORT_MAX_JOBS
+        self.jobs = TTLCache(IMPORT_MAX_JOBS, IMPORT_JOB_TTL)
+        # Imports en attente ou en cours, jamais évincés : leur statut reste consultable jusqu'à la fin
+        self._active = {}
+        self._tasks = set()
+
+    def get(self, job_id: str):
+        job = self._active.get(job_id)
+        return job if job is not None else self.jobs.get(job_id)
+
+    async def submit(self, user_id: int, import_format: str, can_publish_img: bool, stream):
+        # Le corps est recopié sur disque au fil de l'eau, puis traité en arrière-plan
+        job = ImportJob(user_id, import_format, can_publish_img)
+        file = tempfile.TemporaryFile()
+        try:
+            async for chunk in stream:
+                job.bytes_received += len(chunk)
+                if job.bytes_received > IMPORT_MAX_BYTES:
+                    raise UploadTooLarge()
+                file.write(chunk)
+        except BaseException:
+            file.close()
+            raise
+        job.status = "queued"
+        self._active[job.id] = job
+        task = asyncio.create_task(self._run(job, file))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _validate(self, job: ImportJob, row_number: int, raw):
+        if isinstance(raw, Exception):
+            job.add_error(row_number, f"JSON invalide : {raw}")
+            return None
+        if not isinstance(raw, dict):
+            job.add_error(row_number, "Objet JSON attendu")
+            return None
+        try:
+            product = ProductCreate(**raw)
+        except ValidationError as e:
+            job.add_error(row_number, _format_validation_error(e))
+            return None
+        if product.image_url and not job.can_publish_img:
+            job.add_error(row_number, "Vous n'avez pas le droit de publier une image")
+            return None
+        return product
+
+    async def _flush(self, job: ImportJob, chunk):
+        # Création Shopify en parallèle (bornée par le client), puis une seule insertion pour le lot
+        results = await shopify_client.create_products([product.dict() for _, product in chunk])
+        rows, row_numbers = [], []
+        for (row_number, product), result in zip(chunk, results):
+            if isinstance(result, Exception):
+                job.add_error(row_number, f"Erreur Shopify : {result}")
+                continue
+            product_data = product.dict()
+            product_data.update({
+                "created_by": job.user_id,
+                "shopify_id": result["product"]["id"]
+            })
+            rows.append(product_data)
+            row_numbers.append(row_number)
+        if not rows:
+            return
+
+        try:
+            inserted = await repository.insert_products(rows)
+        except Exception as e:
+            logger.error(
+                "Import %s : insertion impossible, produits Shopify sans ligne en base : %s",
+                job.id, [row["shopify_id"] for row in rows]
+            )
+            for row_number in row_numbers:
+                job.add_error(row_number, f"Erreur base : {e}")
+            return
+        job.created += len(inserted)
+        catalog_cache.clear()
+        leaderboard.update(inserted)
+
+    async def _run(self, job: ImportJob, file):
+        job.status = "running"
+        try:
+            with file:
+                file.seek(0)
+                chunk = []
+                for row_number, raw in _read_rows(job.format, file):
+                    job.rows_read += 1
+                    product = self._validate(job, row_number, raw)
+                    if product is not None:
+                        chunk.append((row_number, product))
+                    if len(chunk) >= IMPORT_CHUNK_SIZE:
+                        await self._flush(job, chunk)
+                        chunk = []
+                    elif job.rows_read % IMPORT_CHUNK_SIZE == 0:
+                        # Fichier majoritairement invalide : on rend la main à la boucle régulièrement
+                        await asyncio.sleep(0)
+                if chunk:
+                    await self._flush(job, chunk)
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "Import interrompu par l'arrêt du serveur"
+            raise
+        except Exception as e:
+            logger.exception("Import %s en échec", job.id)
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            self.jobs.set(job.id, job)
+            self._active.pop(job.id, None)
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+product_imports = ImportManager()
@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from config import (
+    RATE_LIMIT_ENABLED, RATE_LIMIT_BACKEND, RATE_LIMIT_PATH, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_TRUST_PROXY,
+    RATE_LIMIT_TRUSTED_PROXIES,
+)
+
+
+@dataclass(frozen=True)
+class Policy:
+    # Token bucket : `capacity` requêtes d'affilée, puis une nouvelle toutes les `period / capacity` secondes
+    name: str
+    key: str  # "ip", "email" ou "api_key"
+    capacity: int
+    period: float
+
+    @property
+    def refill_rate(self) -> float:
+        return self.capacity / self.period
+
+
+class MemoryBackend:
+    # Compteurs propres au processus, bornés : les clés les moins récemment vues sont évincées
+    blocking = False
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, policy: Policy, now: float):
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (policy.capacity, now))
+            tokens = min(policy.capacity, tokens + (now - updated_at) * policy.refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / policy.refill_rate
+
+
+class SQLiteBackend:
+    # Compteurs partagés par tous les workers d'une même machine (fichier SQLite en WAL).
+    # Appels bloquants : exécutés hors de la boucle asyncio (voir RateLimiter.hit).
+    # Fail-open : si le fichier reste verrouillé plus de 50 ms par un autre worker, la requête passe
+    # sans être comptée (une limite contournée brièvement plutôt qu'une API bloquée).
+    blocking = True
+
+    def __init__(self, path: str, maxsize: int):
+        self.maxsize = maxsize
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=0.05)
+        self._lock = threading.Lock()
+        self._hits = 0
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=OFF")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS buckets_updated_at ON buckets (updated_at)")
+
+    def hit(self, key: str, policy: Policy, now: float):
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError:
+                # Base verrouillée trop longtemps : on laisse passer plutôt que de bloquer la requête
+                return True, 0.0
+            try:
+                row = self._conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens, updated_at = row if row else (policy.capacity, now)
+                tokens = min(policy.capacity, tokens + (now - updated_at) * policy.refill_rate)
+                allowed = tokens >= 1
+                if allowed:
+                    tokens -= 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                    (key, tokens, now)
+                )
+                self._hits += 1
+                if self._hits % 1000 == 0:
+                    self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return allowed, 0.0 if allowed else (1 - tokens) / policy.refill_rate
+
+    def _evict(self):
+        # On ne garde que les `maxsize` clés les plus récentes
+        self._conn.execute("""
+            DELETE FROM buckets WHERE updated_at < (
+                SELECT updated_at FROM buckets ORDER BY updated_at DESC LIMIT 1 OFFSET ?
+            )
+        """, (self.maxsize,))
+
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def hit(self, policy: Policy, value: str):
+        # Renvoie (autorisé, secondes avant le prochain jeton)
+        if not RATE_LIMIT_ENABLED:
+            return True, 0.0
+        if policy.key == "api_key":
+            # On ne conserve pas les clés API en clair dans les compteurs
+            value = hashlib.sha256(value.encode("utf-8")).hexdigest()[:32]
+        if self.backend.blocking:
+            return await asyncio.to_thread(self.backend.hit, f"{policy.name}:{value}", policy, time.time())
+        return self.backend.hit(f"{policy.name}:{value}", policy, time.time())
+
+
+def _create_backend():
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteBackend(RATE_LIMIT_PATH, RATE_LIMIT_MAX_KEYS)
+    return MemoryBackend(RATE_LIMIT_MAX_KEYS)
+
+
+rate_limiter = RateLimiter(_create_backend())
+
+# Politiques par route ; les routes absentes utilisent DEFAULT_POLICIES
+LOGIN_EMAIL_POLICY = Policy("login-email", "email", capacity=1, period=5)
+ROUTE_POLICIES = {
+    "/login": [Policy("login-ip", "ip", capacity=20, period=60)],
+    "/register": [Policy("register-ip", "ip", capacity=5, period=60)],
+    "/change-password": [Policy("change-password-ip", "ip", capacity=5, period=60)],
+    # Webhooks authentifiés par HMAC, envoyés en rafale depuis les IP partagées de Shopify
+    "/webhooks/shopify-sales": [],
+    "/health": [],
+    "/metrics": [],
+    "/ready": [],
+}
+DEFAULT_POLICIES = [
+    Policy("ip", "ip", capacity=300, period=60),
+    Policy("api-key", "api_key", capacity=600, period=60),
+]
+
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_PROXY:
+        # Chaque proxy ajoute à droite l'adresse qui l'a contacté : seules les RATE_LIMIT_TRUSTED_PROXIES
+        # dernières entrées sont fiables, la plus à gauche de celles-ci est le client
+        forwarded = [ip.strip() for ip in request.headers.get("x-forwarded-for", "").split(",") if ip.strip()]
+        if forwarded and RATE_LIMIT_TRUSTED_PROXIES > 0:
+            return forwarded[-min(RATE_LIMIT_TRUSTED_PROXIES, len(forwarded))]
+    return request.client.host if request.client else "unknown"
+
+
+def too_many_requests(retry_after: float, detail: str = "Trop de requêtes, réessayez plus tard"):
+    return JSONResponse(
+        {"detail": detail},
+        status_code=429,
+        headers={"Retry-After": str(max(1, int(retry_after + 0.999)))}
+    )
+
+
+async def rate_limit_middleware(request: Request, call_next):
+    policies = ROUTE_POLICIES.get(request.url.path, DEFAULT_POLICIES)
+    for policy in policies:
+        if policy.key == "ip":
+            value = client_ip(request)
+        elif policy.key == "api_key":
+            value = request.headers.get("x-api-key")
+        else:
+            continue
+        if not value:
+            continue
+        allowed, retry_after = await rate_limiter.hit(policy, value)
+        if not allowed:
+            return too_many_requests(retry_after)
+    return await call_next(request)
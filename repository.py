@@ -0,0 +1,158 @@
+from database import get_db
+from singleflight import coalesce
+
+
+# Accès aux données (async) : toutes les requêtes PostgREST de l'application passent ici.
+# Les lectures @coalesce partagent une même requête entre appels simultanés identiques.
+
+# Projections : chaque requête ne lit que les colonnes dont l'appelant a besoin
+PRINCIPAL_COLUMNS = "id,name,email,role_id,password_changed_at"
+LOGIN_COLUMNS = "email,password,role_id"
+PRODUCT_COLUMNS = ("id", "name", "price", "image_url", "sales_count", "shopify_id", "created_by")
+PRODUCT_SELECT = ",".join(PRODUCT_COLUMNS)
+
+# --- Utilisateurs ---
+
+@coalesce
+async def get_user_by_email(email: str, columns: str = PRINCIPAL_COLUMNS):
+    resp = await get_db().table("users").select(columns).eq("email", email).execute()
+    return resp.data[0] if resp.data else None
+
+
+async def get_login_row(email: str):
+    # Jamais regroupée : une connexion qui suit un changement de mot de passe ne doit pas
+    # rejoindre une lecture partie avant et être vérifiée contre l'ancien hash
+    resp = await get_db().table("users").select(LOGIN_COLUMNS).eq("email", email).execute()
+    return resp.data[0] if resp.data else None
+
+
+@coalesce
+async def get_user_by_id(user_id: int, columns: str = PRINCIPAL_COLUMNS):
+    resp = await get_db().table("users").select(columns).eq("id", user_id).execute()
+    return resp.data[0] if resp.data else None
+
+
+@coalesce
+async def email_exists(email: str) -> bool:
+    resp = await get_db().table("users").select("id").eq("email", email).execute()
+    return bool(resp.data)
+
+
+async def insert_user(user_data: dict):
+    resp = await get_db().table("users").insert(user_data).execute()
+    return resp.data[0] if resp.data else None
+
+
+async def update_user_password(email: str, hashed_password: str, changed_at: int):
+    await get_db().table("users").update({
+        "password": hashed_password,
+        "password_changed_at": changed_at
+    }).eq("email", email).execute()
+
+
+async def set_user_password_hash(email: str, hashed_password: str):
+    # Remplacement du hash sans toucher à password_changed_at (les tokens restent valides)
+    await get_db().table("users").update({"password": hashed_password}).eq("email", email).execute()
+
+
+@coalesce
+async def list_users():
+    resp = await get_db().table("users").select("name,email,role_id").execute()
+    return resp.data
+
+
+# --- Rôles ---
+
+@coalesce
+async def list_roles(columns: str = "*"):
+    resp = await get_db().table("roles").select(columns).execute()
+    return resp.data
+
+
+# --- Clés API ---
+
+async def list_api_key_hashes(after_id: int = None):
+    query = get_db().table("api_keys").select("id,user_id,key_prefix,key_hash")
+    if after_id is not None:
+        query = query.gt("id", after_id)
+    resp = await query.order("id").execute()
+    return resp.data
+
+
+async def api_key_name_exists(user_id: int, name: str) -> bool:
+    resp = await get_db().table("api_keys")\
+        .select("id")\
+        .eq("user_id", user_id)\
+        .eq("name", name)\
+        .execute()
+    return bool(resp.data)
+
+
+async def insert_api_key(key_data: dict):
+    resp = await get_db().table("api_keys").insert(key_data).execute()
+    return resp.data[0] if resp.data else None
+
+
+async def list_api_keys(user_id: int):
+    # Non regroupée (comme list_products_by_creator) : la liste doit refléter une création ou suppression
+    # que l'utilisateur vient de faire, pas une lecture partie avant
+    resp = await get_db().table("api_keys").select("id,name,created_at").eq("user_id", user_id).execute()
+    return resp.data
+
+
+async def delete_api_key(user_id: int, key_id: int):
+    resp = await get_db().table("api_keys").delete().eq("id", key_id).eq("user_id", user_id).execute()
+    return resp.data
+
+
+# --- Produits ---
+
+@coalesce
+async def list_products_page(after: int = None, limit: int = 100, columns: str = PRODUCT_SELECT):
+    # Pagination par curseur (keyset) sur l'id : coût constant quelle que soit la page
+    query = get_db().table("products").select(columns)
+    if after is not None:
+        query = query.gt("id", after)
+    resp = await query.order("id").limit(limit).execute()
+    return resp.data
+
+
+async def list_products_by_creator(user_id: int, columns: str = PRODUCT_SELECT):
+    resp = await get_db().table("products").select(columns).eq("created_by", user_id).execute()
+    return resp.data
+
+
+async def list_products_by_shopify_ids(shopify_ids: list, columns: str = PRODUCT_SELECT):
+    resp = await get_db().table("products").select(columns).in_("shopify_id", shopify_ids).execute()
+    return resp.data
+
+
+async def insert_product(product_data: dict):
+    resp = await get_db().table("products").insert(product_data).execute()
+    return resp.data[0] if resp.data else None
+
+
+async def insert_products(rows: list):
+    # Insertion groupée : une seule requête pour tout le lot
+    resp = await get_db().table("products").insert(rows).execute()
+    return resp.data
+
+
+async def increment_sales_by_product_id(increments: dict):
+    # increments : {product_id: quantité}, appliqué en une seule requête atomique (sql/increment_sales.sql)
+    items = [{"product_id": product_id, "quantity": quantity} for product_id, quantity in increments.items()]
+    resp = await get_db().rpc("increment_sales_by_product_id", {"items": items}).select(PRODUCT_SELECT).execute()
+    return resp.data
+
+
+async def increment_sales_by_shopify_id(increments: dict):
+    # increments : {shopify_id: quantité}, appliqué en une seule requête atomique (sql/increment_sales.sql)
+    items = [{"shopify_id": shopify_id, "quantity": quantity} for shopify_id, quantity in increments.items()]
+    resp = await get_db().rpc("increment_sales_by_shopify_id", {"items": items}).select(PRODUCT_SELECT).execute()
+    return resp.data
+
+
+async def sync_products(rows: list):
+    # rows : [{"shopify_id": ..., colonnes à corriger}], appliqué en une seule requête (sql/sync_products.sql)
+    resp = await get_db().rpc("sync_products", {"rows": rows}).select(PRODUCT_SELECT).execute()
+    return resp.data
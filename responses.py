@@ -0,0 +1,20 @@
+import json
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    # Dépendance optionnelle : repli sur le module json standard
+    orjson = None
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    # Réponses de liste : les lignes PostgREST sont déjà du JSON natif, on évite jsonable_encoder
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -1,41 +1,44 @@
 from fastapi import APIRouter, Request, HTTPException
 from pydantic import BaseModel
 import secrets
-from database import supabase
+from cache import principal_cache
+from auth.api_keys import api_key_index, api_key_prefix, hash_api_key
 from models import ApiKeyCreateRequest
+import repository
 
 router = APIRouter(tags=["API Keys"])
 
 @router.post("/api-keys")
-def create_api_key(request: Request, body: ApiKeyCreateRequest):
+async def create_api_key(request: Request, body: ApiKeyCreateRequest):
     user = request.state.user
 
-    existing = supabase.table("api_keys")\
-                       .select("*")\
-                       .eq("user_id", user["id"])\
-                       .eq("name", body.name)\
-                       .execute()
-    if existing.data:
+    if await repository.api_key_name_exists(user.id, body.name):
         raise HTTPException(status_code=400, detail="Le nom de clé API est déjà utilisé")
 
     new_key = secrets.token_urlsafe(32)
 
-    supabase.table("api_keys").insert({
-        "user_id": user["id"],
+    # Seuls le préfixe et le hash sont stockés : la clé n'est visible qu'à sa création
+    inserted = await repository.insert_api_key({
+        "user_id": user.id,
         "name": body.name,
-        "key": new_key
-    }).execute()
+        "key_prefix": api_key_prefix(new_key),
+        "key_hash": hash_api_key(new_key)
+    })
+    if inserted:
+        api_key_index.add(inserted)
 
     return {"name": body.name, "key": new_key}
 
 @router.get("/api-keys")
-def list_api_keys(request: Request):
+async def list_api_keys(request: Request):
     user = request.state.user
-    resp = supabase.table("api_keys").select("id,name,created_at").eq("user_id", user["id"]).execute()
-    return {"api_keys": resp.data}
+    return {"api_keys": await repository.list_api_keys(user.id)}
 
 @router.delete("/api-keys/{key_id}")
-def delete_api_key(request: Request, key_id: int):
+async def delete_api_key(request: Request, key_id: int):
     user = request.state.user
-    supabase.table("api_keys").delete().eq("id", key_id).eq("user_id", user["id"]).execute()
+    for deleted in await repository.delete_api_key(user.id, key_id):
+        api_key_index.remove(deleted["id"])
+    # La clé révoquée ne doit plus être acceptée depuis le cache
+    principal_cache.invalidate(("api_key", key_id))
     return {"message": "Clé API supprimée"}
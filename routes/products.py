@@ -1,35 +1,86 @@
-from fastapi import APIRouter, Request, HTTPException
-from httpx import request
+from fastapi import APIRouter, Request, HTTPException, Query, Response
 from models import OrderCreate, ProductCreate
-from database import supabase
-from auth.security import check_permission
+from auth.security import check_permission, has_permission
+from auth.roles import permission
 from shopify_api import create_shopify_product
-import bcrypt
-import time
+from cache import catalog_cache
+from config import LEADERBOARD_SIZE
+from leaderboard import leaderboard
+from metrics import span
+from singleflight import coalesce
+from responses import FastJSONResponse, dumps
+from product_import import product_imports, detect_format, UploadTooLarge
+from typing import Optional
+import repository
+from collections import Counter
+import hashlib
 
 router = APIRouter()
 
-@router.get("/all-products", tags=["Products"])
-def get_products():
-    resp = supabase.table("products").select("*").execute()
-    return {"All Products": resp.data}
+CAN_POST_PRODUCTS = permission("can_post_products")
+CAN_PUBLISH_IMG = permission("can_publish_img")
+
+PRODUCT_COLUMNS = repository.PRODUCT_COLUMNS
+
+@coalesce
+async def _build_catalog_page(after, limit, columns, generation):
+    # Sur un cache froid, les requêtes simultanées pour la même page partagent lecture et sérialisation.
+    # `generation` (lue avant la lecture) fait partie de la clé : après un clear(), les nouvelles requêtes
+    # ne rejoignent pas une lecture commencée avant, et une page périmée n'est pas remise en cache.
+    # (la lecture en base est elle aussi regroupée : on oublie celle d'une génération précédente)
+    repository.list_products_page.flight.forget((after, limit, columns))
+    products = await repository.list_products_page(after, limit, columns)
+    next_cursor = products[-1]["id"] if len(products) == limit else None
+    with span("serialize", "all-products"):
+        body = dumps({"All Products": products, "next_cursor": next_cursor})
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    cached = (body, etag)
+    catalog_cache.set((after, limit, columns), cached, generation=generation)
+    return cached
 
-@router.get("/my-products", tags=["Products"])
-def get_my_products(request: Request):
+@router.get("/all-products", tags=["Products"])
+async def get_products(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[int] = None,
+    fields: Optional[str] = None
+):
+    # Projection : seules les colonnes demandées (l'id est toujours renvoyé pour le curseur)
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in requested if f not in PRODUCT_COLUMNS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Colonnes inconnues : {', '.join(unknown)}")
+        columns = ",".join(["id"] + [f for f in requested if f != "id"])
+    else:
+        columns = repository.PRODUCT_SELECT
+
+    cached = catalog_cache.get((after, limit, columns))
+    if cached is None:
+        cached = await _build_catalog_page(after, limit, columns, catalog_cache.generation)
+
+    body, etag = cached
+    # Pas de max-age : les ventes changent à chaque commande, le client revalide à chaque fois (304 sans corps)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/my-products", tags=["Products"], response_class=FastJSONResponse)
+async def get_my_products(request: Request):
     user = request.state.user
-    resp = supabase.table("products").select("*").eq("created_by", user["id"]).execute()
-    return {"My Products": resp.data}
+    return FastJSONResponse({"My Products": await repository.list_products_by_creator(user.id)})
 
 @router.post("/products", tags=["Products"])
-def create_product(request: Request, product: ProductCreate):
+async def create_product(request: Request, product: ProductCreate):
     user = request.state.user
-    check_permission(user, "can_post_products")
+    check_permission(user, CAN_POST_PRODUCTS)
 
-    if product.image_url and not user["role"].get("can_publish_img", False):
+    if product.image_url and not has_permission(user, CAN_PUBLISH_IMG):
         raise HTTPException(status_code=403, detail="Vous n'avez pas le droit de publier une image")
 
     try:
-        shopify_resp = create_shopify_product(
+        shopify_resp = await create_shopify_product(
             name=product.name,
             price=product.price,
             image_url=product.image_url
@@ -40,51 +91,84 @@ def create_product(request: Request, product: ProductCreate):
 
     product_data = product.dict()
     product_data.update({
-        "created_by": user["id"],
+        "created_by": user.id,
         "shopify_id": shopify_id
     })
 
-    insert_resp = supabase.table("products").insert(product_data).execute()
+    inserted = await repository.insert_product(product_data)
+    catalog_cache.clear()
+    if inserted:
+        leaderboard.update([inserted])
 
     return {
         "message": "Produit créé",
-        "product": insert_resp.data[0],
+        "product": inserted,
         "shopify": shopify_resp
     }
 
-@router.get("/my-bestsellers", tags=["Products"])
-def my_bestsellers(request: Request):
+@router.post("/products/import", tags=["Products"], status_code=202)
+async def import_products(request: Request, format: Optional[str] = Query(None, pattern="^(ndjson|csv)$")):
+    # Corps NDJSON (une ligne = un ProductCreate) ou CSV avec en-tête, lu en flux
     user = request.state.user
-    check_permission(user, "can_post_products")
+    check_permission(user, CAN_POST_PRODUCTS)
 
-    resp = supabase.table("products")\
-        .select("*")\
-        .eq("created_by", user["id"])\
-        .order("sales_count", desc=True)\
-        .execute()
+    import_format = detect_format(request.headers.get("content-type", ""), format)
+    if import_format is None:
+        raise HTTPException(status_code=415, detail="Format non supporté : NDJSON ou CSV attendu")
+
+    try:
+        job = await product_imports.submit(
+            user.id, import_format, has_permission(user, CAN_PUBLISH_IMG), request.stream()
+        )
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Fichier trop volumineux")
 
-    return {"bestsellers": resp.data}
+    return {"job_id": job.id, "status": job.status, "bytes_received": job.bytes_received}
 
-@router.post("/create-order", tags=["Products"])
-def create_order(order: OrderCreate, request: Request):
+@router.get("/products/import/{job_id}", tags=["Products"])
+async def import_status(job_id: str, request: Request):
     user = request.state.user
-    check_permission(user, "can_post_products")
+    job = product_imports.get(job_id)
+    if job is None or job.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Import introuvable")
 
-    updated_products = []
+    return job.to_dict()
 
-    for item in order.line_items:
-        product_id = item.product_id
-        quantity = item.quantity
+@router.get("/my-bestsellers", tags=["Products"], response_class=FastJSONResponse)
+async def my_bestsellers(request: Request, limit: int = Query(LEADERBOARD_SIZE, ge=1, le=LEADERBOARD_SIZE)):
+    user = request.state.user
+    check_permission(user, CAN_POST_PRODUCTS)
 
-        resp = supabase.table("products").select("id,sales_count").eq("id", product_id).execute()
-        if not resp.data:
-            continue
+    return FastJSONResponse({"bestsellers": await leaderboard.top(limit, creator_id=user.id)})
 
-        current = resp.data[0].get("sales_count", 0)
-        new_count = current + quantity
+@router.get("/bestsellers", tags=["Products"], response_class=FastJSONResponse)
+async def bestsellers(limit: int = Query(10, ge=1, le=LEADERBOARD_SIZE)):
+    return FastJSONResponse({"bestsellers": await leaderboard.top(limit)})
 
-        supabase.table("products").update({"sales_count": new_count}).eq("id", product_id).execute()
+@router.post("/create-order", tags=["Products"])
+async def create_order(order: OrderCreate, request: Request):
+    user = request.state.user
+    check_permission(user, CAN_POST_PRODUCTS)
+
+    # Quantités regroupées par produit, appliquées en un seul appel atomique
+    increments = Counter()
+    for item in order.line_items:
+        increments[item.product_id] += item.quantity
 
-        updated_products.append({"product_id": product_id, "sales_count": new_count})
+    updated = await repository.increment_sales_by_product_id(increments) if increments else []
+    if updated:
+        catalog_cache.clear()
+        leaderboard.update(updated)
+    sales_by_id = {product["id"]: product["sales_count"] for product in updated}
 
-    return {"message": "Commande créée", "updated_products": updated_products}
+    updated_products = [
+        {"product_id": product_id, "sales_count": sales_by_id[product_id]}
+        for product_id in increments if product_id in sales_by_id
+    ]
+    unknown_product_ids = [product_id for product_id in increments if product_id not in sales_by_id]
+
+    return {
+        "message": "Commande créée",
+        "updated_products": updated_products,
+        "unknown_product_ids": unknown_product_ids
+    }
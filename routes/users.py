@@ -1,31 +1,38 @@
 from fastapi import APIRouter, Request, HTTPException
 from models import ChangePasswordRequest
-from database import supabase
 from auth.security import check_permission
-import bcrypt
+from auth.hashing import hash_password
+from auth.roles import permission
+from cache import principal_cache
+from responses import FastJSONResponse
+import repository
 import time
 
 router = APIRouter()
 
+CAN_GET_MY_USER = permission("can_get_my_user")
+CAN_GET_USERS = permission("can_get_users")
+
 @router.get("/my-user", tags=["Account"])
-def my_user(request: Request):
+async def my_user(request: Request):
     user = request.state.user
-    check_permission(user, "can_get_my_user")
-    return user
+    check_permission(user, CAN_GET_MY_USER)
+    return user.to_dict()
 
-@router.get("/users", tags=["Account"])
-def get_users(request: Request):
+@router.get("/users", tags=["Account"], response_class=FastJSONResponse)
+async def get_users(request: Request):
     user = request.state.user
-    check_permission(user, "can_get_users")
-    resp = supabase.table("users").select("name,email,role_id").execute()
-    return resp.data
+    check_permission(user, CAN_GET_USERS)
+    return FastJSONResponse(await repository.list_users())
 
 @router.patch("/change-password", tags=["Account"])
-def change_password(request: Request, body: ChangePasswordRequest):
+async def change_password(request: Request, body: ChangePasswordRequest):
     user = request.state.user
-    hashed_pw = bcrypt.hashpw(body.new_password.encode('utf-8'), bcrypt.gensalt())
-    supabase.table("users").update({
-        "password": hashed_pw.decode('utf-8'),
-        "password_changed_at": int(time.time())
-    }).eq("email", user["email"]).execute()
+    hashed_pw = await hash_password(body.new_password)
+    await repository.update_user_password(user.email, hashed_pw, int(time.time()))
+    # Les anciens tokens doivent être refusés dès la requête suivante
+    principal_cache.invalidate_where(lambda cached: cached.id == user.id)
+    # Une lecture en vol démarrée avant la modification ne doit pas être partagée
+    repository.get_user_by_email.flight.forget((user.email,))
+    repository.get_user_by_id.flight.forget((user.id,))
     return {"message": "Mot de passe changé, vos tokens existants sont invalidés"}
@@ -1,10 +1,15 @@
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import JSONResponse
-from database import supabase
-import os, hmac, hashlib, base64, json
+from auth.security import check_permission
+from auth.roles import permission
+from config import WEBHOOK_ASYNC_MODE
+from webhook_queue import webhook_queue, parse_webhook
+import os, hmac, hashlib, base64
 
 router = APIRouter(tags=["Webhooks"])
 
+CAN_GET_USERS = permission("can_get_users")
+
 SHOPIFY_WEBHOOK_SECRET = os.getenv("SHOPIFY_SECRET_KEY")
 
 @router.post("/webhooks/shopify-sales")
@@ -21,28 +26,31 @@ async def shopify_sales_webhook(request: Request):
         hashlib.sha256
     ).digest()
     calculated_hmac = base64.b64encode(digest).decode()
-    print(calculated_hmac)
     if not hmac.compare_digest(calculated_hmac, hmac_header):
         raise HTTPException(status_code=401, detail="Signature HMAC invalide")
 
-    payload = json.loads(body_bytes)
-    line_items = payload.get("line_items", [])
-
-    for item in line_items:
-        shopify_product_id = str(item["product_id"])
-        quantity = int(item.get("quantity", 1))
+    # Corps validé avant l'acquittement : un webhook inexploitable est refusé ici, pas dans les workers
+    try:
+        increments = parse_webhook(body_bytes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Webhook invalide : {e}")
 
-        resp = supabase.table("products").select("*").eq("shopify_id", shopify_product_id).execute()
+    # Shopify renvoie le même X-Shopify-Webhook-Id à chaque retry : on ne compte les ventes qu'une fois.
+    # Le dédoublonnage passe par le journal SQLite, commun à tous les workers et persistant.
+    webhook_id = request.headers.get("x-shopify-webhook-id")
 
-        if not resp.data:
-            print(f"Produit Shopify {shopify_product_id} introuvable dans Supabase")
-            continue
+    if WEBHOOK_ASYNC_MODE:
+        # Acquittement immédiat, les ventes sont appliquées par les workers de la file
+        if not await webhook_queue.enqueue(webhook_id, body_bytes):
+            return JSONResponse({"status": "duplicate"})
+        return JSONResponse({"status": "queued"})
 
-        product = resp.data[0]
-        new_sales = product["sales_count"] + quantity
-
-        supabase.table("products").update({
-            "sales_count": new_sales
-        }).eq("shopify_id", shopify_product_id).execute()
+    if not await webhook_queue.process_now(webhook_id, increments):
+        return JSONResponse({"status": "duplicate"})
 
     return JSONResponse({"status": "ok"})
+
+@router.get("/webhooks/queue")
+async def webhook_queue_stats(request: Request):
+    check_permission(request.state.user, CAN_GET_USERS)
+    return {"async_mode": WEBHOOK_ASYNC_MODE, **webhook_queue.stats()}
@@ -1,26 +1,171 @@
-import requests
-from config import SHOPIFY_STORE_URL, SHOPIFY_ACCESS_TOKEN
-from typing import Optional
-
-
-def create_shopify_product(name: str, price: float, image_url: Optional[str] = None):
-    url = f"{SHOPIFY_STORE_URL}/admin/api/2025-10/products.json"
-
-    headers = {
-        "Content-Type": "application/json",
-        "X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN
-    }
-    print("Creating Shopify product with image_url:", image_url)
-    payload = {
-        "product": {
-            "title": name,
-            "variants": [
-                {"price": str(price)}
-            ],
-            "images": [{"src": image_url}] if image_url else []
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from config import (
+    SHOPIFY_STORE_URL, SHOPIFY_ACCESS_TOKEN, SHOPIFY_API_VERSION,
+    SHOPIFY_MAX_CONCURRENCY, SHOPIFY_MAX_RETRIES, SHOPIFY_TIMEOUT, SHOPIFY_BUCKET_LEAK_RATE,
+)
+from metrics import TimedTransport
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+# Méthodes rejouables sans risque de doublon côté Shopify ; un POST n'est rejoué que si la requête
+# n'a pas pu partir (connexion impossible) ou a été refusée avant traitement (429)
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+def retry_after_seconds(value: Optional[str], default: float = 2.0) -> float:
+    # Retry-After : un nombre de secondes ("2.0") ou une date HTTP ("Wed, 21 Oct 2026 07:28:00 GMT")
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return default
+
+
+class LeakyBucket:
+    # Modèle local du seau Shopify, recalé sur l'en-tête X-Shopify-Shop-Api-Call-Limit ("32/40")
+    def __init__(self, capacity: int = 40, leak_rate: float = 2.0):
+        self.capacity = capacity
+        self.leak_rate = leak_rate
+        self.level = 0.0
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _leak(self):
+        now = time.monotonic()
+        self.level = max(0.0, self.level - (now - self.updated_at) * self.leak_rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._leak()
+            # On garde une place libre pour ne jamais atteindre la limite (429)
+            while self.level + 1 > self.capacity - 1:
+                await asyncio.sleep((self.level + 2 - self.capacity) / self.leak_rate)
+                self._leak()
+            self.level += 1
+
+    def update_from_header(self, header: Optional[str]):
+        if not header or "/" not in header:
+            return
+        used, capacity = header.split("/", 1)
+        try:
+            self.capacity = int(capacity)
+            self.level = float(used)
+        except ValueError:
+            return
+        self.updated_at = time.monotonic()
+
+    def pause(self, seconds: float):
+        # 429 : Shopify nous dit d'attendre, le seau est considéré plein jusque-là
+        self._leak()
+        self.level = max(self.level, self.capacity + seconds * self.leak_rate)
+
+
+class ShopifyClient:
+    def __init__(self, store_url: str, access_token: str, api_version: str = SHOPIFY_API_VERSION):
+        self.api_path = f"/admin/api/{api_version}"
+        self.base_url = f"{store_url}{self.api_path}"
+        self.access_token = access_token
+        self.bucket = LeakyBucket(leak_rate=SHOPIFY_BUCKET_LEAK_RATE)
+        self.max_retries = SHOPIFY_MAX_RETRIES
+        self._semaphore = asyncio.Semaphore(SHOPIFY_MAX_CONCURRENCY)
+        self._client = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        # Session persistante : les connexions TLS sont réutilisées d'un appel à l'autre
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={
+                    "Content-Type": "application/json",
+                    "X-Shopify-Access-Token": self.access_token
+                },
+                timeout=httpx.Timeout(SHOPIFY_TIMEOUT),
+                transport=TimedTransport(
+                    "shopify",
+                    self.api_path,
+                    httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=SHOPIFY_MAX_CONCURRENCY * 2)),
+                ),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(self, method: str, path: str, **kwargs) -> "httpx.Response":
+        import httpx
+
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                response = await self.client.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                # Délai de lecture, connexion coupée... : un POST a pu être traité, le rejouer créerait un doublon
+                not_sent = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+                if attempt >= self.max_retries or not (idempotent or not_sent):
+                    raise
+            else:
+                self.bucket.update_from_header(response.headers.get("X-Shopify-Shop-Api-Call-Limit"))
+                if response.status_code == 429:
+                    retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+                    self.bucket.pause(retry_after)
+                    if attempt >= self.max_retries:
+                        response.raise_for_status()
+                    attempt += 1
+                    await asyncio.sleep(retry_after)
+                    continue
+                if response.status_code < 500 or attempt >= self.max_retries or not idempotent:
+                    response.raise_for_status()
+                    return response
+            # Erreur réseau ou 5xx rejouable : backoff exponentiel avec jitter
+            attempt += 1
+            await asyncio.sleep(random.uniform(0, 0.5 * 2 ** attempt))
+
+    async def create_product(self, name: str, price: float, image_url: Optional[str] = None):
+        logger.debug("Création du produit Shopify %r (image_url=%s)", name, image_url)
+        payload = {
+            "product": {
+                "title": name,
+                "variants": [
+                    {"price": str(price)}
+                ],
+                "images": [{"src": image_url}] if image_url else []
+            }
         }
-    }
-    
-    response = requests.post(url, json=payload, headers=headers)
-    response.raise_for_status()
-    return response.json()
+        async with self._semaphore:
+            response = await self.request("POST", "/products.json", json=payload)
+        return response.json()
+
+    async def create_products(self, products):
+        # Création en parallèle, bornée par le sémaphore et le seau de débit.
+        # Renvoie un résultat par produit, dans l'ordre : la réponse Shopify ou l'exception levée.
+        return await asyncio.gather(
+            *(self.create_product(p["name"], p["price"], p.get("image_url")) for p in products),
+            return_exceptions=True
+        )
+
+
+shopify_client = ShopifyClient(SHOPIFY_STORE_URL, SHOPIFY_ACCESS_TOKEN)
+
+
+async def create_shopify_product(name: str, price: float, image_url: Optional[str] = None):
+    return await shopify_client.create_product(name, price, image_url)
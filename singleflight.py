@@ -0,0 +1,137 @@
+import asyncio
+import functools
+import threading
+from config import SINGLEFLIGHT_ENABLED
+
+# Regroupement des appels identiques simultanés : le premier appelant exécute la requête,
+# les suivants attendent et reçoivent le même résultat (ou la même exception).
+# Le résultat est partagé entre appelants : il ne doit pas être modifié sur place.
+
+_groups = {}
+
+
+class SingleFlight:
+    # Variante asyncio : un Future par clé en cours
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, func, *args, **kwargs):
+        self.calls += 1
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func(*args, **kwargs))
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.shared += 1
+        # shield : l'annulation d'un appelant (client déconnecté) n'annule pas la requête des autres
+        return await asyncio.shield(future)
+
+    def _forget(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+    def forget(self, key):
+        # Les appels suivants relanceront la requête (ex. après une écriture)
+        self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ThreadSingleFlight:
+    # Variante pour le code synchrone (routes `def` exécutées dans le pool de threads)
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def forget(self, key):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+def group(name: str, threaded: bool = False):
+    if name not in _groups:
+        _groups[name] = ThreadSingleFlight(name) if threaded else SingleFlight(name)
+    return _groups[name]
+
+
+def all_groups():
+    return list(_groups.values())
+
+
+def _call_key(args, kwargs):
+    return (args, tuple(sorted(kwargs.items()))) if kwargs else args
+
+
+def coalesce(func):
+    # Décorateur : appels simultanés avec les mêmes arguments (hashables) regroupés
+    if asyncio.iscoroutinefunction(func):
+        flight = group(f"{func.__module__}.{func.__qualname__}")
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if not SINGLEFLIGHT_ENABLED:
+                return await func(*args, **kwargs)
+            return await flight.do(_call_key(args, kwargs), func, *args, **kwargs)
+
+        async_wrapper.flight = flight
+        return async_wrapper
+
+    flight = group(f"{func.__module__}.{func.__qualname__}", threaded=True)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not SINGLEFLIGHT_ENABLED:
+            return func(*args, **kwargs)
+        return flight.do(_call_key(args, kwargs), func, *args, **kwargs)
+
+    wrapper.flight = flight
+    return wrapper
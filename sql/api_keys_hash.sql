@@ -0,0 +1,20 @@
+-- Clés API : on ne stocke plus que le préfixe (recherche) et le SHA-256 de la clé.
+
+create extension if not exists pgcrypto;
+
+alter table api_keys add column if not exists key_prefix text;
+alter table api_keys add column if not exists key_hash text;
+
+-- Reprise des clés existantes (préfixe = 8 premiers caractères, comme les nouvelles clés)
+update api_keys
+   set key_prefix = left(key, 8),
+       key_hash = encode(digest(key, 'sha256'), 'hex')
+ where key_hash is null and key is not null;
+
+create index if not exists api_keys_key_prefix_idx on api_keys (key_prefix);
+
+-- Les nouvelles clés n'ont plus de valeur en clair
+alter table api_keys alter column key drop not null;
+
+-- À exécuter une fois le nouveau code déployé partout :
+-- update api_keys set key = null;
@@ -0,0 +1,52 @@
+-- Incréments atomiques de sales_count, appelés via RPC PostgREST.
+-- Un seul UPDATE : les lignes sont verrouillées et les ventes concurrentes
+-- s'additionnent au lieu de s'écraser (pas de lecture puis écriture côté API).
+-- Les lignes sont d'abord verrouillées dans l'ordre des id (CTE `locked`) : sans cela, UPDATE ... FROM
+-- les verrouille dans l'ordre du plan de jointure et deux commandes multi-produits concurrentes
+-- peuvent s'attendre mutuellement (deadlock).
+
+create or replace function increment_sales_by_shopify_id(items jsonb)
+returns setof products
+language sql
+as $$
+  with i as (
+    select shopify_id, sum(quantity)::int as quantity
+      from jsonb_to_recordset(items) as x(shopify_id text, quantity int)
+     group by shopify_id
+  ),
+  locked as materialized (
+    select p.id, i.quantity
+      from products p
+      join i on p.shopify_id = i.shopify_id
+     order by p.id
+       for update of p
+  )
+  update products p
+     set sales_count = coalesce(p.sales_count, 0) + locked.quantity
+    from locked
+   where p.id = locked.id
+  returning p.*;
+$$;
+
+create or replace function increment_sales_by_product_id(items jsonb)
+returns setof products
+language sql
+as $$
+  with i as (
+    select product_id, sum(quantity)::int as quantity
+      from jsonb_to_recordset(items) as x(product_id bigint, quantity int)
+     group by product_id
+  ),
+  locked as materialized (
+    select p.id, i.quantity
+      from products p
+      join i on p.id = i.product_id
+     order by p.id
+       for update of p
+  )
+  update products p
+     set sales_count = coalesce(p.sales_count, 0) + locked.quantity
+    from locked
+   where p.id = locked.id
+  returning p.*;
+$$;
@@ -0,0 +1,28 @@
+-- Réconciliation Shopify → Supabase (catalog_sync.py), appelée via RPC PostgREST.
+-- Chaque élément ne porte que les colonnes à corriger : une clé absente garde la valeur actuelle.
+-- sales_count ne fait qu'augmenter : les ventes déjà comptées (webhooks, /create-order) ne sont jamais retirées.
+-- Lignes verrouillées dans l'ordre des id, comme dans sql/increment_sales.sql : un lot de réconciliation
+-- et une commande concurrente ne peuvent pas se bloquer mutuellement (deadlock).
+
+create or replace function sync_products(rows jsonb)
+returns setof products
+language sql
+as $$
+  with locked as materialized (
+    select p.id, r
+      from products p
+      join jsonb_array_elements(rows) r on p.shopify_id = r->>'shopify_id'
+     order by p.id
+       for update of p
+  )
+  update products p
+     set name = case when locked.r ? 'name' then locked.r->>'name' else p.name end,
+         price = case when locked.r ? 'price' then (locked.r->>'price')::numeric else p.price end,
+         image_url = case when locked.r ? 'image_url' then locked.r->>'image_url' else p.image_url end,
+         sales_count = greatest(coalesce(p.sales_count, 0), coalesce((locked.r->>'sales_count')::int, 0))
+    from locked
+   where p.id = locked.id
+  returning p.*;
+$$;
+
+create index if not exists products_shopify_id_idx on products (shopify_id);
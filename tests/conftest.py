@@ -0,0 +1,220 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Configuration de test, posée avant le premier import de config.py (load_dotenv ne l'écrase pas)
+os.environ.update({
+    "SUPABASE_URL": "http://supabase.test",
+    "SUPABASE_KEY": "test",
+    "JWT_SECRET": "test-jwt-secret-with-enough-entropy!!",
+    "SHOPIFY_STORE_URL": "http://shopify.test",
+    "SHOPIFY_ACCESS_TOKEN": "test",
+    "SHOPIFY_SECRET_KEY": "test-webhook-secret",
+    "BCRYPT_ROUNDS": "4",
+    "RATE_LIMIT_ENABLED": "false",
+    "WEBHOOK_QUEUE_PATH": ":memory:",
+    "RATE_LIMIT_PATH": ":memory:",
+})
+
+
+class StubQuery:
+    # Sous-ensemble du query builder postgrest utilisé par repository.py, sur des tables en mémoire
+    def __init__(self, db, table: str):
+        self.db = db
+        self.table = table
+        self.operation = "select"
+        self.columns = "*"
+        self.filters = []
+        self.payload = None
+        self._order = None
+        self._limit = None
+
+    def select(self, columns="*"):
+        self.columns = columns
+        return self
+
+    def insert(self, payload):
+        self.operation, self.payload = "insert", payload
+        return self
+
+    def update(self, payload):
+        self.operation, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.operation = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def in_(self, column, values):
+        wanted = {str(value) for value in values}
+        self.filters.append(lambda row: str(row.get(column)) in wanted)
+        return self
+
+    def order(self, column):
+        self._order = column
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def _project(self, row):
+        if self.columns == "*":
+            return dict(row)
+        return {column: row.get(column) for column in self.columns.split(",")}
+
+    async def execute(self):
+        self.db.calls.append((self.operation, self.table))
+        # Résultat calculé à l'envoi : une requête suspendue renvoie l'état de la base au moment de sa lecture
+        data = self._run()
+        if self.db.gate is not None:
+            await self.db.gate.wait()
+        return SimpleNamespace(data=data)
+
+    def _run(self):
+        rows = self.db.tables.setdefault(self.table, [])
+        if self.operation == "insert":
+            created = []
+            for item in self.payload if isinstance(self.payload, list) else [self.payload]:
+                row = {"id": max((r["id"] for r in rows), default=0) + 1, **item}
+                rows.append(row)
+                created.append(dict(row))
+            return created
+        matched = [row for row in rows if all(f(row) for f in self.filters)]
+        if self.operation == "update":
+            for row in matched:
+                row.update(self.payload)
+        elif self.operation == "delete":
+            for row in matched:
+                rows.remove(row)
+        if self._order:
+            matched.sort(key=lambda row: row[self._order])
+        if self._limit is not None:
+            matched = matched[:self._limit]
+        return [self._project(row) for row in matched]
+
+
+class StubDB:
+    # Remplace le client AsyncPostgrestClient de database.py ; `calls` liste chaque requête envoyée.
+    # `gate` (asyncio.Event) permet de suspendre les requêtes pour provoquer des courses.
+    def __init__(self, **tables):
+        self.tables = {name: [dict(row) for row in rows] for name, rows in tables.items()}
+        self.calls = []
+        self.gate = None
+
+    def table(self, name: str):
+        return StubQuery(self, name)
+
+    async def aclose(self):
+        pass
+
+
+ROLE_USER = {"id": 1, "name": "USER", "can_post_login": True, "can_get_my_user": True, "can_get_users": False,
+             "can_post_products": True, "can_publish_img": False}
+
+
+USER_ALICE = {"id": 1, "name": "alice", "email": "alice@example.com", "password": "x", "role_id": 1,
+              "password_changed_at": 0}
+
+
+def reset_state(monkeypatch):
+    # État global remis à zéro : chaque test part de caches froids
+    from cache import principal_cache, catalog_cache
+    from auth import roles
+    from auth.security import verified_tokens
+
+    for cache in (principal_cache, catalog_cache, verified_tokens):
+        cache.clear()
+    monkeypatch.setattr(roles, "_snapshot", roles.RoleSnapshot(roles.MappingProxyType({}), roles.MappingProxyType({}), 0.0))
+    monkeypatch.setattr(roles, "_refresh_lock", asyncio.Lock())
+
+
+@pytest.fixture
+def stub_db(monkeypatch):
+    import database
+
+    db = StubDB(roles=[ROLE_USER], users=[USER_ALICE], api_keys=[], products=[])
+    monkeypatch.setattr(database, "db", db)
+    reset_state(monkeypatch)
+    return db
+
+
+@pytest.fixture
+def fake_postgrest(monkeypatch):
+    # Stand-in PostgREST de bench/ (RPC comprises) derrière le vrai client postgrest, sans réseau
+    import httpx
+    from postgrest import AsyncPostgrestClient
+    import database
+    from bench import fake_postgrest as fake
+
+    for name in fake.tables:
+        fake.tables[name].clear()
+        fake.next_ids[name] = 1
+    fake.stats["requests"] = 0
+    fake._shopify_index.clear()
+    monkeypatch.setattr(fake, "_lock", asyncio.Lock())
+    fake.tables["roles"].append(dict(ROLE_USER))
+    fake.tables["users"].append(dict(USER_ALICE))
+
+    rest_url = "http://postgrest.test/rest/v1"
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake.app), base_url=rest_url)
+    monkeypatch.setattr(database, "db", AsyncPostgrestClient(rest_url, headers={"apikey": "test"}, http_client=http_client))
+    reset_state(monkeypatch)
+    return fake
+
+
+@pytest.fixture
+def fake_shopify(monkeypatch):
+    # Stand-in de l'API Admin Shopify de bench/ (seau de débit compris), état remis à zéro
+    import itertools
+    import time
+    from bench import fake_shopify as fake
+
+    fake.products.clear()
+    fake.orders.clear()
+    monkeypatch.setattr(fake, "_ids", itertools.count(9000000000))
+    monkeypatch.setattr(fake, "_bucket", {"level": 0.0, "updated_at": time.monotonic()})
+    monkeypatch.setattr(fake, "stats", {"requests": 0, "throttled": 0})
+    return fake
+
+
+@pytest.fixture
+def webhook_journal(monkeypatch, tmp_path):
+    # Journal des webhooks sur un fichier temporaire (ouvert par le lifespan en production)
+    from webhook_queue import webhook_queue, WebhookJournal
+
+    journal = WebhookJournal(str(tmp_path / "webhook_queue.sqlite3"))
+    monkeypatch.setattr(webhook_queue, "journal", journal)
+    yield journal
+    journal.close()
+
+
+@pytest.fixture(scope="session")
+def app():
+    # Application complète, sans lifespan : la base est le StubDB posé par la fixture stub_db
+    from main import create_app
+    return create_app()
+
+
+@pytest.fixture
+def client(app):
+    # Fabrique de clients HTTP branchés directement sur l'application (à ouvrir dans la boucle du test)
+    import httpx
+
+    def make():
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    return make
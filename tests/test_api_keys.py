@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+from auth.api_keys import ApiKeyIndex, api_key_prefix, hash_api_key
+
+KEYS = [f"test-api-key-{i}-0123456789abcdefghijklmnopqrstuvwxyz" for i in range(3)]
+
+
+def key_row(key_id: int) -> dict:
+    key = KEYS[key_id - 1]
+    return {"id": key_id, "user_id": 1, "name": f"cle {key_id}", "key_prefix": api_key_prefix(key), "key_hash": hash_api_key(key)}
+
+
+@pytest.fixture
+def index(stub_db):
+    stub_db.tables["api_keys"] = [key_row(1), key_row(2)]
+    return ApiKeyIndex()
+
+
+async def delete_during(stub_db, index, load):
+    # Suppression (en base puis dans l'index) pendant que la lecture de `load` est en vol
+    gate = asyncio.Event()
+    stub_db.gate = gate
+    task = asyncio.create_task(load())
+    while ("select", "api_keys") not in stub_db.calls:
+        await asyncio.sleep(0)
+    stub_db.gate = None
+    stub_db.tables["api_keys"] = [row for row in stub_db.tables["api_keys"] if row["id"] != 2]
+    index.remove(2)
+    gate.set()
+    await task
+
+
+def test_warm_does_not_resurrect_key_removed_during_load(stub_db, index):
+    async def scenario():
+        await delete_during(stub_db, index, index.warm)
+        assert await index.lookup(KEYS[1]) is None
+        assert await index.lookup(KEYS[0]) == {"id": 1, "user_id": 1}
+
+    asyncio.run(scenario())
+
+
+def test_refresh_does_not_resurrect_key_removed_during_load(stub_db, index):
+    async def scenario():
+        stub_db.tables["api_keys"] = [key_row(1)]
+        await index.warm()
+        stub_db.tables["api_keys"].append(key_row(2))
+        stub_db.calls.clear()
+        await delete_during(stub_db, index, index.refresh)
+        assert await index.lookup(KEYS[1]) is None
+
+    asyncio.run(scenario())
+
+
+def test_tombstones_are_dropped_once_the_database_agrees(stub_db, index):
+    async def scenario():
+        await delete_during(stub_db, index, index.warm)
+        # Lecture commencée avant la suppression : la clé y figurait encore, la pierre tombale reste
+        assert set(index._tombstones) == {2}
+        await index.warm()
+        assert index._tombstones == {}
+
+    asyncio.run(scenario())
+
+
+def test_key_created_during_warm_is_found_by_refresh(stub_db, index, monkeypatch):
+    monkeypatch.setattr("auth.api_keys.API_KEY_MISS_REFRESH_INTERVAL", 0)
+
+    async def scenario():
+        gate = asyncio.Event()
+        stub_db.gate = gate
+        task = asyncio.create_task(index.warm())
+        while ("select", "api_keys") not in stub_db.calls:
+            await asyncio.sleep(0)
+        stub_db.gate = None
+        stub_db.tables["api_keys"].append(key_row(3))
+        index.add(key_row(3))
+        gate.set()
+        await task
+        assert await index.lookup(KEYS[2]) == {"id": 3, "user_id": 1}
+
+    asyncio.run(scenario())
+
+
+def test_key_created_on_another_worker_is_found_after_a_local_creation(stub_db, monkeypatch):
+    # Clé 1 créée via un autre worker, clé 2 créée ici : l'index ne doit pas sauter la clé 1
+    monkeypatch.setattr("auth.api_keys.API_KEY_MISS_REFRESH_INTERVAL", 0)
+    index = ApiKeyIndex()
+
+    async def scenario():
+        await index.warm()
+        stub_db.tables["api_keys"] = [key_row(1), key_row(2)]
+        index.add(key_row(2))
+        return await index.lookup(KEYS[0])
+
+    assert asyncio.run(scenario()) == {"id": 1, "user_id": 1}
+
+
+def test_full_reload_clears_negative_cache(stub_db, monkeypatch):
+    monkeypatch.setattr("auth.api_keys.API_KEY_MISS_REFRESH_INTERVAL", 0)
+    index = ApiKeyIndex()
+
+    async def scenario():
+        await index.warm()
+        # Refusée tant qu'elle n'est pas visible en base
+        assert await index.lookup(KEYS[0]) is None
+        assert index.negative_cache.get(hash_api_key(KEYS[0]))
+        stub_db.tables["api_keys"] = [key_row(1)]
+        await index.warm()
+        return await index.lookup(KEYS[0])
+
+    assert asyncio.run(scenario()) == {"id": 1, "user_id": 1}
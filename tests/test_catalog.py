@@ -0,0 +1,57 @@
+import asyncio
+from cache import catalog_cache
+
+
+def products(count: int):
+    return [{"id": i + 1, "name": f"Produit {i}", "price": 10.0, "sales_count": 0, "image_url": None,
+             "shopify_id": str(9000 + i), "created_by": 1} for i in range(count)]
+
+
+def test_page_read_before_clear_is_not_cached(stub_db, client):
+    # La page est lue avant une commande et revient après le clear() : elle ne doit pas être remise en cache
+    stub_db.tables["products"] = products(3)
+
+    async def scenario():
+        gate = asyncio.Event()
+        stub_db.gate = gate
+        async with client() as http:
+            stale = asyncio.create_task(http.get("/all-products"))
+            while ("select", "products") not in stub_db.calls:
+                await asyncio.sleep(0)
+            stub_db.gate = None
+
+            stub_db.tables["products"][0]["sales_count"] = 5
+            catalog_cache.clear()
+            # Requête arrivée après l'invalidation : ne rejoint pas la lecture en cours (toujours suspendue)
+            fresh = await asyncio.wait_for(http.get("/all-products"), 5)
+            gate.set()
+            await stale
+
+            assert fresh.json()["All Products"][0]["sales_count"] == 5
+            assert catalog_cache.stats()["size"] == 1
+            again = await http.get("/all-products")
+            return again.json()["All Products"][0]["sales_count"]
+
+    assert asyncio.run(scenario()) == 5
+
+
+def test_catalog_revalidates_with_etag(stub_db, client):
+    stub_db.tables["products"] = products(2)
+
+    async def scenario():
+        async with client() as http:
+            first = await http.get("/all-products")
+            assert first.headers["cache-control"] == "no-cache"
+            etag = first.headers["etag"]
+
+            not_modified = await http.get("/all-products", headers={"If-None-Match": f'"autre", {etag}'})
+            assert not_modified.status_code == 304
+            assert not_modified.content == b""
+
+            stub_db.tables["products"][1]["sales_count"] = 3
+            catalog_cache.clear()
+            changed = await http.get("/all-products", headers={"If-None-Match": etag})
+            assert changed.status_code == 200
+            assert changed.headers["etag"] != etag
+
+    asyncio.run(scenario())
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+import pytest
+from auth import hashing
+from tests.test_principal_cache import issued_before
+
+PASSWORD = "secret"
+
+
+@pytest.fixture
+def alice(stub_db):
+    user = stub_db.tables["users"][0]
+    user["password"] = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(4)).decode()
+    return user
+
+
+@pytest.fixture
+def blocked_executor(monkeypatch):
+    # Un seul worker bcrypt, sans file d'attente ; les vérifications attendent `release`
+    release = threading.Event()
+    check = hashing._check
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(hashing, "_executor", executor)
+    monkeypatch.setattr(hashing, "BCRYPT_WORKERS", 1)
+    monkeypatch.setattr(hashing, "BCRYPT_MAX_QUEUE", 0)
+    monkeypatch.setattr(hashing, "_check", lambda password, hashed: release.wait(5) and check(password, hashed))
+    yield release
+    release.set()
+    executor.shutdown(wait=True)
+
+
+def test_login_is_shed_when_the_pool_is_saturated(alice, blocked_executor, client):
+    credentials = {"email": "alice@example.com", "password": PASSWORD}
+
+    async def scenario():
+        async with client() as http:
+            first = asyncio.create_task(http.post("/login", json=credentials))
+            while hashing.pending_operations() < 1:
+                await asyncio.sleep(0.001)
+            shed = await http.post("/login", json=credentials)
+            blocked_executor.set()
+            return await first, shed
+
+    first, shed = asyncio.run(scenario())
+    assert shed.status_code == 503
+    assert shed.headers["retry-after"] == "1"
+    assert first.status_code == 200
+    assert hashing.pending_operations() == 0
+
+
+def test_login_rehashes_an_old_cost_without_revoking_tokens(alice, client):
+    alice["password"] = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(5)).decode()
+    alice["password_changed_at"] = 1000
+    token = issued_before("alice@example.com")
+
+    async def scenario():
+        async with client() as http:
+            wrong = await http.post("/login", json={"email": "alice@example.com", "password": "mauvais"})
+            assert wrong.status_code == 401
+            assert alice["password"].startswith("$2b$05$")
+
+            # Règle d'une connexion toutes les 5 s par email désactivée avec RATE_LIMIT_ENABLED=false
+            assert (await http.post("/login", json={"email": "alice@example.com", "password": PASSWORD})).status_code == 200
+            return await http.get("/my-user", headers={"Authorization": f"Bearer {token}"})
+
+    me = asyncio.run(scenario())
+    assert alice["password"].startswith(f"$2b${hashing.BCRYPT_ROUNDS:02d}$")
+    assert bcrypt.checkpw(PASSWORD.encode(), alice["password"].encode())
+    assert alice["password_changed_at"] == 1000
+    # Un token émis avant la connexion reste valable : le mot de passe n'a pas changé
+    assert me.status_code == 200
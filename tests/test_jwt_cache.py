@@ -0,0 +1,77 @@
+import asyncio
+import hashlib
+import time
+from types import SimpleNamespace
+import jwt
+import pytest
+from fastapi import HTTPException
+from auth.security import create_token, decode_token, verified_tokens
+from config import JWT_SECRET
+from models import ChangePasswordRequest
+from routes.users import change_password
+from tests.test_principal_cache import issued_before
+
+
+def cached(token: str):
+    return verified_tokens.get(hashlib.sha256(token.encode("utf-8")).digest())
+
+
+def test_entry_expires_with_the_token(stub_db):
+    token = jwt.encode({"email": "alice@example.com", "iat": int(time.time()), "exp": int(time.time()) + 1},
+                       JWT_SECRET, algorithm="HS256")
+    assert decode_token(token)["email"] == "alice@example.com"
+    assert cached(token) is not None
+
+    time.sleep(max(0.0, jwt.decode(token, options={"verify_signature": False})["exp"] - time.time()) + 0.05)
+    assert cached(token) is None
+    with pytest.raises(HTTPException) as error:
+        decode_token(token)
+    assert error.value.detail == "Token expiré"
+
+
+def test_token_without_exp_is_not_cached(stub_db):
+    token = jwt.encode({"email": "alice@example.com", "iat": int(time.time())}, JWT_SECRET, algorithm="HS256")
+    assert decode_token(token)["email"] == "alice@example.com"
+    assert cached(token) is None
+
+
+def test_forged_tokens_are_never_served_from_cache(stub_db):
+    token = create_token("alice@example.com")
+    claims = decode_token(token)
+    assert cached(token) is not None
+
+    header, payload, signature = token.split(".")
+    forged = [
+        # Mêmes claims, autre secret
+        jwt.encode(claims, "un-autre-secret-avec-assez-d-entropie!!", algorithm="HS256"),
+        # Signature modifiée
+        f"{header}.{payload}.{signature[:-2]}{'AA' if signature[-2:] != 'AA' else 'BB'}",
+        # Algorithme "none"
+        jwt.encode(claims, None, algorithm="none"),
+    ]
+    for bad in forged:
+        with pytest.raises(HTTPException) as error:
+            decode_token(bad)
+        assert error.value.status_code == 401
+        assert cached(bad) is None
+
+
+def test_cached_token_is_rejected_after_change_password(stub_db, client):
+    token = issued_before("alice@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def scenario():
+        async with client() as http:
+            for _ in range(2):
+                assert (await http.get("/my-user", headers=headers)).status_code == 200
+            assert cached(token) is not None
+
+            user = SimpleNamespace(id=1, email="alice@example.com")
+            await change_password(SimpleNamespace(state=SimpleNamespace(user=user)), ChangePasswordRequest(new_password="nouveau"))
+            hits = verified_tokens.hits
+            response = await http.get("/my-user", headers=headers)
+            # Servi par le cache des JWT, refusé par le contrôle password_changed_at
+            assert verified_tokens.hits == hits + 1
+            return response.status_code
+
+    assert asyncio.run(scenario()) == 401
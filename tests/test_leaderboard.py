@@ -0,0 +1,96 @@
+import asyncio
+import random
+import leaderboard as leaderboard_module
+from leaderboard import Leaderboard, TopK, LEADERBOARD_COLUMNS
+
+K = 10
+
+
+def product(product_id: int, sales_count: int, creator_id: int) -> dict:
+    return {"id": product_id, "name": f"Produit {product_id}", "price": 10.0, "image_url": None,
+            "sales_count": sales_count, "shopify_id": str(9000 + product_id), "created_by": creator_id}
+
+
+def expected_top(rows, limit: int, creator_id=None):
+    # Référence : tri complet de tous les produits
+    scope = [row for row in rows if creator_id is None or row["created_by"] == creator_id]
+    ordered = sorted(scope, key=lambda row: (-row["sales_count"], row["id"]))
+    return [{column: row[column] for column in LEADERBOARD_COLUMNS} for row in ordered[:limit]]
+
+
+def check(board: Leaderboard, rows, creators):
+    async def tops():
+        return [await board.top(K)] + [await board.top(K, creator_id=c) for c in creators]
+
+    assert asyncio.run(tops()) == [expected_top(rows, K)] + [expected_top(rows, K, c) for c in creators]
+
+
+def test_topk_matches_full_sort():
+    rng = random.Random(1)
+    top, rows = TopK(K), {}
+    for _ in range(2000):
+        product_id = rng.randrange(200)
+        sales = rows.get(product_id, 0) + rng.randint(0, 5)
+        rows[product_id] = sales
+        top.update(tuple(product(product_id, sales, 1)[column] for column in LEADERBOARD_COLUMNS))
+    assert top.top(K) == expected_top([product(i, s, 1) for i, s in rows.items()], K)
+    assert top.top(3) == expected_top([product(i, s, 1) for i, s in rows.items()], 3)
+
+
+def test_leaderboard_matches_full_sort_with_stale_updates():
+    rng = random.Random(2)
+    board, state, history = Leaderboard(K), {}, []
+    board._loaded = True
+    for _ in range(3000):
+        product_id = rng.randrange(300)
+        row = product(product_id, state.get(product_id, {"sales_count": 0})["sales_count"] + rng.randint(1, 4),
+                      creator_id=product_id % 7)
+        state[product_id] = row
+        history.append(row)
+        # Mises à jour en retard (webhook rejoué, réponse arrivée après une plus récente) : ignorées
+        batch = [row] + ([rng.choice(history)] if rng.random() < 0.3 else [])
+        board.update(batch)
+    check(board, list(state.values()), range(7))
+
+
+def test_reload_replays_updates_received_during_load(stub_db, monkeypatch):
+    # Rechargement page par page pendant que des commandes modifient les ventes :
+    # les pages déjà lues sont périmées, les mises à jour en attente (_pending) doivent être rejouées
+    monkeypatch.setattr(leaderboard_module, "_LOAD_PAGE_SIZE", 7)
+    rng = random.Random(3)
+    rows = [product(i + 1, rng.randint(0, 50), creator_id=i % 5) for i in range(60)]
+    stub_db.tables["products"] = [dict(row) for row in rows]
+    board = Leaderboard(K)
+
+    async def scenario():
+        gate = asyncio.Event()
+        stub_db.gate = gate
+        loading = asyncio.create_task(board.load())
+        seen = 0
+        while not loading.done():
+            pages = stub_db.calls.count(("select", "products"))
+            if pages == seen:
+                await asyncio.sleep(0)
+                continue
+            seen = pages
+            # Page en vol : commandes appliquées en base puis au classement, avant de libérer la lecture
+            stub_db.gate, released = asyncio.Event(), gate
+            gate = stub_db.gate
+            updated = []
+            for db_row in rng.sample(stub_db.tables["products"], 5):
+                db_row["sales_count"] += rng.randint(1, 40)
+                updated.append(dict(db_row))
+            board.update(updated)
+            released.set()
+        stub_db.gate = None
+        gate.set()
+        await loading
+
+    asyncio.run(scenario())
+    assert board.loaded and board._pending is None
+    check(board, stub_db.tables["products"], range(5))
+
+    # Rechargement à froid (réconciliation) : même résultat
+    reloaded = Leaderboard(K)
+    asyncio.run(reloaded.load())
+    check(reloaded, stub_db.tables["products"], range(5))
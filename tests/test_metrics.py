@@ -0,0 +1,89 @@
+import asyncio
+import re
+import metrics
+import ratelimit
+from auth.security import create_token
+from metrics import gauge, histogram, render_prometheus
+from ratelimit import MemoryBackend, Policy, RateLimiter
+
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*",?)*\})? \S+$')
+
+
+def series(name: str):
+    return {dict(labels).get("route"): hist for (metric, labels), hist in metrics.all_histograms().items() if metric == name}
+
+
+def test_metrics_skip_auth_and_rate_limiting(stub_db, client, monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(ratelimit, "rate_limiter", RateLimiter(MemoryBackend(100)))
+    monkeypatch.setattr(ratelimit, "DEFAULT_POLICIES", [Policy("test", "ip", capacity=2, period=60)])
+
+    async def scenario():
+        async with client() as http:
+            scrapes = [(await http.get("/metrics")).status_code for _ in range(5)]
+            others = [(await http.get("/all-products")).status_code for _ in range(3)]
+        return scrapes, others
+
+    scrapes, others = asyncio.run(scenario())
+    # Sans jeton ni clé API, au-delà de la capacité de la politique par défaut
+    assert scrapes == [200] * 5
+    assert others[-1] == 429
+
+
+def test_requests_are_labelled_by_route_template(stub_db, client):
+    headers = {"Authorization": f"Bearer {create_token('alice@example.com')}"}
+
+    async def scenario():
+        async with client() as http:
+            for key_id in (12345, 67890):
+                assert (await http.delete(f"/api-keys/{key_id}", headers=headers)).status_code == 200
+            assert (await http.get("/route/inconnue/42", headers=headers)).status_code == 404
+
+    asyncio.run(scenario())
+    routes = series("http_request_seconds")
+    assert routes["/api-keys/{key_id}"].count >= 2
+    assert "unmatched" in routes
+    assert not any(route and re.search(r"\d{3,}", route) for route in routes)
+
+
+def test_server_timing_is_opt_in(stub_db, client, monkeypatch):
+    headers = {"Authorization": f"Bearer {create_token('alice@example.com')}"}
+
+    async def scenario():
+        async with client() as http:
+            default = await http.get("/my-user", headers=headers)
+            asked = await http.get("/my-user", headers={**headers, "x-server-timing": "1"})
+            monkeypatch.setattr(metrics, "SERVER_TIMING", True)
+            enabled = await http.get("/all-products")
+        return default, asked, enabled
+
+    default, asked, enabled = asyncio.run(scenario())
+    assert "server-timing" not in default.headers
+    assert re.fullmatch(r"([a-z]+;dur=\d+\.\d{2}, )*total;dur=\d+\.\d{2}", asked.headers["server-timing"])
+    assert "total;dur=" in enabled.headers["server-timing"]
+
+
+def test_prometheus_exposition_format(monkeypatch):
+    monkeypatch.setattr(metrics, "_histograms", {})
+    monkeypatch.setattr(metrics, "_gauges", {})
+    hist = histogram("test_seconds", route='/a"b\\c')
+    for value in (0.003, 0.2, 20.0):
+        hist.observe(value)
+    gauge("test_entries", lambda: [({"cache": "jwt"}, 7)])
+    gauge("test_depth", lambda: 3)
+    gauge("test_broken", lambda: 1 / 0)
+
+    lines = render_prometheus().splitlines()
+    samples = [line for line in lines if not line.startswith("#")]
+    assert all(SAMPLE.match(line) for line in samples), samples
+    assert "# TYPE test_seconds histogram" in lines
+    assert "# TYPE test_entries gauge" in lines
+    assert 'test_entries{cache="jwt"} 7' in lines
+    assert "test_depth 3" in lines
+    assert not any("test_broken" in line for line in lines)
+
+    buckets = [int(line.rsplit(" ", 1)[1]) for line in samples if line.startswith("test_seconds_bucket")]
+    assert buckets == sorted(buckets) and len(buckets) == len(metrics.DEFAULT_BUCKETS) + 1
+    assert 'test_seconds_bucket{route="/a\\"b\\\\c",le="+Inf"} 3' in lines
+    assert 'test_seconds_bucket{route="/a\\"b\\\\c",le="0.005"} 1' in lines
+    assert 'test_seconds_count{route="/a\\"b\\\\c"} 3' in lines
@@ -0,0 +1,188 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import bcrypt
+import jwt
+import pytest
+from auth.api_keys import api_key_index, api_key_prefix, hash_api_key
+from auth.security import create_token
+from cache import TTLCache, principal_cache
+from config import JWT_SECRET
+from models import ChangePasswordRequest
+from routes.users import change_password
+
+API_KEY = "test-api-key-0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def issued_before(email: str, seconds: int = 10) -> str:
+    # Token émis avant un changement de mot de passe (iat dans le passé)
+    return jwt.encode({
+        "email": email,
+        "iat": int(time.time()) - seconds,
+        "exp": datetime.now(timezone.utc) + timedelta(hours=1),
+    }, JWT_SECRET, algorithm="HS256")
+
+
+@pytest.fixture
+def api_key(stub_db, monkeypatch):
+    monkeypatch.setattr(api_key_index, "_by_prefix", {})
+    monkeypatch.setattr(api_key_index, "_max_id", 0)
+    monkeypatch.setattr(api_key_index, "_warm", True)
+    row = {"id": 1, "user_id": 1, "name": "test", "key_prefix": api_key_prefix(API_KEY), "key_hash": hash_api_key(API_KEY)}
+    stub_db.tables["api_keys"].append(row)
+    api_key_index.add(row)
+    return API_KEY
+
+
+def test_warm_jwt_path_makes_no_db_calls(stub_db, client):
+    headers = {"Authorization": f"Bearer {create_token('alice@example.com')}"}
+
+    async def scenario():
+        async with client() as http:
+            cold = await http.get("/my-user", headers=headers)
+            assert cold.status_code == 200
+            assert ("select", "users") in stub_db.calls
+
+            stub_db.calls.clear()
+            for _ in range(10):
+                assert (await http.get("/my-user", headers=headers)).status_code == 200
+            assert stub_db.calls == []
+
+    asyncio.run(scenario())
+    assert principal_cache.hits >= 10
+
+
+def test_warm_api_key_path_makes_no_db_calls(stub_db, api_key, client):
+    async def scenario():
+        async with client() as http:
+            assert (await http.get("/my-user", headers={"x-api-key": api_key})).status_code == 200
+            stub_db.calls.clear()
+            for _ in range(10):
+                assert (await http.get("/my-user", headers={"x-api-key": api_key})).status_code == 200
+            assert stub_db.calls == []
+
+    asyncio.run(scenario())
+
+
+def test_delete_api_key_revokes_cached_principal(stub_db, api_key, client):
+    headers = {"Authorization": f"Bearer {create_token('alice@example.com')}"}
+
+    async def scenario():
+        async with client() as http:
+            assert (await http.get("/my-user", headers={"x-api-key": api_key})).status_code == 200
+            assert (await http.delete("/api-keys/1", headers=headers)).status_code == 200
+            assert (await http.get("/my-user", headers={"x-api-key": api_key})).status_code == 401
+
+    asyncio.run(scenario())
+
+
+def test_change_password_rejects_old_token_immediately(stub_db, client):
+    old_token = issued_before("alice@example.com")
+
+    async def scenario():
+        async with client() as http:
+            headers = {"Authorization": f"Bearer {old_token}"}
+            assert (await http.get("/my-user", headers=headers)).status_code == 200
+            response = await http.patch("/change-password", headers=headers, json={"new_password": "nouveau"})
+            assert response.status_code == 200
+            assert (await http.get("/my-user", headers=headers)).status_code == 401
+
+    asyncio.run(scenario())
+
+
+def test_read_started_before_change_password_is_not_cached(stub_db, client):
+    # La lecture de l'utilisateur part avant change_password et revient après l'invalidation :
+    # l'ancien password_changed_at ne doit pas être remis en cache
+    old_token = issued_before("alice@example.com")
+
+    async def scenario():
+        gate = asyncio.Event()
+        stub_db.gate = gate
+        async with client() as http:
+            request = asyncio.create_task(http.get("/my-user", headers={"Authorization": f"Bearer {old_token}"}))
+            while ("select", "users") not in stub_db.calls:
+                await asyncio.sleep(0)
+            stub_db.gate = None
+
+            user = SimpleNamespace(id=1, email="alice@example.com")
+            await change_password(SimpleNamespace(state=SimpleNamespace(user=user)), ChangePasswordRequest(new_password="nouveau"))
+            gate.set()
+            await request
+
+            assert principal_cache.get(("email", "alice@example.com")) is None
+            response = await http.get("/my-user", headers={"Authorization": f"Bearer {old_token}"})
+            assert response.status_code == 401
+
+    asyncio.run(scenario())
+
+
+def test_login_after_change_password_does_not_join_an_older_read(stub_db, client):
+    # Connexion avec l'ancien mot de passe partie avant change_password, puis une seconde après :
+    # la seconde ne doit pas réutiliser la lecture de la première (ancien hash)
+    stub_db.tables["users"][0]["password"] = bcrypt.hashpw(b"ancien", bcrypt.gensalt(4)).decode()
+    credentials = {"email": "alice@example.com", "password": "ancien"}
+
+    async def scenario():
+        gate = asyncio.Event()
+        stub_db.gate = gate
+        async with client() as http:
+            first = asyncio.create_task(http.post("/login", json=credentials))
+            while ("select", "users") not in stub_db.calls:
+                await asyncio.sleep(0)
+            stub_db.gate = None
+
+            user = SimpleNamespace(id=1, email="alice@example.com")
+            await change_password(SimpleNamespace(state=SimpleNamespace(user=user)), ChangePasswordRequest(new_password="nouveau"))
+            second = asyncio.create_task(http.post("/login", json=credentials))
+            for _ in range(100):
+                await asyncio.sleep(0)
+            gate.set()
+            await first
+            return (await second).status_code
+
+    assert asyncio.run(scenario()) == 401
+
+
+def test_api_key_list_reflects_a_key_created_during_a_read(stub_db, client):
+    headers = {"Authorization": f"Bearer {create_token('alice@example.com')}"}
+
+    async def scenario():
+        async with client() as http:
+            assert (await http.get("/my-user", headers=headers)).status_code == 200
+            gate = asyncio.Event()
+            stub_db.gate = gate
+            stale = asyncio.create_task(http.get("/api-keys", headers=headers))
+            while ("select", "api_keys") not in stub_db.calls:
+                await asyncio.sleep(0)
+            stub_db.gate = None
+            assert (await http.post("/api-keys", headers=headers, json={"name": "nouvelle"})).status_code == 200
+            fresh = asyncio.create_task(http.get("/api-keys", headers=headers))
+            for _ in range(100):
+                await asyncio.sleep(0)
+            gate.set()
+            await stale
+            return (await fresh).json()["api_keys"]
+
+    assert [key["name"] for key in asyncio.run(scenario())] == ["nouvelle"]
+
+
+def test_ttl_cache_skips_set_after_invalidation():
+    cache = TTLCache(10, 60)
+    generation = cache.generation
+    cache.invalidate("a")
+    assert cache.set("a", 1, generation=generation) is False
+    assert cache.get("a") is None
+    assert cache.set("a", 2, generation=cache.generation) is True
+    assert cache.get("a") == 2
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(2, 60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import tracemalloc
+import warnings
+import httpx
+import pytest
+import product_import
+import repository
+from auth import roles
+from auth.security import create_token
+from cache import principal_cache
+from product_import import ImportManager
+from shopify_api import LeakyBucket, ShopifyClient
+
+BOB = {"id": 2, "name": "bob", "email": "bob@example.com", "password": "x", "role_id": 1, "password_changed_at": 0}
+
+
+class FailingShopify(httpx.AsyncBaseTransport):
+    # Stand-in Shopify de bench/, sauf pour les produits nommés "ECHEC" (422)
+    def __init__(self, app):
+        self.transport = httpx.ASGITransport(app=app)
+
+    async def handle_async_request(self, request):
+        if json.loads(request.content)["product"]["title"] == "ECHEC":
+            return httpx.Response(422, json={"errors": {"title": ["refusé"]}})
+        return await self.transport.handle_async_request(request)
+
+
+@pytest.fixture
+def shopify(fake_shopify, monkeypatch):
+    monkeypatch.setattr(fake_shopify, "BUCKET_SIZE", 10 ** 6)
+    client = ShopifyClient("http://shopify.test", "test")
+    client.bucket = LeakyBucket(capacity=10 ** 6, leak_rate=10 ** 6)
+    client._client = httpx.AsyncClient(base_url=client.base_url, transport=FailingShopify(fake_shopify.app))
+    monkeypatch.setattr(product_import, "shopify_client", client)
+    return fake_shopify
+
+
+@pytest.fixture
+def imports(fake_postgrest, shopify, monkeypatch):
+    fake_postgrest.tables["users"].append(dict(BOB))
+    manager = ImportManager()
+    monkeypatch.setattr(product_import, "product_imports", manager)
+    monkeypatch.setattr("routes.products.product_imports", manager)
+    return manager
+
+
+def auth(email: str = "alice@example.com"):
+    return {"Authorization": f"Bearer {create_token(email)}"}
+
+
+async def run_import(http, body: bytes, content_type: str = "application/x-ndjson"):
+    response = await http.post("/products/import", content=body, headers={**auth(), "content-type": content_type})
+    assert response.status_code == 202, response.text
+    job_id = response.json()["job_id"]
+    while True:
+        status = (await http.get(f"/products/import/{job_id}", headers=auth())).json()
+        if status["status"] in ("completed", "failed"):
+            return status
+        await asyncio.sleep(0.01)
+
+
+def ndjson(*rows) -> bytes:
+    return "".join((row if isinstance(row, str) else json.dumps(row)) + "\n" for row in rows).encode()
+
+
+def test_ndjson_rows_are_created_and_bad_rows_reported(imports, fake_postgrest, client):
+    body = b"\xef\xbb\xbf" + ndjson(
+        {"name": "Chaise", "price": 10},
+        "",
+        "{pas du json",
+        [1, 2],
+        {"name": "Table"},
+        {"name": "Lampe", "price": "4.5"},
+    )
+
+    async def scenario():
+        async with client() as http:
+            return await run_import(http, body)
+
+    status = asyncio.run(scenario())
+    assert status["status"] == "completed"
+    assert (status["rows_read"], status["created"], status["failed"], status["pending"]) == (5, 2, 3, 0)
+    assert [error["row"] for error in status["errors"]] == [3, 4, 5]
+    assert status["errors"][0]["error"].startswith("JSON invalide")
+    assert status["errors"][1]["error"] == "Objet JSON attendu"
+    assert "price" in status["errors"][2]["error"]
+    products = {row["name"]: row for row in fake_postgrest.tables["products"]}
+    assert set(products) == {"Chaise", "Lampe"}
+    assert products["Chaise"]["created_by"] == 1 and products["Chaise"]["shopify_id"]
+
+
+def test_csv_with_bom_and_empty_cells(imports, fake_postgrest, client):
+    body = "﻿name,price,image_url,sales_count\r\nChaise,10,,\r\nTable,,,\r\nLampe,4.5,,3\r\n".encode()
+
+    async def scenario():
+        async with client() as http:
+            return await run_import(http, body, "text/csv")
+
+    status = asyncio.run(scenario())
+    # Cellule vide = valeur par défaut du modèle ; le prix, obligatoire, manque à la ligne 3
+    assert (status["created"], status["failed"]) == (2, 1)
+    assert status["errors"][0]["row"] == 3
+    products = {row["name"]: row for row in fake_postgrest.tables["products"]}
+    assert products["Chaise"]["image_url"] is None and products["Chaise"]["sales_count"] == 0
+    assert products["Lampe"]["sales_count"] == 3
+
+
+def test_error_report_is_capped(imports, client, monkeypatch):
+    monkeypatch.setattr(product_import, "IMPORT_MAX_ERRORS", 3)
+
+    async def scenario():
+        async with client() as http:
+            return await run_import(http, ndjson(*[{"name": f"sans prix {i}"} for i in range(10)]))
+
+    status = asyncio.run(scenario())
+    assert status["failed"] == 10
+    assert len(status["errors"]) == 3
+    assert status["errors_truncated"] == 7
+
+
+def test_upload_over_the_limit_is_rejected(imports, client, monkeypatch):
+    monkeypatch.setattr(product_import, "IMPORT_MAX_BYTES", 100)
+
+    async def scenario():
+        async with client() as http:
+            return await http.post("/products/import", content=ndjson(*[{"name": "Chaise", "price": 1}] * 20),
+                                   headers={**auth(), "content-type": "application/x-ndjson"})
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 413
+    assert imports._active == {} and imports.jobs.stats()["size"] == 0
+
+
+def test_images_require_can_publish_img(imports, fake_postgrest, client):
+    body = ndjson({"name": "Chaise", "price": 10, "image_url": "http://img.test/chaise.png"}, {"name": "Table", "price": 20})
+
+    async def scenario():
+        async with client() as http:
+            refused = await run_import(http, body)
+            fake_postgrest.tables["roles"][0]["can_publish_img"] = True
+            await roles.refresh_roles()
+            principal_cache.clear()
+            return refused, await run_import(http, body)
+
+    refused, allowed = asyncio.run(scenario())
+    assert (refused["created"], refused["failed"]) == (1, 1)
+    assert refused["errors"][0]["error"] == "Vous n'avez pas le droit de publier une image"
+    assert (allowed["created"], allowed["failed"]) == (2, 0)
+
+
+def test_shopify_failure_only_fails_its_row(imports, shopify, fake_postgrest, client, monkeypatch):
+    monkeypatch.setattr(product_import, "IMPORT_CHUNK_SIZE", 3)
+    body = ndjson(*({"name": name, "price": 1} for name in ("A", "ECHEC", "B", "C")))
+
+    async def scenario():
+        async with client() as http:
+            return await run_import(http, body)
+
+    status = asyncio.run(scenario())
+    assert (status["status"], status["created"], status["failed"]) == ("completed", 3, 1)
+    assert status["errors"][0]["row"] == 2 and status["errors"][0]["error"].startswith("Erreur Shopify")
+    assert sorted(row["name"] for row in fake_postgrest.tables["products"]) == ["A", "B", "C"]
+    assert len(shopify.products) == 3
+
+
+def test_insert_failure_fails_its_chunk_only(imports, shopify, fake_postgrest, client, monkeypatch):
+    monkeypatch.setattr(product_import, "IMPORT_CHUNK_SIZE", 2)
+    insert_products, calls = repository.insert_products, []
+
+    async def flaky_insert(rows):
+        calls.append(len(rows))
+        if len(calls) == 2:
+            raise RuntimeError("base indisponible")
+        return await insert_products(rows)
+
+    monkeypatch.setattr(repository, "insert_products", flaky_insert)
+    body = ndjson(*({"name": f"P{i}", "price": 1} for i in range(5)))
+
+    async def scenario():
+        async with client() as http:
+            return await run_import(http, body)
+
+    status = asyncio.run(scenario())
+    assert calls == [2, 2, 1]
+    assert (status["status"], status["created"], status["failed"]) == ("completed", 3, 2)
+    assert [error["row"] for error in status["errors"]] == [3, 4]
+    assert all(error["error"] == "Erreur base : base indisponible" for error in status["errors"])
+    assert sorted(row["name"] for row in fake_postgrest.tables["products"]) == ["P0", "P1", "P4"]
+    # Créés côté Shopify mais sans ligne en base : journalisés pour reprise
+    assert len(shopify.products) == 5
+
+
+def test_job_is_only_visible_to_its_owner(imports, client):
+    async def scenario():
+        async with client() as http:
+            status = await run_import(http, ndjson({"name": "Chaise", "price": 10}))
+            own = await http.get(f"/products/import/{status['job_id']}", headers=auth())
+            other = await http.get(f"/products/import/{status['job_id']}", headers=auth("bob@example.com"))
+            unknown = await http.get("/products/import/inconnu", headers=auth())
+        return own, other, unknown
+
+    own, other, unknown = asyncio.run(scenario())
+    assert own.status_code == 200
+    assert other.status_code == 404 and unknown.status_code == 404
+
+
+async def stream(body: bytes, size: int = 64 * 1024):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def test_running_job_is_not_evicted(monkeypatch):
+    monkeypatch.setattr(product_import, "IMPORT_MAX_JOBS", 1)
+    manager = ImportManager()
+
+    class BlockedShopify:
+        def __init__(self):
+            self.release = asyncio.Event()
+
+        async def create_products(self, products):
+            await self.release.wait()
+            return [RuntimeError("indisponible")] * len(products)
+
+    async def scenario():
+        blocked = BlockedShopify()
+        monkeypatch.setattr(product_import, "shopify_client", blocked)
+        running = await manager.submit(1, "ndjson", False, stream(ndjson({"name": "Chaise", "price": 1})))
+        while running.status != "running":
+            await asyncio.sleep(0)
+        # D'autres imports (vides) terminent et remplissent le cache des imports terminés
+        for _ in range(3):
+            done = await manager.submit(1, "ndjson", False, stream(b""))
+            while done.finished_at is None:
+                await asyncio.sleep(0)
+        assert manager.get(running.id) is running
+        blocked.release.set()
+        while running.finished_at is None:
+            await asyncio.sleep(0)
+        return running
+
+    running = asyncio.run(scenario())
+    assert manager.get(running.id) is running
+    assert manager._active == {}
+
+
+def peak_memory(rows: int, monkeypatch) -> int:
+    # Shopify et base sans état : seule la mémoire de l'import lui-même est mesurée
+    class Shopify:
+        async def create_products(self, products):
+            return [{"product": {"id": 1}} for _ in products]
+
+    async def insert_products(rows):
+        return [{"id": 1, **row} for row in rows[:1]]
+
+    monkeypatch.setattr(product_import, "shopify_client", Shopify())
+    monkeypatch.setattr(repository, "insert_products", insert_products)
+    monkeypatch.setattr(product_import.leaderboard, "update", lambda rows: None)
+    body = ndjson(*({"name": f"Produit {i}", "price": i} for i in range(rows // 2)),
+                  *({"name": f"Sans prix {i}"} for i in range(rows // 2)))
+    manager = ImportManager()
+
+    async def scenario():
+        job = await manager.submit(1, "ndjson", False, stream(body))
+        # Avertissements (dépréciation pydantic) non conservés par pytest pendant la mesure
+        warnings.simplefilter("ignore")
+        tracemalloc.start()
+        while job.finished_at is None:
+            await asyncio.sleep(0)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert job.rows_read == rows
+        return peak
+
+    with warnings.catch_warnings():
+        return asyncio.run(scenario())
+
+
+def test_memory_does_not_grow_with_file_size(monkeypatch):
+    small = peak_memory(2_000, monkeypatch)
+    large = peak_memory(20_000, monkeypatch)
+    # Dix fois plus de lignes (et d'erreurs, plafonnées par IMPORT_MAX_ERRORS) : même pic, à un lot près
+    assert large < small * 1.5, (small, large)
@@ -0,0 +1,89 @@
+import asyncio
+import sqlite3
+import threading
+from starlette.requests import Request
+import ratelimit
+from ratelimit import MemoryBackend, Policy, RateLimiter, SQLiteBackend, client_ip
+
+POLICY = Policy("test", "ip", capacity=2, period=60)
+
+
+def test_sqlite_backend_runs_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    backend = SQLiteBackend(str(tmp_path / "ratelimit.sqlite3"), 100)
+    threads = []
+    hit = backend.hit
+    monkeypatch.setattr(backend, "hit", lambda *args: threads.append(threading.get_ident()) or hit(*args))
+    limiter = RateLimiter(backend)
+
+    async def scenario():
+        return [(await limiter.hit(POLICY, "1.2.3.4"))[0] for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [True, True, False]
+    assert threading.get_ident() not in threads
+
+
+def test_sqlite_backend_fails_open_when_locked(tmp_path, monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    path = str(tmp_path / "ratelimit.sqlite3")
+    limiter = RateLimiter(SQLiteBackend(path, 100))
+    # Un autre worker garde le verrou d'écriture : la requête passe sans être comptée
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    async def scenario():
+        return [await limiter.hit(POLICY, "1.2.3.4") for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [(True, 0.0)] * 3
+    other.execute("ROLLBACK")
+    other.close()
+
+
+def test_webhooks_are_not_rate_limited(stub_db, client, monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(ratelimit, "rate_limiter", RateLimiter(MemoryBackend(100)))
+    monkeypatch.setattr(ratelimit, "DEFAULT_POLICIES", [POLICY])
+
+    async def scenario():
+        async with client() as http:
+            webhooks = [(await http.post("/webhooks/shopify-sales", content=b"{}")).status_code for _ in range(5)]
+            others = [(await http.get("/all-products")).status_code for _ in range(3)]
+        return webhooks, others
+
+    webhooks, others = asyncio.run(scenario())
+    # Signature absente : rejetés par le contrôle HMAC, jamais par la limite de débit
+    assert 429 not in webhooks
+    assert others[-1] == 429
+
+
+def test_client_ip_ignores_addresses_supplied_by_the_client(monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_TRUST_PROXY", True)
+
+    def request(forwarded=None):
+        headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+        return Request({"type": "http", "headers": headers, "client": ("10.0.0.9", 1234)})
+
+    # Un proxy : il ajoute à droite l'adresse du client, ce qui est à gauche vient du client
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_TRUSTED_PROXIES", 1)
+    assert client_ip(request("6.6.6.6, 1.2.3.4")) == "1.2.3.4"
+    assert client_ip(request("1.2.3.4")) == "1.2.3.4"
+    assert client_ip(request()) == "10.0.0.9"
+    # Deux proxies (CDN puis répartiteur)
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_TRUSTED_PROXIES", 2)
+    assert client_ip(request("6.6.6.6, 1.2.3.4, 172.16.0.1")) == "1.2.3.4"
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_TRUSTED_PROXIES", 0)
+    assert client_ip(request("6.6.6.6")) == "10.0.0.9"
+
+
+def test_rotating_forwarded_for_does_not_bypass_login_limit(stub_db, client, monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_TRUST_PROXY", True)
+    monkeypatch.setattr(ratelimit, "rate_limiter", RateLimiter(MemoryBackend(100)))
+    monkeypatch.setattr(ratelimit, "ROUTE_POLICIES", {**ratelimit.ROUTE_POLICIES, "/register": [POLICY]})
+
+    async def scenario():
+        async with client() as http:
+            return [(await http.post("/register", json={}, headers={"X-Forwarded-For": f"6.6.6.{i}, 1.2.3.4"})).status_code
+                    for i in range(3)]
+
+    assert asyncio.run(scenario())[-1] == 429
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from email.utils import formatdate
+import httpx
+import pytest
+import shopify_api
+from shopify_api import ShopifyClient, retry_after_seconds
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    # Backoff sans attente : les tests comptent les tentatives, pas le temps passé
+    monkeypatch.setattr(shopify_api.random, "uniform", lambda low, high: 0)
+
+
+def shopify(transport) -> ShopifyClient:
+    client = ShopifyClient("http://shopify.test", "test")
+    client._client = httpx.AsyncClient(base_url=client.base_url, transport=transport)
+    return client
+
+
+def scripted(*outcomes):
+    # Transport qui rejoue une suite de réponses (code HTTP, en-têtes) ou d'exceptions, et compte les appels
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        outcome = outcomes[min(len(calls), len(outcomes)) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        status, headers = outcome
+        return httpx.Response(status, headers=headers, json={"product": {"id": len(calls)}})
+    return httpx.MockTransport(handler), calls
+
+
+def test_bucket_follows_call_limit_header(fake_shopify):
+    fake_shopify._bucket.update(level=30.0, updated_at=time.monotonic())
+    client = shopify(httpx.ASGITransport(app=fake_shopify.app))
+
+    async def scenario():
+        response = await client.create_product("Chaise", 10.0)
+        await client.aclose()
+        return response
+
+    assert asyncio.run(scenario())["product"]["title"] == "Chaise"
+    assert client.bucket.capacity == 40
+    assert client.bucket.level == pytest.approx(31, abs=1)
+
+
+def test_429_waits_retry_after_then_succeeds(fake_shopify, monkeypatch):
+    monkeypatch.setattr(fake_shopify, "RETRY_AFTER", "0.2")
+    monkeypatch.setattr(fake_shopify, "LEAK_RATE", 20.0)
+    fake_shopify._bucket.update(level=40.0, updated_at=time.monotonic())
+    client = shopify(httpx.ASGITransport(app=fake_shopify.app))
+    client.bucket.leak_rate = 20.0
+
+    async def scenario():
+        started = time.monotonic()
+        response = await client.create_product("Chaise", 10.0)
+        await client.aclose()
+        return response, time.monotonic() - started
+
+    response, elapsed = asyncio.run(scenario())
+    assert response["product"]["title"] == "Chaise"
+    assert fake_shopify.stats == {"requests": 2, "throttled": 1}
+    assert elapsed >= 0.2
+
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    assert retry_after_seconds("1.5") == 1.5
+    assert retry_after_seconds(None) == 2.0
+    assert retry_after_seconds("pas une date") == 2.0
+    assert 8 <= retry_after_seconds(formatdate(time.time() + 10, usegmt=True)) <= 10
+    assert retry_after_seconds(formatdate(time.time() - 60, usegmt=True)) == 0.0
+
+
+def test_429_with_http_date_is_retried():
+    transport, calls = scripted((429, {"Retry-After": formatdate(time.time() - 1, usegmt=True)}), (201, {}))
+    client = shopify(transport)
+    assert asyncio.run(client.create_product("Chaise", 10.0)) == {"product": {"id": 2}}
+    assert calls == ["POST", "POST"]
+
+
+def test_post_is_not_replayed_after_it_may_have_been_processed():
+    for outcome in (httpx.ReadTimeout("lent"), httpx.RemoteProtocolError("coupé"), (503, {})):
+        transport, calls = scripted(outcome, (201, {}))
+        client = shopify(transport)
+        with pytest.raises(httpx.HTTPError):
+            asyncio.run(client.create_product("Chaise", 10.0))
+        assert calls == ["POST"]
+
+
+def test_post_is_retried_when_never_sent():
+    transport, calls = scripted(httpx.ConnectError("refusé"), httpx.ConnectTimeout("délai"), (201, {}))
+    client = shopify(transport)
+    assert asyncio.run(client.create_product("Chaise", 10.0)) == {"product": {"id": 3}}
+    assert len(calls) == 3
+
+
+def test_idempotent_requests_are_retried_on_5xx_and_timeouts():
+    transport, calls = scripted((503, {}), httpx.ReadTimeout("lent"), (200, {}))
+    client = shopify(transport)
+    response = asyncio.run(client.request("GET", "/products.json"))
+    assert response.status_code == 200
+    assert calls == ["GET"] * 3
+
+
+def test_create_products_runs_concurrently_within_the_limit(fake_shopify, monkeypatch):
+    monkeypatch.setattr(fake_shopify, "LATENCY", 0.02)
+    in_flight = {"now": 0, "max": 0}
+
+    async def counting(scope, receive, send):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        try:
+            await fake_shopify.app(scope, receive, send)
+        finally:
+            in_flight["now"] -= 1
+
+    client = shopify(httpx.ASGITransport(app=counting))
+    products = [{"name": f"Produit {i}", "price": 10.0 + i} for i in range(12)]
+
+    async def scenario():
+        results = await client.create_products(products)
+        await client.aclose()
+        return results
+
+    results = asyncio.run(scenario())
+    # Un résultat par produit, dans l'ordre de la demande
+    assert [r["product"]["title"] for r in results] == [p["name"] for p in products]
+    assert 1 < in_flight["max"] <= shopify_api.SHOPIFY_MAX_CONCURRENCY
+    assert fake_shopify.stats["throttled"] == 0
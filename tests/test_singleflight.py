@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from singleflight import SingleFlight, ThreadSingleFlight, coalesce
+
+CALLERS = 50
+
+
+class Backend:
+    # Appel lent qui compte ses exécutions ; `release` le débloque une fois tous les appelants arrivés
+    def __init__(self, error: Exception = None):
+        self.calls = 0
+        self.error = error
+        self.release = asyncio.Event()
+
+    async def fetch(self, key):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return {"key": key}
+
+
+async def until(condition):
+    while not condition():
+        await asyncio.sleep(0)
+
+
+def test_concurrent_callers_share_one_backend_call():
+    async def scenario():
+        flight, backend = SingleFlight("test"), Backend()
+        callers = [asyncio.create_task(flight.do("k", backend.fetch, "k")) for _ in range(CALLERS)]
+        await until(lambda: flight.calls == CALLERS)
+        backend.release.set()
+        results = await asyncio.gather(*callers)
+        return flight, backend, results
+
+    flight, backend, results = asyncio.run(scenario())
+    assert backend.calls == 1
+    assert flight.shared == CALLERS - 1
+    assert all(result is results[0] for result in results)
+    assert flight.in_flight() == 0
+
+
+def test_exception_is_shared_then_forgotten():
+    async def scenario():
+        flight, backend = SingleFlight("test"), Backend(error=RuntimeError("base indisponible"))
+        callers = [asyncio.create_task(flight.do("k", backend.fetch, "k")) for _ in range(CALLERS)]
+        await until(lambda: flight.calls == CALLERS)
+        backend.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        # L'échec n'est pas mémorisé : l'appel suivant relance la requête
+        backend.error = None
+        retry = await flight.do("k", backend.fetch, "k")
+        return backend, results, retry
+
+    backend, results, retry = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len({id(result) for result in results}) == 1
+    assert backend.calls == 2
+    assert retry == {"key": "k"}
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    async def scenario():
+        flight, backend = SingleFlight("test"), Backend()
+        leader = asyncio.create_task(flight.do("k", backend.fetch, "k"))
+        followers = [asyncio.create_task(flight.do("k", backend.fetch, "k")) for _ in range(3)]
+        await until(lambda: flight.calls == 4)
+        # Client déconnecté : son appel est annulé, la requête partagée continue pour les autres
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        backend.release.set()
+        return backend, await asyncio.gather(*followers)
+
+    backend, results = asyncio.run(scenario())
+    assert backend.calls == 1
+    assert results == [{"key": "k"}] * 3
+
+
+def test_call_survives_when_every_caller_is_cancelled():
+    async def scenario():
+        flight, backend = SingleFlight("test"), Backend()
+        callers = [asyncio.create_task(flight.do("k", backend.fetch, "k")) for _ in range(3)]
+        await until(lambda: flight.calls == 3)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        # La requête partagée va à son terme et libère sa clé
+        backend.release.set()
+        await until(lambda: flight.in_flight() == 0)
+        return backend, await flight.do("k", backend.fetch, "k")
+
+    backend, result = asyncio.run(scenario())
+    assert backend.calls == 2
+    assert result == {"key": "k"}
+
+
+def test_coalesce_groups_by_arguments():
+    backend = None
+
+    @coalesce
+    async def fetch(key):
+        return await backend.fetch(key)
+
+    async def scenario():
+        nonlocal backend
+        backend = Backend()
+        callers = [asyncio.create_task(fetch(key)) for key in ("a", "b") * 10]
+        await until(lambda: backend.calls == 2)
+        backend.release.set()
+        return await asyncio.gather(*callers)
+
+    results = asyncio.run(scenario())
+    assert backend.calls == 2
+    assert results == [{"key": "a"}, {"key": "b"}] * 10
+
+
+def threaded_burst(flight: ThreadSingleFlight, func):
+    # CALLERS threads appellent en même temps ; `func` attend que tous soient entrés dans do()
+    with ThreadPoolExecutor(max_workers=CALLERS) as pool:
+        futures = [pool.submit(flight.do, "k", func) for _ in range(CALLERS)]
+        return [future.exception() or future.result() for future in futures]
+
+
+def test_thread_callers_share_one_backend_call():
+    flight, calls = ThreadSingleFlight("test"), []
+
+    def fetch():
+        calls.append(threading.get_ident())
+        deadline = time.monotonic() + 5
+        while flight.calls < CALLERS and time.monotonic() < deadline:
+            time.sleep(0.001)
+        return {"key": "k"}
+
+    results = threaded_burst(flight, fetch)
+    assert len(calls) == 1
+    assert flight.shared == CALLERS - 1
+    assert all(result is results[0] for result in results)
+    assert flight.in_flight() == 0
+
+
+def test_thread_exception_is_shared():
+    flight, calls = ThreadSingleFlight("test"), []
+    error = RuntimeError("base indisponible")
+
+    def fetch():
+        calls.append(1)
+        deadline = time.monotonic() + 5
+        while flight.calls < CALLERS and time.monotonic() < deadline:
+            time.sleep(0.001)
+        raise error
+
+    results = threaded_burst(flight, fetch)
+    assert len(calls) == 1
+    assert all(result is error for result in results)
+    assert flight.do("k", lambda: "relancé") == "relancé"
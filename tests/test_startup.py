@@ -0,0 +1,9 @@
+import pytest
+from bench.importtime import DEFERRED, TARGETS, measure
+
+
+@pytest.mark.parametrize("target", sorted(TARGETS))
+def test_heavy_modules_are_not_loaded_at_startup(target):
+    # Interpréteur neuf, sans identifiants SUPABASE_/SHOPIFY_ : httpx, postgrest et jwt arrivent au premier usage
+    result = measure(TARGETS[target])
+    assert result["deferred_loaded"] == [], f"{target} charge {result['deferred_loaded']} (attendus différés : {DEFERRED})"
@@ -0,0 +1,69 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import random
+import uuid
+from collections import Counter
+
+WEBHOOK_SECRET = "test-webhook-secret"
+
+
+def signed(payload) -> tuple:
+    body = json.dumps(payload).encode()
+    signature = base64.b64encode(hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).digest()).decode()
+    return body, {
+        "Content-Type": "application/json",
+        "X-Shopify-Hmac-Sha256": signature,
+        "X-Shopify-Webhook-Id": str(uuid.uuid4()),
+    }
+
+
+def seed_products(fake, count: int):
+    for i in range(count):
+        fake.tables["products"].append({"id": i + 1, "name": f"Produit {i}", "price": 10.0, "sales_count": 0,
+                                        "shopify_id": str(9000 + i), "created_by": 1})
+    fake.next_ids["products"] = count + 1
+
+
+def test_parallel_webhooks_apply_every_increment(fake_postgrest, webhook_journal, client):
+    # Commandes multi-produits concurrentes sur les mêmes produits : aucun incrément perdu
+    random.seed(3)
+    seed_products(fake_postgrest, 5)
+    orders = [{
+        "id": n,
+        "line_items": [{"product_id": 9000 + random.randrange(5), "quantity": random.randint(1, 3)}
+                       for _ in range(random.randint(1, 6))],
+    } for n in range(200)]
+    expected = Counter()
+    for order in orders:
+        for item in order["line_items"]:
+            expected[str(item["product_id"])] += item["quantity"]
+
+    async def scenario():
+        async with client() as http:
+            responses = await asyncio.gather(*(
+                http.post("/webhooks/shopify-sales", content=body, headers=headers)
+                for body, headers in map(signed, orders)
+            ))
+        assert [r.status_code for r in responses] == [200] * len(orders)
+
+    asyncio.run(scenario())
+    counts = {row["shopify_id"]: row["sales_count"] for row in fake_postgrest.tables["products"]}
+    assert counts == {shopify_id: expected[shopify_id] for shopify_id in counts}
+    # Une seule requête (RPC atomique) par webhook, quel que soit le nombre de lignes
+    assert fake_postgrest.stats["requests"] == len(orders)
+
+
+def test_webhook_retry_is_counted_once(fake_postgrest, webhook_journal, client):
+    seed_products(fake_postgrest, 1)
+    body, headers = signed({"id": 1, "line_items": [{"product_id": 9000, "quantity": 2}]})
+
+    async def scenario():
+        async with client() as http:
+            for _ in range(3):
+                assert (await http.post("/webhooks/shopify-sales", content=body, headers=headers)).status_code == 200
+
+    asyncio.run(scenario())
+    assert fake_postgrest.tables["products"][0]["sales_count"] == 2
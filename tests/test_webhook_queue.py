@@ -0,0 +1,108 @@
+import asyncio
+import json
+import time
+import pytest
+import routes.webhook
+from webhook_queue import WebhookJournal, WebhookQueue, parse_webhook, webhook_queue
+from tests.test_webhook_increments import seed_products, signed
+
+
+def order(*items) -> bytes:
+    return json.dumps({"line_items": [{"product_id": p, "quantity": q} for p, q in items]}).encode()
+
+
+def test_parse_webhook_rejects_malformed_bodies():
+    for body in (b"pas du json", b"[1, 2]", b'{"line_items": {}}', b'{"line_items": [1]}',
+                 b'{"line_items": [{"product_id": 1, "quantity": "deux"}]}'):
+        with pytest.raises(ValueError):
+            parse_webhook(body)
+    # Lignes sans product_id (articles personnalisés) ignorées, quantités regroupées
+    assert parse_webhook(order((1, 2), (1, 1), (None, 5))) == {"1": 3}
+
+
+def test_worker_dead_letters_bad_rows_and_keeps_draining(fake_postgrest, tmp_path):
+    seed_products(fake_postgrest, 2)
+    queue = WebhookQueue(str(tmp_path / "queue.sqlite3"), workers=2, batch_size=10, flush_interval=0.01)
+
+    async def scenario():
+        await queue.start()
+        # Lignes écrites par une version précédente ou à la main : le worker ne doit pas mourir
+        await queue.enqueue("bad-json", b"{")
+        await queue.enqueue("bad-list", b"[]")
+        await queue.enqueue("ok-1", order((9000, 2), (9001, 1)))
+        await queue.enqueue("no-product", order((None, 4)))
+        for _ in range(200):
+            if queue.journal.depth() == 0:
+                break
+            await asyncio.sleep(0.01)
+        await queue.enqueue("ok-2", order((9000, 5)))
+        for _ in range(200):
+            if queue.journal.depth() == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert all(not task.done() for task in queue._tasks)
+        stats = queue.stats()
+        await queue.stop()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["depth"] == 0
+    assert stats["dead_letters"] == 2
+    counts = {row["shopify_id"]: row["sales_count"] for row in fake_postgrest.tables["products"]}
+    assert counts == {"9000": 7, "9001": 1}
+
+
+def test_claims_are_leased_to_one_process(tmp_path):
+    path = str(tmp_path / "queue.sqlite3")
+    first, second = WebhookJournal(path, lease_ttl=0.2), WebhookJournal(path, lease_ttl=0.2)
+    first.append("a", order((1, 1)))
+
+    claimed = first.claim(10)
+    assert [row[0] for row in claimed] == [1]
+    # Un autre processus qui démarre ne reprend pas un lot encore en cours d'envoi
+    assert second.claim(10) == []
+
+    time.sleep(0.25)
+    assert [row[0] for row in second.claim(10)] == [1]
+    # Bail expiré puis repris : l'ancien propriétaire ne peut plus le libérer
+    first.release([1])
+    assert first.claim(10) == []
+    second.ack([1])
+    assert second.depth() == 0
+
+
+def test_processed_ids_are_deduplicated_across_processes_and_restarts(tmp_path):
+    path = str(tmp_path / "queue.sqlite3")
+    journal = WebhookJournal(path)
+    assert journal.append("w-1", order((1, 1)))
+    journal.ack([row[0] for row in journal.claim(10)])
+    journal.close()
+
+    restarted = WebhookJournal(path)
+    assert not restarted.append("w-1", order((1, 1)))
+    assert not restarted.mark_done("w-1")
+    assert restarted.depth() == 0
+
+    expired = WebhookJournal(path, dedup_ttl=0)
+    time.sleep(0.01)
+    assert expired.prune() == 1
+    assert expired.append("w-1", order((1, 1)))
+
+
+def test_endpoint_rejects_invalid_body_before_enqueue(fake_postgrest, webhook_journal, client, monkeypatch):
+    monkeypatch.setattr(routes.webhook, "WEBHOOK_ASYNC_MODE", True)
+
+    async def scenario():
+        async with client() as http:
+            body, headers = signed([{"product_id": 1}])
+            assert (await http.post("/webhooks/shopify-sales", content=body, headers=headers)).status_code == 400
+            body, headers = signed({"line_items": [{"product_id": 9000, "quantity": 1}]})
+            first = await http.post("/webhooks/shopify-sales", content=body, headers=headers)
+            retry = await http.post("/webhooks/shopify-sales", content=body, headers=headers)
+            return first.json(), retry.json()
+
+    first, retry = asyncio.run(scenario())
+    assert first == {"status": "queued"}
+    assert retry == {"status": "duplicate"}
+    assert webhook_journal.depth() == 1
+    assert webhook_queue.journal is webhook_journal
@@ -0,0 +1,346 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from cache import catalog_cache
+from leaderboard import leaderboard
+from config import (
+    WEBHOOK_QUEUE_PATH, WEBHOOK_WORKERS, WEBHOOK_BATCH_SIZE, WEBHOOK_FLUSH_INTERVAL,
+    WEBHOOK_DEDUP_TTL, WEBHOOK_LEASE_TTL,
+)
+import repository
+
+logger = logging.getLogger(__name__)
+
+# Élagage des identifiants traités (tombstones) tous les N ajouts au journal
+_PRUNE_EVERY = 1000
+
+
+def parse_webhook(body: bytes) -> Counter:
+    # Quantités vendues regroupées par produit Shopify.
+    # ValueError si le corps n'est pas une commande exploitable ; les lignes sans product_id
+    # (articles personnalisés, produits supprimés) sont ignorées.
+    try:
+        payload = json.loads(body)
+    except (UnicodeDecodeError, ValueError):
+        raise ValueError("corps JSON invalide")
+    if not isinstance(payload, dict):
+        raise ValueError("objet JSON attendu")
+    line_items = payload.get("line_items")
+    if line_items is None:
+        line_items = []
+    if not isinstance(line_items, list):
+        raise ValueError("line_items doit être une liste")
+
+    increments = Counter()
+    for item in line_items:
+        if not isinstance(item, dict):
+            raise ValueError("ligne de commande invalide")
+        if item.get("product_id") is None:
+            continue
+        try:
+            quantity = int(item.get("quantity", 1))
+        except (TypeError, ValueError):
+            raise ValueError(f"quantité invalide pour le produit {item['product_id']}")
+        increments[str(item["product_id"])] += quantity
+    return increments
+
+
+async def flush_increments(increments: Counter):
+    if not increments:
+        return []
+    updated = await repository.increment_sales_by_shopify_id(increments)
+    if updated:
+        catalog_cache.clear()
+        leaderboard.update(updated)
+    found = {str(product["shopify_id"]) for product in updated}
+    for shopify_product_id in increments.keys() - found:
+        logger.warning("Produit Shopify %s introuvable dans Supabase", shopify_product_id)
+    return updated
+
+
+class WebhookJournal:
+    # Journal SQLite (WAL), partagé par tous les workers uvicorn de la machine :
+    # - un webhook acquitté est sur disque et survit à un redémarrage ;
+    # - un lot est réservé par un seul processus (claimed_by) pour WEBHOOK_LEASE_TTL secondes ;
+    #   seuls les baux expirés (processus arrêté ou bloqué) sont repris par un autre ;
+    # - un webhook traité reste en base sans son corps (tombstone) pendant WEBHOOK_DEDUP_TTL :
+    #   la contrainte UNIQUE sur webhook_id écarte les retries de Shopify, quel que soit le worker ;
+    # - un corps inexploitable est mis de côté (error) au lieu de bloquer la file.
+    def __init__(self, path: str, lease_ttl: float = WEBHOOK_LEASE_TTL, dedup_ttl: float = WEBHOOK_DEDUP_TTL):
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.lease_ttl = lease_ttl
+        self.dedup_ttl = dedup_ttl
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._lock = threading.Lock()
+        self._appends = 0
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS webhooks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    webhook_id TEXT UNIQUE,
+                    payload BLOB NOT NULL,
+                    received_at REAL NOT NULL,
+                    claimed_by TEXT,
+                    lease_until REAL,
+                    done_at REAL,
+                    error TEXT
+                )
+            """)
+            # Journal créé par une version précédente (claimed_at seul) : colonnes ajoutées en place
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(webhooks)")}
+            for column, kind in (("claimed_by", "TEXT"), ("lease_until", "REAL"), ("done_at", "REAL"), ("error", "TEXT")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE webhooks ADD COLUMN {column} {kind}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS webhooks_pending ON webhooks (id) WHERE done_at IS NULL")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS webhooks_done ON webhooks (done_at) WHERE done_at IS NOT NULL")
+
+    def append(self, webhook_id, payload: bytes) -> bool:
+        # False si ce webhook_id est déjà en file ou déjà traité
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO webhooks (webhook_id, payload, received_at) VALUES (?, ?, ?)",
+                (webhook_id, payload, time.time()),
+            )
+            self._maybe_prune()
+            return cur.rowcount == 1
+
+    def mark_done(self, webhook_id: str) -> bool:
+        # Mode synchrone : tombstone posée avant le traitement, False si déjà vu
+        with self._lock:
+            now = time.time()
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO webhooks (webhook_id, payload, received_at, done_at) VALUES (?, X'', ?, ?)",
+                (webhook_id, now, now),
+            )
+            self._maybe_prune()
+            return cur.rowcount == 1
+
+    def forget(self, webhook_id: str):
+        # Mode synchrone : traitement échoué, le retry de Shopify doit être accepté
+        with self._lock:
+            self._conn.execute("DELETE FROM webhooks WHERE webhook_id = ? AND error IS NULL", (webhook_id,))
+
+    def claim(self, limit: int):
+        now = time.time()
+        with self._lock:
+            return self._conn.execute("""
+                UPDATE webhooks SET claimed_by = ?, lease_until = ?
+                WHERE id IN (
+                    SELECT id FROM webhooks
+                    WHERE done_at IS NULL AND (lease_until IS NULL OR lease_until < ?)
+                    ORDER BY id LIMIT ?
+                )
+                RETURNING id, payload, received_at
+            """, (self.owner, now + self.lease_ttl, now, limit)).fetchall()
+
+    def ack(self, ids):
+        # Les webhooks identifiés deviennent des tombstones (corps vidé), les autres sont supprimés
+        with self._lock:
+            now = time.time()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for i in ids:
+                    self._conn.execute("""
+                        UPDATE webhooks SET payload = X'', done_at = ?, claimed_by = NULL, lease_until = NULL
+                        WHERE id = ? AND webhook_id IS NOT NULL
+                    """, (now, i))
+                    self._conn.execute("DELETE FROM webhooks WHERE id = ? AND webhook_id IS NULL", (i,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def release(self, ids):
+        # Échec d'envoi : le lot redevient disponible tout de suite (seulement s'il nous appartient encore)
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE webhooks SET claimed_by = NULL, lease_until = NULL WHERE id = ? AND claimed_by = ?",
+                [(i, self.owner) for i in ids],
+            )
+
+    def dead_letter(self, rows):
+        # rows : [(id, message)] ; le corps est conservé pour analyse, la ligne n'est plus jamais réservée
+        with self._lock:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE webhooks SET done_at = ?, error = ?, claimed_by = NULL, lease_until = NULL WHERE id = ?",
+                [(now, message, i) for i, message in rows],
+            )
+
+    def prune(self):
+        with self._lock:
+            return self._prune()
+
+    def _maybe_prune(self):
+        self._appends += 1
+        if self._appends % _PRUNE_EVERY == 0:
+            self._prune()
+
+    def _prune(self):
+        # Tombstones plus vieilles que la fenêtre de retry de Shopify ; les lettres mortes sont gardées
+        return self._conn.execute(
+            "DELETE FROM webhooks WHERE done_at < ? AND error IS NULL", (time.time() - self.dedup_ttl,)
+        ).rowcount
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM webhooks WHERE done_at IS NULL").fetchone()[0]
+
+    def dead_letters(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM webhooks WHERE error IS NOT NULL").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class WebhookQueue:
+    def __init__(self, path: str, workers: int, batch_size: int, flush_interval: float):
+        self.path = path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal = None
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self.enqueued = 0
+        self.duplicates = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+        self.last_lag_seconds = 0.0
+
+    async def start(self, workers: bool = True):
+        # Le journal est ouvert dans les deux modes (il sert aussi au dédoublonnage) ;
+        # les workers ne tournent qu'en mode asynchrone
+        self.journal = WebhookJournal(self.path)
+        await asyncio.to_thread(self.journal.prune)
+        self._wakeup = asyncio.Event()
+        if workers:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.journal is not None:
+            # Les lots en cours d'envoi restent réservés : ils seront repris à l'expiration de leur bail
+            self.journal.close()
+            self.journal = None
+
+    async def enqueue(self, webhook_id, payload: bytes) -> bool:
+        added = await asyncio.to_thread(self.journal.append, webhook_id, payload)
+        if added:
+            self.enqueued += 1
+            self._wakeup.set()
+        else:
+            self.duplicates += 1
+        return added
+
+    async def process_now(self, webhook_id, increments: Counter) -> bool:
+        # Mode synchrone : traitement dans la requête, dédoublonné par le même journal.
+        # Au plus une fois : si le processus s'arrête pendant l'envoi, le retry sera ignoré.
+        if webhook_id:
+            if not await asyncio.to_thread(self.journal.mark_done, webhook_id):
+                self.duplicates += 1
+                return False
+        try:
+            await flush_increments(increments)
+        except Exception:
+            if webhook_id:
+                await asyncio.to_thread(self.journal.forget, webhook_id)
+            raise
+        return True
+
+    async def _worker(self):
+        while True:
+            try:
+                batch = await asyncio.to_thread(self.journal.claim, self.batch_size)
+                if not batch:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._flush_batch(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Erreur inattendue (SQLite...) : le worker continue, le lot sera repris à l'expiration du bail
+                self.failures += 1
+                logger.exception("Erreur du worker de la file des webhooks")
+                await asyncio.sleep(self.flush_interval)
+
+    async def _flush_batch(self, batch):
+        ids, dead = [], []
+        increments = Counter()
+        for row_id, payload, _ in batch:
+            try:
+                increments.update(parse_webhook(payload))
+            except ValueError as e:
+                dead.append((row_id, str(e)))
+                continue
+            ids.append(row_id)
+        if dead:
+            self.dead_lettered += len(dead)
+            logger.error("%d webhooks inexploitables mis de côté : %s", len(dead), dead[0][1])
+            await asyncio.to_thread(self.journal.dead_letter, dead)
+        if not ids:
+            return
+
+        started = time.perf_counter()
+        try:
+            await flush_increments(increments)
+        except Exception as e:
+            self.failures += 1
+            logger.warning("Échec du traitement de %d webhooks : %s", len(ids), e)
+            await asyncio.to_thread(self.journal.release, ids)
+            await asyncio.sleep(self.flush_interval)
+            return
+        await asyncio.to_thread(self.journal.ack, ids)
+
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.flushed += len(ids)
+        self.last_flush_seconds = elapsed
+        self.total_flush_seconds += elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        self.last_lag_seconds = time.time() - min(row[2] for row in batch)
+
+        # Lot incomplet : on laisse les webhooks suivants s'accumuler pour mieux les regrouper
+        if len(batch) < self.batch_size:
+            await asyncio.sleep(self.flush_interval)
+
+    def stats(self):
+        return {
+            "depth": self.journal.depth() if self.journal is not None else 0,
+            "dead_letters": self.journal.dead_letters() if self.journal is not None else 0,
+            "enqueued": self.enqueued,
+            "duplicates": self.duplicates,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "dead_lettered": self.dead_lettered,
+            "last_flush_seconds": self.last_flush_seconds,
+            "avg_flush_seconds": self.total_flush_seconds / self.flushes if self.flushes else 0.0,
+            "max_flush_seconds": self.max_flush_seconds,
+            "last_lag_seconds": self.last_lag_seconds,
+        }
+
+
+webhook_queue = WebhookQueue(WEBHOOK_QUEUE_PATH, WEBHOOK_WORKERS, WEBHOOK_BATCH_SIZE, WEBHOOK_FLUSH_INTERVAL)